@@ -6,51 +6,110 @@ from dotenv import load_dotenv
 from langchain_aws.embeddings import BedrockEmbeddings
 from langchain_aws.chat_models import ChatBedrock
 from config import load_config
+from AWS_utils import db as db_utils
 from AWS_utils.s3 import S3Client
 from AWS_utils.secrets import SecretsManager
-from AWS_utils.opensearch import OpenSearchVectorStore
+from AWS_utils.upload_events import PostgresUploadListener
+from AWS_utils.vector_stores import IndexEmbeddings, build_vector_store
 from backend.API_handler.upload import create_upload_blueprint
 from backend.API_handler.get_healthness import create_health_blueprint
+from backend.API_handler.get_metrics import create_metrics_blueprint
 from backend.API_handler.chat import create_chat_blueprint
+from backend.API_handler.chat_cache import AnswerCache, QueryEmbeddingCache, invalidate_on_reindex
 
 
 load_dotenv()
 
-def create_app():
-    cfg = load_config()
-    app = Flask(__name__)
-    CORS(app)
-    # create infra
-    s3 = S3Client(bucket=cfg.s3_bucket, region=cfg.aws_region)
-    secrets_mgr = SecretsManager(region_name=cfg.aws_region)
-
+def build_chat_dependencies(cfg) -> dict:
+    """Create the clients and caches shared by the sync and async chat blueprints."""
     embedding_model_id = os.getenv('BEDROCK_EMBEDDING_MODEL_ID', 'amazon.titan-embed-text-v1')
     llm_model_id = os.getenv('BEDROCK_LLM_MODEL_ID', 'anthropic.claude-3-sonnet-20240229-v1:0')
     llm_temperature = float(os.getenv('BEDROCK_LLM_TEMPERATURE', '0'))
     embedding_dimension = int(os.getenv('EMBEDDING_DIMENSION', '1536'))
-    opensearch_host = os.getenv('OPENSEARCH_HOST')
-    opensearch_index = os.getenv('OPENSEARCH_INDEX', 'doc-embeddings')
-    opensearch_service = os.getenv('OPENSEARCH_SERVICE', 'aoss')
-    if not opensearch_host:
-        raise RuntimeError('OPENSEARCH_HOST env var is required to enable chat/search API')
 
-    embeddings = BedrockEmbeddings(model_id=embedding_model_id, region_name=cfg.aws_region)
     llm = ChatBedrock(model_id=llm_model_id, region_name=cfg.aws_region, temperature=llm_temperature)
-    vector_store = OpenSearchVectorStore(
-        opensearch_host,
-        opensearch_index,
-        region=cfg.aws_region,
-        service=opensearch_service,
-        dimension=embedding_dimension,
+    vector_store = build_vector_store(cfg.aws_region, embedding_dimension, embedding_model_id=embedding_model_id)
+    # queries are embedded with the model of the index the alias currently points at
+    embeddings = IndexEmbeddings(
+        vector_store,
+        lambda model_id, _dimension: BedrockEmbeddings(model_id=model_id, region_name=cfg.aws_region),
+        embedding_model_id,
+        embedding_dimension,
     )
+    query_cache = None
+    answer_cache = None
+    if os.getenv('CHAT_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes'):
+        cache_ttl = float(os.getenv('CHAT_CACHE_TTL_SECONDS', '3600'))
+        query_cache = QueryEmbeddingCache(
+            embeddings,
+            max_entries=int(os.getenv('QUERY_CACHE_MAX_ENTRIES', '4096')),
+            ttl_seconds=cache_ttl,
+        )
+        answer_cache = AnswerCache(
+            max_entries=int(os.getenv('ANSWER_CACHE_MAX_ENTRIES', '2048')),
+            ttl_seconds=cache_ttl,
+            similarity_threshold=float(os.getenv('ANSWER_CACHE_SIMILARITY', '0.97')),
+        )
+        events = os.getenv('CHAT_CACHE_EVENTS', 'postgres' if db_utils.dsn_configured() else 'off').lower()
+        if events not in ('postgres', 'off'):
+            raise RuntimeError(f'unknown CHAT_CACHE_EVENTS {events!r}; expected "postgres" or "off"')
+        if events == 'postgres':
+            # the ingestion worker notifies INDEX_CHANNEL for every document it (re-)indexes
+            invalidate_on_reindex(answer_cache, PostgresUploadListener(channel=db_utils.INDEX_CHANNEL))
+    mmr_options = None
+    if os.getenv('CHAT_MMR_ENABLED', 'false').lower() in ('1', 'true', 'yes'):
+        mmr_options = {
+            'lambda_mult': float(os.getenv('CHAT_MMR_LAMBDA', '0.5')),
+            'oversample': float(os.getenv('CHAT_MMR_OVERSAMPLE', '4')),
+        }
+    return {
+        'embeddings': embeddings,
+        'vector_store': vector_store,
+        'llm': llm,
+        'query_cache': query_cache,
+        'answer_cache': answer_cache,
+        'hybrid_options': {
+            'lexical_weight': float(os.getenv('HYBRID_LEXICAL_WEIGHT', '1.0')),
+            'vector_weight': float(os.getenv('HYBRID_VECTOR_WEIGHT', '1.0')),
+            'rank_constant': int(os.getenv('HYBRID_RRF_K', '60')),
+        },
+        'context_options': {
+            'token_budget': int(os.getenv('CHAT_CONTEXT_TOKEN_BUDGET', '3000')),
+            'dedupe_threshold': float(os.getenv('CHAT_CONTEXT_DEDUPE_THRESHOLD', '0.85')),
+        },
+        'batch_options': {
+            'max_queries': int(os.getenv('CHAT_BATCH_MAX_QUERIES', '50')),
+            'concurrency': int(os.getenv('CHAT_BATCH_CONCURRENCY', '4')),
+        },
+        'mmr_options': mmr_options,
+        # deduplicated uploads share the canonical document's chunks
+        'duplicate_uploads': db_utils.fetch_duplicate_uploads,
+        'cache_admin_token': os.getenv('CHAT_CACHE_ADMIN_TOKEN') or None,
+    }
+
+
+def create_app(chat_dependencies: dict | None = None, include_chat: bool = True):
+    cfg = load_config()
+    app = Flask(__name__)
+    CORS(app)
+    # create infra
+    s3 = S3Client(bucket=cfg.s3_bucket, region=cfg.aws_region)
+    secrets_mgr = SecretsManager(region_name=cfg.aws_region)
 
+    chat_dependencies = chat_dependencies or build_chat_dependencies(cfg)
 
     # register the blueprint with optional prefix
     app.register_blueprint(create_upload_blueprint(storage_client=s3), url_prefix='/api')
+    if include_chat:
+        app.register_blueprint(create_chat_blueprint(**chat_dependencies), url_prefix='/api')
     app.register_blueprint(
-        create_chat_blueprint(embeddings=embeddings, vector_store=vector_store, llm=llm),
+        create_health_blueprint(
+            dependencies={'s3': s3.ping, 'vector_store': chat_dependencies['vector_store'].ping},
+            queue_depth=db_utils.count_pending_uploads,
+        ),
         url_prefix='/api'
     )
+    app.register_blueprint(create_metrics_blueprint(queue_depth=db_utils.count_pending_uploads), url_prefix='/api')
 
     return app
 
@@ -0,0 +1,48 @@
+import asyncio
+import os
+
+from hypercorn.asyncio import serve
+from hypercorn.config import Config as HypercornConfig
+from hypercorn.middleware import AsyncioWSGIMiddleware
+from quart import Quart
+from quart_cors import cors
+from config import load_config
+from backend.API_handler.app import build_chat_dependencies, create_app
+from backend.API_handler.async_chat import create_async_chat_blueprint
+
+
+def create_async_app():
+    """Return an ASGI app serving ``/api/chat/*`` from Quart and the rest from Flask.
+
+    The chat routes are the ones that hold requests open on Bedrock and
+    OpenSearch, so only they move onto the event loop; the upload routes keep
+    running as WSGI on hypercorn's thread pool. Both halves share one set of
+    clients and caches.
+    """
+    cfg = load_config()
+    chat_dependencies = build_chat_dependencies(cfg)
+    flask_app = create_app(chat_dependencies=chat_dependencies, include_chat=False)
+
+    chat_app = cors(Quart(__name__))
+    chat_app.register_blueprint(
+        create_async_chat_blueprint(
+            **chat_dependencies,
+            io_threads=int(os.getenv('ASYNC_IO_THREADS', '64')),
+        ),
+        url_prefix='/api'
+    )
+    wsgi_app = AsyncioWSGIMiddleware(flask_app)
+
+    async def app(scope, receive, send):
+        if scope['type'] == 'lifespan' or scope.get('path', '').startswith('/api/chat/'):
+            await chat_app(scope, receive, send)
+        else:
+            await wsgi_app(scope, receive, send)
+
+    return app
+
+
+if __name__ == '__main__':
+    hypercorn_config = HypercornConfig()
+    hypercorn_config.bind = [os.getenv('ASYNC_BIND', '0.0.0.0:8000')]
+    asyncio.run(serve(create_async_app(), hypercorn_config))
@@ -0,0 +1,330 @@
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from quart import Blueprint, Response, g, request, jsonify
+
+from AWS_utils.search_filters import filters_key
+from backend.API_handler.chat import (
+	NO_CONTEXT_ANSWER,
+	SEARCH_MODES,
+	_cache_admin_authorized,
+	_diversify,
+	_message_to_text,
+	_mmr_candidates,
+	_parse_batch_payload,
+	_parse_filters,
+	_parse_search_payload,
+	_prepare_prompt,
+	_prompt_tokens,
+	_search_batch,
+	_search_store,
+	_segment_citations,
+	_share_duplicates,
+	_sse,
+	_supports_mode,
+)
+from backend.API_handler.chat_cache import normalize_query
+from metrics import REQUEST_SECONDS, request_stage
+
+
+class SingleFlight:
+	"""Coalesce concurrent calls that share a key into one execution.
+
+	The first caller for a key starts the coroutine; callers arriving while it
+	is still running await the same task. Each waiter is shielded, so a client
+	that disconnects does not cancel the work other waiters depend on.
+	"""
+
+	def __init__(self):
+		self._inflight: dict = {}
+		self.coalesced = 0
+
+	async def do(self, key, make_coro):
+		task = self._inflight.get(key)
+		if task is None:
+			task = asyncio.ensure_future(make_coro())
+			self._inflight[key] = task
+			task.add_done_callback(lambda _: self._inflight.pop(key, None))
+		else:
+			self.coalesced += 1
+		return await asyncio.shield(task)
+
+
+def create_async_chat_blueprint(
+	embeddings,
+	vector_store,
+	llm,
+	query_cache=None,
+	answer_cache=None,
+	hybrid_options=None,
+	context_options=None,
+	batch_options=None,
+	mmr_options=None,
+	duplicate_uploads=None,
+	cache_admin_token=None,
+	io_threads: int = 64,
+):
+	"""Return a Quart blueprint serving the chat routes on the event loop.
+
+	Takes the same dependencies as ``create_chat_blueprint``. The boto3 and
+	opensearch-py clients are blocking, so their calls run on a dedicated
+	pool of ``io_threads`` threads while the loop keeps serving other
+	requests; the LLM is called through ``ainvoke``/``astream``. Retrieval
+	goes through the same ``_search_store`` as the sync routes (one
+	``hybrid_search`` round trip in hybrid mode), so both return the same
+	hits. Identical requests
+	(same normalized query, ``top_k``, mode and filters) that arrive while one is in
+	flight share its retrieval and, for ``/chat/search``, its answer.
+	"""
+	if embeddings is None:
+		raise ValueError('embeddings client is required for chat blueprint')
+	if vector_store is None:
+		raise ValueError('vector store client is required for chat blueprint')
+	if llm is None:
+		raise ValueError('LLM client is required for chat blueprint')
+
+	bp = Blueprint('async_chat_api', __name__)
+	io_pool = ThreadPoolExecutor(max_workers=io_threads, thread_name_prefix='chat-io')
+	retrievals = SingleFlight()
+	answers = SingleFlight()
+	bp.io_pool = io_pool
+	bp.single_flight = (retrievals, answers)
+	batch = batch_options or {}
+
+	@bp.before_request
+	async def _start_timer():
+		g.request_started = time.perf_counter()
+
+	@bp.after_request
+	async def _observe_request(response):
+		route = request.url_rule.rule if request.url_rule is not None else request.path
+		REQUEST_SECONDS.labels(route=route, status=str(response.status_code)).observe(
+			time.perf_counter() - g.request_started
+		)
+		return response
+
+	async def _run(fn, *args, **kwargs):
+		loop = asyncio.get_running_loop()
+		return await loop.run_in_executor(io_pool, functools.partial(fn, *args, **kwargs))
+
+	async def _timed(stage: str, fn, *args, **kwargs):
+		with request_stage(stage):
+			return await _run(fn, *args, **kwargs)
+
+	async def _embed_query(query: str):
+		# the cache key reads the model of the index (IndexEmbeddings), which may
+		# call OpenSearch, so even a cache hit is resolved off the loop
+		with request_stage('query_embedding'):
+			return await _run((query_cache or embeddings).embed_query, query)
+
+	async def _embed_queries(queries: list[str]):
+		"""Embed ``queries`` in input order, one ``_embed_query`` per distinct query, concurrently."""
+		unique = {}
+		for query in queries:
+			unique.setdefault(normalize_query(query), query)
+		vectors = await asyncio.gather(*(_embed_query(query) for query in unique.values()))
+		by_key = dict(zip(unique, vectors))
+		return [by_key[normalize_query(q)] for q in queries]
+
+	async def _retrieve(query: str, top_k: int, mode: str, filters: dict):
+		query_vector, retrieved = await _search(query, _mmr_candidates(top_k, mmr_options), mode, filters)
+		return query_vector, _diversify(query_vector, retrieved, top_k, mmr_options)
+
+	async def _resolve_filters(filters: dict):
+		if duplicate_uploads is None or not filters:
+			return filters
+		return await _timed('filter_resolution', _share_duplicates, filters, duplicate_uploads)
+
+	async def _search(query: str, top_k: int, mode: str, filters: dict):
+		filters = await _resolve_filters(filters)
+		query_vector = await _embed_query(query)
+		retrieved = await _run(
+			_search_store, vector_store, query, query_vector, top_k, mode, filters, hybrid_options, bool(mmr_options)
+		)
+		return query_vector, retrieved
+
+	def _retrieve_shared(query: str, top_k: int, mode: str, filters: dict):
+		key = (normalize_query(query), top_k, mode, filters_key(filters))
+		return retrievals.do(key, lambda: _retrieve(query, top_k, mode, filters))
+
+	async def _generate(query: str, query_vector, retrieved: list[dict]) -> dict:
+		"""Return the answer fields of a response; LLM errors propagate."""
+		cached_answer = answer_cache.lookup(query_vector, retrieved) if answer_cache is not None else None
+		if cached_answer is not None:
+			return {'answer': cached_answer, 'cached': True}
+
+		messages, segments = _prepare_prompt(query, retrieved, context_options)
+		with request_stage('llm'):
+			ai_message = await llm.ainvoke(messages)
+		answer = _message_to_text(ai_message).strip()
+		usage = getattr(ai_message, 'usage_metadata', None) or {}
+		if answer_cache is not None:
+			answer_cache.store(query_vector, retrieved, answer)
+		return {
+			'segments': _segment_citations(segments),
+			'prompt_tokens': usage.get('input_tokens') or _prompt_tokens(messages),
+			'answer': answer,
+		}
+
+	async def _answer(query: str, top_k: int, mode: str, filters: dict):
+		"""Build the ``/chat/search`` response body and status code."""
+		try:
+			query_vector, retrieved = await _retrieve_shared(query, top_k, mode, filters)
+		except Exception as exc:
+			return {'error': 'search_failed', 'details': str(exc)}, 500
+
+		if not retrieved:
+			return {'query': query, 'top_k': top_k, 'mode': mode, 'results': [], 'answer': NO_CONTEXT_ANSWER}, 200
+
+		try:
+			generated = await _generate(query, query_vector, retrieved)
+		except Exception as exc:
+			return {'error': 'generation_failed', 'details': str(exc), 'results': retrieved}, 500
+
+		return {'query': query, 'top_k': top_k, 'mode': mode, 'results': retrieved, **generated}, 200
+
+	def _invalid_mode(mode: str):
+		if _supports_mode(vector_store, mode):
+			return None
+		return jsonify({'error': 'unsupported mode', 'allowed': list(SEARCH_MODES)}), 400
+
+	@bp.route('/chat/search', methods=['POST'])
+	async def search():
+		payload = await request.get_json(silent=True) or {}
+		query, top_k, mode = _parse_search_payload(payload)
+		if query is None:
+			return jsonify({'error': 'missing query'}), 400
+		invalid = _invalid_mode(mode)
+		if invalid is not None:
+			return invalid
+		filters, error = _parse_filters(payload)
+		if error:
+			return jsonify({'error': 'invalid filters', 'details': error}), 400
+
+		key = (normalize_query(query), top_k, mode, filters_key(filters))
+		body, status = await answers.do(key, lambda: _answer(query, top_k, mode, filters))
+		# coalesced callers asked the same question, possibly with different casing
+		return jsonify({**body, 'query': query} if 'query' in body else body), status
+
+	@bp.route('/chat/search/batch', methods=['POST'])
+	async def search_batch():
+		"""Batch variant of ``/chat/search``; same payload and response as the sync route."""
+		payload = await request.get_json(silent=True) or {}
+		queries, top_k, generate, error = _parse_batch_payload(payload, batch.get('max_queries', 50))
+		if error:
+			return jsonify({'error': error}), 400
+		filters, error = _parse_filters(payload)
+		if error:
+			return jsonify({'error': 'invalid filters', 'details': error}), 400
+
+		try:
+			filters = await _resolve_filters(filters)
+			query_vectors = await _embed_queries(queries)
+			retrieved = await _timed(
+				'knn_search',
+				_search_batch,
+				vector_store,
+				query_vectors,
+				_mmr_candidates(top_k, mmr_options),
+				filters,
+				bool(mmr_options),
+			)
+			retrieved = [
+				_diversify(query_vector, results, top_k, mmr_options)
+				for query_vector, results in zip(query_vectors, retrieved)
+			]
+		except Exception as exc:
+			return jsonify({'error': 'search_failed', 'details': str(exc)}), 500
+
+		items = [{'query': query, 'results': results} for query, results in zip(queries, retrieved)]
+		if generate:
+			limit = asyncio.Semaphore(max(1, batch.get('concurrency', 4)))
+
+			async def _generate_item(query, query_vector, results):
+				if not results:
+					return {'answer': NO_CONTEXT_ANSWER}
+				async with limit:
+					try:
+						return await _generate(query, query_vector, results)
+					except Exception as exc:
+						return {'error': 'generation_failed', 'details': str(exc)}
+
+			generated = await asyncio.gather(*(_generate_item(*args) for args in zip(queries, query_vectors, retrieved)))
+			for item, fields in zip(items, generated):
+				item.update(fields)
+
+		return jsonify({'top_k': top_k, 'mode': 'vector', 'results': items})
+
+	@bp.route('/chat/search/stream', methods=['POST'])
+	async def search_stream():
+		"""Server-Sent Events variant of ``/chat/search``; same events as the sync route."""
+		payload = await request.get_json(silent=True) or {}
+		query, top_k, mode = _parse_search_payload(payload)
+		if query is None:
+			return jsonify({'error': 'missing query'}), 400
+		invalid = _invalid_mode(mode)
+		if invalid is not None:
+			return invalid
+		filters, error = _parse_filters(payload)
+		if error:
+			return jsonify({'error': 'invalid filters', 'details': error}), 400
+
+		try:
+			query_vector, retrieved = await _retrieve_shared(query, top_k, mode, filters)
+		except Exception as exc:
+			return jsonify({'error': 'search_failed', 'details': str(exc)}), 500
+
+		async def events():
+			yield _sse('results', {'query': query, 'top_k': top_k, 'mode': mode, 'results': retrieved})
+			if not retrieved:
+				yield _sse('done', {'answer': NO_CONTEXT_ANSWER})
+				return
+
+			cached_answer = answer_cache.lookup(query_vector, retrieved) if answer_cache is not None else None
+			if cached_answer is not None:
+				yield _sse('token', {'text': cached_answer})
+				yield _sse('done', {'answer': cached_answer, 'cached': True})
+				return
+
+			messages, segments = _prepare_prompt(query, retrieved, context_options)
+			yield _sse('segments', {'segments': _segment_citations(segments), 'prompt_tokens': _prompt_tokens(messages)})
+			parts = []
+			try:
+				with request_stage('llm'):
+					async for chunk in llm.astream(messages):
+						text = _message_to_text(chunk)
+						if text:
+							parts.append(text)
+							yield _sse('token', {'text': text})
+			except Exception as exc:
+				yield _sse('error', {'error': 'generation_failed', 'details': str(exc)})
+				return
+
+			answer = ''.join(parts).strip()
+			if answer_cache is not None:
+				answer_cache.store(query_vector, retrieved, answer)
+			yield _sse('done', {'answer': answer})
+
+		return Response(
+			events(),
+			mimetype='text/event-stream',
+			headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+		)
+
+	if not cache_admin_token:
+		return bp
+
+	@bp.route('/chat/cache/invalidate', methods=['POST'])
+	async def invalidate_cache():
+		if not _cache_admin_authorized(request.headers, cache_admin_token):
+			return jsonify({'error': 'unauthorized'}), 401
+		payload = await request.get_json(silent=True) or {}
+		doc_id = payload.get('doc_id')
+		if not doc_id:
+			return jsonify({'error': 'missing doc_id'}), 400
+		removed = answer_cache.invalidate_doc(doc_id) if answer_cache is not None else 0
+		return jsonify({'doc_id': doc_id, 'invalidated': removed})
+
+	return bp
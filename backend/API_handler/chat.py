@@ -1,19 +1,47 @@
-from flask import Blueprint, request, jsonify
+import hmac
+import json
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Blueprint, Response, g, request, jsonify
 from langchain_core.messages import HumanMessage, SystemMessage
 
+from AWS_utils.search_filters import SHARED_DOC_FIELD, normalize_filters
+from backend.API_handler.chat_cache import normalize_query
+from backend.API_handler.context_packing import estimate_tokens, pack_context
+from backend.API_handler.diversity import mmr_rerank
+from metrics import REQUEST_SECONDS, request_stage
+
+NO_CONTEXT_ANSWER = 'I do not have enough information to answer that question.'
+SEARCH_MODES = ('vector', 'hybrid')
+CACHE_ADMIN_HEADER = 'X-Cache-Admin-Token'
+
 
-def _format_context(results: list[dict]) -> str:
-	segments = []
-	for idx, chunk in enumerate(results, start=1):
-		file_name = chunk.get('file_name') or 'unknown file'
-		doc_id = chunk.get('doc_id') or 'unknown doc'
-		chunk_index = chunk.get('chunk_index')
-		snippet = (chunk.get('text') or '').strip()
-		segments.append(
-			f"Segment [{idx}] — file: {file_name}, doc_id: {doc_id}, chunk: {chunk_index}\n"
-			f"Content:\n{snippet}"
+def _format_context(segments: list[dict]) -> str:
+	formatted = []
+	for segment in segments:
+		file_name = segment.get('file_name') or 'unknown file'
+		doc_id = segment.get('doc_id') or 'unknown doc'
+		chunks = ', '.join(str(idx) for idx in segment['chunk_indices'])
+		formatted.append(
+			f"Segment [{segment['segment']}] — file: {file_name}, doc_id: {doc_id}, chunks: {chunks}\n"
+			f"Content:\n{segment['text']}"
 		)
-	return '\n\n'.join(segments) if segments else 'No supporting context available.'
+	return '\n\n'.join(formatted) if formatted else 'No supporting context available.'
+
+
+def _segment_citations(segments: list[dict]) -> list[dict]:
+	return [{key: value for key, value in segment.items() if key != 'text'} for segment in segments]
+
+
+def _cache_admin_authorized(headers, cache_admin_token: str) -> bool:
+	# constant-time comparison, so the token cannot be guessed byte by byte
+	return hmac.compare_digest(headers.get(CACHE_ADMIN_HEADER, ''), cache_admin_token)
+
+
+def _prompt_tokens(messages: list) -> int:
+	return sum(estimate_tokens(message.content) for message in messages)
 
 
 def _build_messages(user_query: str, context_text: str) -> list:
@@ -55,7 +83,207 @@ def _message_to_text(message) -> str:
 	return str(content)
 
 
-def create_chat_blueprint(embeddings, vector_store, llm):
+def _parse_search_payload(payload: dict):
+	"""Return ``(query, top_k, mode)`` from a search payload; ``query`` is None when missing."""
+	query = payload.get('query') or payload.get('question') or payload.get('prompt')
+	if not query or not query.strip():
+		return None, None, None
+
+	top_k = payload.get('top_k') or payload.get('k') or 5
+	try:
+		top_k = int(top_k)
+	except (TypeError, ValueError):
+		top_k = 5
+	mode = str(payload.get('mode') or 'vector').lower()
+	return query, max(1, min(top_k, 20)), mode
+
+
+def _parse_filters(payload: dict):
+	"""Return ``(filters, error)`` from the optional ``filters`` of a search payload."""
+	try:
+		return normalize_filters(payload.get('filters')), None
+	except ValueError as exc:
+		return None, str(exc)
+
+
+def _share_duplicates(filters: dict, duplicate_uploads) -> dict:
+	"""Extend ``filters`` to the documents that deduplicated uploads point at.
+
+	A duplicate upload has no chunks of its own; they are indexed under the
+	canonical document, with the first uploader's ``uploader_id``. A
+	``doc_id`` filter naming a duplicate also matches its canonical document,
+	and an ``uploader_id`` filter also matches the canonical documents of that
+	uploader's duplicates. ``duplicate_uploads`` is
+	``AWS_utils.db.fetch_duplicate_uploads``; None leaves ``filters`` as is.
+	"""
+	if duplicate_uploads is None or not ({'uploader_id', 'doc_id'} & set(filters or {})):
+		return filters
+	uploader_ids = filters.get('uploader_id') or []
+	doc_ids = filters.get('doc_id') or []
+	duplicates = duplicate_uploads(uploader_ids=uploader_ids, doc_ids=doc_ids)
+	resolved = dict(filters)
+	canonical = {row['duplicate_of'] for row in duplicates if row['doc_id'] in doc_ids}
+	if canonical:
+		resolved['doc_id'] = sorted(set(doc_ids) | canonical)
+	shared = {row['duplicate_of'] for row in duplicates if row['uploader_id'] in uploader_ids}
+	if shared:
+		resolved[SHARED_DOC_FIELD] = sorted(shared)
+	return resolved
+
+
+def _parse_batch_payload(payload: dict, max_queries: int = 50):
+	"""Return ``(queries, top_k, generate, error)`` from a batch search payload."""
+	queries = payload.get('queries')
+	if not isinstance(queries, list) or not queries:
+		return None, None, None, 'missing queries'
+	if len(queries) > max_queries:
+		return None, None, None, f'at most {max_queries} queries per batch'
+	if not all(isinstance(q, str) and q.strip() for q in queries):
+		return None, None, None, 'queries must be non-empty strings'
+	_, top_k, mode = _parse_search_payload({**payload, 'query': queries[0]})
+	if mode != 'vector':
+		# batch retrieval is one kNN msearch, so other modes cannot be honoured
+		return None, None, None, f'unsupported mode {mode!r} for batch search; only "vector" is allowed'
+	return queries, top_k, bool(payload.get('generate', False)), None
+
+
+def _embed_queries(embeddings, query_cache, queries: list[str], concurrency: int = 4) -> list[list[float]]:
+	"""Embed ``queries`` in input order with one ``embed_query`` call per distinct query.
+
+	Batch queries are embedded as queries, like single searches, so they can
+	share the query cache with them; models such as Cohere embed queries and
+	documents differently. Cache misses run on up to ``concurrency`` threads.
+	"""
+	unique = {}
+	for query in queries:
+		unique.setdefault(normalize_query(query), query)
+	vectors = {}
+	if query_cache is not None:
+		for key, query in unique.items():
+			vector = query_cache.lookup(query)
+			if vector is not None:
+				vectors[key] = vector
+	misses = [key for key in unique if key not in vectors]
+	# QueryEmbeddingCache.embed_query stores what it embeds
+	embed = (query_cache or embeddings).embed_query
+	if len(misses) == 1 or concurrency <= 1:
+		vectors.update((key, embed(unique[key])) for key in misses)
+	elif misses:
+		with ThreadPoolExecutor(max_workers=min(concurrency, len(misses))) as pool:
+			vectors.update(zip(misses, pool.map(embed, [unique[key] for key in misses])))
+	return [vectors[normalize_query(q)] for q in queries]
+
+
+def _search_batch(
+	vector_store,
+	query_vectors: list[list[float]],
+	top_k: int,
+	filters: dict | None = None,
+	with_vectors: bool = False,
+) -> list[list[dict]]:
+	if hasattr(vector_store, 'knn_search_batch'):
+		return vector_store.knn_search_batch(query_vectors, top_k=top_k, filters=filters, with_vectors=with_vectors)
+	return [
+		vector_store.knn_search(vector, top_k=top_k, filters=filters, with_vectors=with_vectors)
+		for vector in query_vectors
+	]
+
+
+def _mmr_candidates(top_k: int, mmr_options: dict | None) -> int:
+	"""Number of hits to retrieve for ``top_k`` results; MMR selects from an over-fetched pool."""
+	if not mmr_options:
+		return top_k
+	return max(top_k, min(math.ceil(top_k * mmr_options.get('oversample', 4.0)), 50))
+
+
+def _diversify(query_vector, retrieved: list[dict], top_k: int, mmr_options: dict | None) -> list[dict]:
+	if not mmr_options:
+		return retrieved
+	with request_stage('mmr'):
+		return mmr_rerank(query_vector, retrieved, top_k, mmr_options.get('lambda_mult', 0.5))
+
+
+def _search_store(
+	vector_store,
+	query: str,
+	query_vector: list[float],
+	top_k: int,
+	mode: str,
+	filters: dict | None = None,
+	hybrid_options: dict | None = None,
+	with_vectors: bool = False,
+) -> list[dict]:
+	"""Retrieve ``top_k`` hits for ``mode``; shared by the sync and async routes.
+
+	Hybrid mode sends BM25 and kNN in one ``hybrid_search`` round trip.
+	"""
+	if mode == 'hybrid':
+		with request_stage('hybrid_search'):
+			return vector_store.hybrid_search(
+				query,
+				query_vector,
+				top_k=top_k,
+				filters=filters,
+				with_vectors=with_vectors,
+				**(hybrid_options or {}),
+			)
+	with request_stage('knn_search'):
+		return vector_store.knn_search(query_vector, top_k=top_k, filters=filters, with_vectors=with_vectors)
+
+
+def _supports_mode(vector_store, mode: str) -> bool:
+	return mode in SEARCH_MODES and (mode != 'hybrid' or hasattr(vector_store, 'hybrid_search'))
+
+
+def _prepare_prompt(query: str, retrieved: list[dict], context_options: dict | None = None):
+	segments = pack_context(retrieved, **(context_options or {}))
+	messages = _build_messages(query, _format_context(segments))
+	return messages, segments
+
+
+def _sse(event: str, data: dict) -> str:
+	return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def create_chat_blueprint(
+	embeddings,
+	vector_store,
+	llm,
+	query_cache=None,
+	answer_cache=None,
+	hybrid_options=None,
+	context_options=None,
+	batch_options=None,
+	mmr_options=None,
+	duplicate_uploads=None,
+	cache_admin_token=None,
+):
+	"""Return the chat blueprint.
+
+	query_cache: optional ``QueryEmbeddingCache`` used instead of calling
+	  ``embeddings.embed_query`` directly.
+	answer_cache: optional ``AnswerCache`` consulted after retrieval; a hit
+	  skips the LLM call.
+	hybrid_options: keyword arguments (weights, rank constant) forwarded to
+	  ``vector_store.hybrid_search`` for ``mode="hybrid"`` requests.
+	context_options: keyword arguments (``token_budget``, ``dedupe_threshold``)
+	  forwarded to ``pack_context``.
+	batch_options: ``max_queries`` per ``/chat/search/batch`` request and the
+	  ``concurrency`` of its query embedding and optional answer generation.
+	mmr_options: when set, ``oversample * top_k`` hits are retrieved with
+	  their vectors and ``top_k`` of them are kept by Maximal Marginal
+	  Relevance with ``lambda_mult`` (see ``mmr_rerank``).
+	duplicate_uploads: optional ``AWS_utils.db.fetch_duplicate_uploads``, so
+	  filters also match the documents deduplicated uploads point at (see
+	  ``_share_duplicates``).
+	cache_admin_token: shared secret that ``/chat/cache/invalidate`` requires
+	  in the ``X-Cache-Admin-Token`` header. Without it the route is not
+	  registered, and cached answers are only evicted on re-index events.
+
+	Every search route accepts an optional ``filters`` object, e.g.
+	``{"uploader_id": "u-1"}`` or ``{"doc_id": ["a", "b"]}``, that restricts
+	retrieval to the matching chunks.
+	"""
 	if embeddings is None:
 		raise ValueError('embeddings client is required for chat blueprint')
 	if vector_store is None:
@@ -64,24 +292,76 @@ def create_chat_blueprint(embeddings, vector_store, llm):
 		raise ValueError('LLM client is required for chat blueprint')
 
 	bp = Blueprint('chat_api', __name__)
+	batch = batch_options or {}
+
+	@bp.before_request
+	def _start_timer():
+		g.request_started = time.perf_counter()
+
+	@bp.after_request
+	def _observe_request(response):
+		route = request.url_rule.rule if request.url_rule is not None else request.path
+		REQUEST_SECONDS.labels(route=route, status=str(response.status_code)).observe(
+			time.perf_counter() - g.request_started
+		)
+		return response
+
+	def _retrieve(query: str, top_k: int, mode: str, filters: dict):
+		with request_stage('filter_resolution'):
+			filters = _share_duplicates(filters, duplicate_uploads)
+		with request_stage('query_embedding'):
+			query_vector = (query_cache or embeddings).embed_query(query)
+		retrieved = _search_store(
+			vector_store,
+			query,
+			query_vector,
+			_mmr_candidates(top_k, mmr_options),
+			mode,
+			filters,
+			hybrid_options,
+			bool(mmr_options),
+		)
+		return query_vector, _diversify(query_vector, retrieved, top_k, mmr_options)
+
+	def _generate(query: str, query_vector, retrieved: list[dict]) -> dict:
+		"""Return the answer fields of a response; LLM errors propagate."""
+		cached_answer = answer_cache.lookup(query_vector, retrieved) if answer_cache is not None else None
+		if cached_answer is not None:
+			return {'answer': cached_answer, 'cached': True}
+
+		messages, segments = _prepare_prompt(query, retrieved, context_options)
+		with request_stage('llm'):
+			ai_message = llm.invoke(messages)
+		answer = _message_to_text(ai_message).strip()
+		usage = getattr(ai_message, 'usage_metadata', None) or {}
+		if answer_cache is not None:
+			answer_cache.store(query_vector, retrieved, answer)
+		return {
+			'segments': _segment_citations(segments),
+			'prompt_tokens': usage.get('input_tokens') or _prompt_tokens(messages),
+			'answer': answer,
+		}
+
+	def _invalid_mode(mode: str):
+		if _supports_mode(vector_store, mode):
+			return None
+		return jsonify({'error': 'unsupported mode', 'allowed': list(SEARCH_MODES)}), 400
 
 	@bp.route('/chat/search', methods=['POST'])
 	def search():
 		payload = request.get_json(silent=True) or {}
-		query = payload.get('query') or payload.get('question') or payload.get('prompt')
-		if not query or not query.strip():
+		query, top_k, mode = _parse_search_payload(payload)
+		if query is None:
 			return jsonify({'error': 'missing query'}), 400
-
-		top_k = payload.get('top_k') or payload.get('k') or 5
-		try:
-			top_k = int(top_k)
-		except (TypeError, ValueError):
-			top_k = 5
-		top_k = max(1, min(top_k, 20))
+		invalid = _invalid_mode(mode)
+		if invalid is not None:
+			return invalid
+		filters, error = _parse_filters(payload)
+		if error:
+			return jsonify({'error': 'invalid filters', 'details': error}), 400
 
 		try:
-			query_vector = embeddings.embed_query(query)
-			retrieved = vector_store.knn_search(query_vector, top_k=top_k)
+			query_vector, retrieved = _retrieve(query, top_k, mode, filters)
 		except Exception as exc:
 			return jsonify({'error': 'search_failed', 'details': str(exc)}), 500
 
@@ -89,16 +369,13 @@ def create_chat_blueprint(embeddings, vector_store, llm):
 			return jsonify({
 				'query': query,
 				'top_k': top_k,
+				'mode': mode,
 				'results': [],
-				'answer': 'I do not have enough information to answer that question.',
+				'answer': NO_CONTEXT_ANSWER,
 			})
 
-		context_text = _format_context(retrieved)
-		messages = _build_messages(query, context_text)
-
 		try:
-			ai_message = llm.invoke(messages)
-			answer = _message_to_text(ai_message)
+			generated = _generate(query, query_vector, retrieved)
 		except Exception as exc:
 			return jsonify({
 				'error': 'generation_failed',
@@ -109,8 +386,137 @@ def create_chat_blueprint(embeddings, vector_store, llm):
 		return jsonify({
 			'query': query,
 			'top_k': top_k,
+			'mode': mode,
 			'results': retrieved,
-			'answer': answer.strip(),
+			**generated,
 		})
 
+	@bp.route('/chat/search/batch', methods=['POST'])
+	def search_batch():
+		"""Answer many queries with one ``embed_query`` per distinct query and one retrieval round trip.
+
+		Accepts ``{"queries": [...], "top_k": 5, "generate": false, "filters": {...}}`` and
+		returns one item per query, in input order. Only ``"mode": "vector"``
+		(the default) is supported; other modes are rejected with 400. With ``generate`` the
+		answers are produced ``batch_options["concurrency"]`` at a time; a
+		failed generation only marks its own item with ``error``.
+		"""
+		payload = request.get_json(silent=True) or {}
+		queries, top_k, generate, error = _parse_batch_payload(payload, batch.get('max_queries', 50))
+		if error:
+			return jsonify({'error': error}), 400
+		filters, error = _parse_filters(payload)
+		if error:
+			return jsonify({'error': 'invalid filters', 'details': error}), 400
+
+		try:
+			with request_stage('filter_resolution'):
+				filters = _share_duplicates(filters, duplicate_uploads)
+			with request_stage('query_embedding'):
+				query_vectors = _embed_queries(embeddings, query_cache, queries, batch.get('concurrency', 4))
+			with request_stage('knn_search'):
+				retrieved = _search_batch(
+					vector_store, query_vectors, _mmr_candidates(top_k, mmr_options), filters, bool(mmr_options)
+				)
+			retrieved = [
+				_diversify(query_vector, results, top_k, mmr_options)
+				for query_vector, results in zip(query_vectors, retrieved)
+			]
+		except Exception as exc:
+			return jsonify({'error': 'search_failed', 'details': str(exc)}), 500
+
+		items = [{'query': query, 'results': results} for query, results in zip(queries, retrieved)]
+		if generate:
+			def _generate_item(args):
+				query, query_vector, results = args
+				if not results:
+					return {'answer': NO_CONTEXT_ANSWER}
+				try:
+					return _generate(query, query_vector, results)
+				except Exception as exc:
+					return {'error': 'generation_failed', 'details': str(exc)}
+
+			with ThreadPoolExecutor(max_workers=max(1, batch.get('concurrency', 4))) as pool:
+				generated = pool.map(_generate_item, zip(queries, query_vectors, retrieved))
+				for item, fields in zip(items, generated):
+					item.update(fields)
+
+		return jsonify({'top_k': top_k, 'mode': 'vector', 'results': items})
+
+	@bp.route('/chat/search/stream', methods=['POST'])
+	def search_stream():
+		"""Server-Sent Events variant of ``/chat/search``.
+
+		Emits one ``results`` event as soon as retrieval finishes, a
+		``segments`` event describing the packed prompt, then a ``token`` event
+		per streamed piece of the answer, and finally ``done`` with the full
+		answer (or ``error`` if generation fails midway).
+		"""
+		payload = request.get_json(silent=True) or {}
+		query, top_k, mode = _parse_search_payload(payload)
+		if query is None:
+			return jsonify({'error': 'missing query'}), 400
+		invalid = _invalid_mode(mode)
+		if invalid is not None:
+			return invalid
+		filters, error = _parse_filters(payload)
+		if error:
+			return jsonify({'error': 'invalid filters', 'details': error}), 400
+
+		try:
+			query_vector, retrieved = _retrieve(query, top_k, mode, filters)
+		except Exception as exc:
+			return jsonify({'error': 'search_failed', 'details': str(exc)}), 500
+
+		def events():
+			yield _sse('results', {'query': query, 'top_k': top_k, 'mode': mode, 'results': retrieved})
+			if not retrieved:
+				yield _sse('done', {'answer': NO_CONTEXT_ANSWER})
+				return
+
+			cached_answer = answer_cache.lookup(query_vector, retrieved) if answer_cache is not None else None
+			if cached_answer is not None:
+				yield _sse('token', {'text': cached_answer})
+				yield _sse('done', {'answer': cached_answer, 'cached': True})
+				return
+
+			messages, segments = _prepare_prompt(query, retrieved, context_options)
+			yield _sse('segments', {'segments': _segment_citations(segments), 'prompt_tokens': _prompt_tokens(messages)})
+			parts = []
+			try:
+				with request_stage('llm'):
+					for chunk in llm.stream(messages):
+						text = _message_to_text(chunk)
+						if text:
+							parts.append(text)
+							yield _sse('token', {'text': text})
+			except Exception as exc:
+				yield _sse('error', {'error': 'generation_failed', 'details': str(exc)})
+				return
+
+			answer = ''.join(parts).strip()
+			if answer_cache is not None:
+				answer_cache.store(query_vector, retrieved, answer)
+			yield _sse('done', {'answer': answer})
+
+		return Response(
+			events(),
+			mimetype='text/event-stream',
+			headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+		)
+
+	if not cache_admin_token:
+		return bp
+
+	@bp.route('/chat/cache/invalidate', methods=['POST'])
+	def invalidate_cache():
+		if not _cache_admin_authorized(request.headers, cache_admin_token):
+			return jsonify({'error': 'unauthorized'}), 401
+		payload = request.get_json(silent=True) or {}
+		doc_id = payload.get('doc_id')
+		if not doc_id:
+			return jsonify({'error': 'missing doc_id'}), 400
+		removed = answer_cache.invalidate_doc(doc_id) if answer_cache is not None else 0
+		return jsonify({'doc_id': doc_id, 'invalidated': removed})
+
 	return bp
@@ -0,0 +1,189 @@
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_query(query: str) -> str:
+	return ' '.join(query.lower().split())
+
+
+class TTLCache:
+	"""Thread-safe LRU cache whose entries expire after ``ttl_seconds``."""
+
+	def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600):
+		self.max_entries = max_entries
+		self.ttl_seconds = ttl_seconds
+		self._entries: OrderedDict = OrderedDict()
+		self._lock = threading.Lock()
+
+	def get(self, key):
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is None:
+				return None
+			value, expires_at = entry
+			if expires_at < time.monotonic():
+				del self._entries[key]
+				return None
+			self._entries.move_to_end(key)
+			return value
+
+	def put(self, key, value):
+		with self._lock:
+			self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+			self._entries.move_to_end(key)
+			while len(self._entries) > self.max_entries:
+				self._entries.popitem(last=False)
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+
+
+class QueryEmbeddingCache:
+	"""Caches query vectors by embedding model and normalized query text in front of ``embed_query``."""
+
+	def __init__(self, embeddings, max_entries: int = 4096, ttl_seconds: float = 3600):
+		self.embeddings = embeddings
+		self._cache = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+
+	def _key(self, query: str):
+		# the model changes when a migration cutover repoints the index (IndexEmbeddings)
+		return getattr(self.embeddings, 'model_id', None), normalize_query(query)
+
+	def lookup(self, query: str):
+		return self._cache.get(self._key(query))
+
+	def store(self, query: str, vector: list[float]):
+		self._cache.put(self._key(query), vector)
+
+	def embed_query(self, query: str) -> list[float]:
+		vector = self.lookup(query)
+		if vector is None:
+			vector = self.embeddings.embed_query(query)
+			self.store(query, vector)
+		return vector
+
+
+def _cosine(a: list[float], b: list[float]) -> float:
+	if len(a) != len(b):
+		# vectors of different embedding models
+		return 0.0
+	dot = sum(x * y for x, y in zip(a, b))
+	norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+	return dot / norm if norm else 0.0
+
+
+def retrieval_fingerprint(results: list[dict]) -> str:
+	"""Hash the retrieved chunk ids together with their text.
+
+	A re-indexed chunk with new content produces a different fingerprint, so
+	stale answers are never served even if no explicit invalidation arrives.
+	"""
+	digest = hashlib.sha256()
+	for chunk_id, text in sorted((str(r.get('id')), r.get('text') or '') for r in results):
+		digest.update(chunk_id.encode('utf-8'))
+		digest.update(b'\0')
+		digest.update(hashlib.sha256(text.encode('utf-8')).digest())
+	return digest.hexdigest()
+
+
+class AnswerCache:
+	"""Semantic answer cache keyed by retrieved chunks plus query similarity.
+
+	An answer is reused when a new query retrieves exactly the same chunks
+	(same ids and text) and its vector has cosine similarity of at least
+	``similarity_threshold`` with the query that produced the answer.
+	Entries are indexed by retrieval fingerprint and by doc_id, so a lookup
+	only compares vectors of the entries with the same fingerprint and an
+	invalidation only touches the entries of that document.
+	"""
+
+	def __init__(self, max_entries: int = 2048, ttl_seconds: float = 3600, similarity_threshold: float = 0.97):
+		self.max_entries = max_entries
+		self.ttl_seconds = ttl_seconds
+		self.similarity_threshold = similarity_threshold
+		# entry_id -> entry, least recently used first
+		self._entries: OrderedDict = OrderedDict()
+		self._by_fingerprint: dict[str, dict[int, dict]] = {}
+		self._by_doc: dict[str, set[int]] = {}
+		self._next_id = 0
+		self._lock = threading.Lock()
+
+	def _remove(self, entry_id: int):
+		entry = self._entries.pop(entry_id)
+		bucket = self._by_fingerprint[entry['fingerprint']]
+		del bucket[entry_id]
+		if not bucket:
+			del self._by_fingerprint[entry['fingerprint']]
+		for doc_id in entry['doc_ids']:
+			ids = self._by_doc[doc_id]
+			ids.discard(entry_id)
+			if not ids:
+				del self._by_doc[doc_id]
+
+	def lookup(self, query_vector: list[float], results: list[dict]):
+		fingerprint = retrieval_fingerprint(results)
+		now = time.monotonic()
+		with self._lock:
+			for entry_id, entry in list(self._by_fingerprint.get(fingerprint, {}).items()):
+				if entry['expires_at'] < now:
+					self._remove(entry_id)
+					continue
+				if _cosine(query_vector, entry['vector']) >= self.similarity_threshold:
+					self._entries.move_to_end(entry_id)
+					return entry['answer']
+		return None
+
+	def store(self, query_vector: list[float], results: list[dict], answer: str):
+		now = time.monotonic()
+		entry = {
+			'vector': list(query_vector),
+			'fingerprint': retrieval_fingerprint(results),
+			'doc_ids': {r.get('doc_id') for r in results},
+			'answer': answer,
+			'expires_at': now + self.ttl_seconds,
+		}
+		with self._lock:
+			self._next_id += 1
+			self._entries[self._next_id] = entry
+			self._by_fingerprint.setdefault(entry['fingerprint'], {})[self._next_id] = entry
+			for doc_id in entry['doc_ids']:
+				self._by_doc.setdefault(doc_id, set()).add(self._next_id)
+			# evict over capacity, and expired entries that reached the LRU end
+			while self._entries:
+				entry_id, oldest = next(iter(self._entries.items()))
+				if len(self._entries) <= self.max_entries and oldest['expires_at'] >= now:
+					break
+				self._remove(entry_id)
+
+	def invalidate_doc(self, doc_id: str) -> int:
+		with self._lock:
+			stale = list(self._by_doc.get(doc_id, ()))
+			for entry_id in stale:
+				self._remove(entry_id)
+		return len(stale)
+
+
+def invalidate_on_reindex(answer_cache: AnswerCache, events, stop_event: threading.Event | None = None) -> threading.Thread:
+	"""Drop the cached answers of every doc_id ``events`` reports, on a daemon thread.
+
+	``events`` is a ``PostgresUploadListener`` on ``AWS_utils.db.INDEX_CHANNEL``,
+	which the ingestion worker notifies whenever it (re-)indexes a document,
+	or anything else with ``wait(timeout) -> [doc_id, ...]`` and ``close()``.
+	"""
+	stop_event = stop_event or threading.Event()
+
+	def _listen():
+		try:
+			while not stop_event.is_set():
+				for doc_id in events.wait(1.0):
+					answer_cache.invalidate_doc(doc_id)
+		finally:
+			events.close()
+
+	thread = threading.Thread(target=_listen, name='answer-cache-invalidation', daemon=True)
+	thread.start()
+	return thread
@@ -0,0 +1,116 @@
+import math
+import re
+
+_WORD = re.compile(r'\S+')
+
+
+def estimate_tokens(text: str) -> int:
+	# ~4 characters per token for English text with the Claude/Titan tokenizers
+	return max(1, math.ceil(len(text) / 4)) if text else 0
+
+
+def _shingles(text: str, size: int = 5) -> set:
+	words = [w.lower() for w in _WORD.findall(text)]
+	if len(words) <= size:
+		return {tuple(words)} if words else set()
+	return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _jaccard(a: set, b: set) -> float:
+	if not a or not b:
+		return 0.0
+	return len(a & b) / len(a | b)
+
+
+def _join_adjacent(left: str, right: str, min_overlap_words: int = 5, max_overlap_words: int = 200) -> str:
+	"""Concatenate two consecutive chunks, dropping words the splitter repeated as overlap."""
+	left_words = left.split()
+	right_words = right.split()
+	for size in range(min(max_overlap_words, len(left_words), len(right_words)), min_overlap_words - 1, -1):
+		if left_words[-size:] == right_words[:size]:
+			return left + ' ' + ' '.join(right_words[size:]) if size < len(right_words) else left
+	return f'{left}\n{right}'
+
+
+def _merge_adjacent(results: list[dict]) -> list[dict]:
+	"""Group results into runs of consecutive chunks of the same document.
+
+	Groups are ordered by the rank of their most relevant member.
+	"""
+	groups: list[dict] = []
+	for rank, result in enumerate(results):
+		doc_id = result.get('doc_id')
+		chunk_index = result.get('chunk_index')
+		touching = [
+			g for g in groups
+			if doc_id is not None and chunk_index is not None and g['doc_id'] == doc_id
+			and (chunk_index == g['first'] - 1 or chunk_index == g['last'] + 1)
+		]
+		if not touching:
+			groups.append({
+				'rank': rank,
+				'doc_id': doc_id,
+				'file_name': result.get('file_name'),
+				'first': chunk_index,
+				'last': chunk_index,
+				'chunks': [result],
+			})
+			continue
+		target = touching[0]
+		target['chunks'].append(result)
+		for other in touching[1:]:
+			# the new chunk bridges two runs
+			target['chunks'].extend(other['chunks'])
+			target['rank'] = min(target['rank'], other['rank'])
+			groups.remove(other)
+		indices = [c['chunk_index'] for c in target['chunks']]
+		target['first'], target['last'] = min(indices), max(indices)
+	groups.sort(key=lambda g: g['rank'])
+	for group in groups:
+		group['chunks'].sort(key=lambda c: c['chunk_index'] if c.get('chunk_index') is not None else 0)
+		text = ''
+		for chunk in group['chunks']:
+			snippet = (chunk.get('text') or '').strip()
+			text = _join_adjacent(text, snippet) if text else snippet
+		group['text'] = text
+	return groups
+
+
+def pack_context(results: list[dict], token_budget: int = 3000, dedupe_threshold: float = 0.85) -> list[dict]:
+	"""Turn ranked chunks into numbered prompt segments within ``token_budget``.
+
+	Adjacent chunks of the same ``doc_id`` are merged, segments whose 5-word
+	shingles overlap an already kept segment by at least ``dedupe_threshold``
+	(Jaccard) are dropped, and the rest are added in relevance order while
+	they fit. Segments are numbered 1..n in that order, which is the numbering
+	the model cites.
+	"""
+	kept: list[dict] = []
+	kept_shingles: list[set] = []
+	used = 0
+	for group in _merge_adjacent(results):
+		text = group['text']
+		if not text:
+			continue
+		shingles = _shingles(text)
+		if any(_jaccard(shingles, other) >= dedupe_threshold for other in kept_shingles):
+			continue
+		tokens = estimate_tokens(text)
+		if used + tokens > token_budget:
+			if kept:
+				continue
+			# always keep the best segment, truncated to the budget
+			text = text[:token_budget * 4]
+			tokens = estimate_tokens(text)
+		kept_shingles.append(shingles)
+		used += tokens
+		kept.append({
+			'segment': len(kept) + 1,
+			'doc_id': group['doc_id'],
+			'file_name': group['file_name'],
+			'chunk_ids': [c.get('id') for c in group['chunks']],
+			'chunk_indices': [c.get('chunk_index') for c in group['chunks']],
+			'text': text,
+			'tokens': tokens,
+		})
+	return kept
@@ -0,0 +1,40 @@
+import numpy as np
+
+
+def mmr_rerank(query_vector, results: list[dict], top_k: int, lambda_mult: float = 0.5) -> list[dict]:
+	"""Pick ``top_k`` of ``results`` by Maximal Marginal Relevance over their ``embedding`` vectors.
+
+	Each step takes the candidate maximising
+	``lambda_mult * sim(query, c) - (1 - lambda_mult) * max(sim(c, s) for s in selected)``
+	with cosine similarity, so ``1.0`` ranks by query similarity alone and lower
+	values trade relevance for distinct chunks. The pairwise similarities are
+	one matrix product; the returned results no longer carry ``embedding``.
+	"""
+	if not 0.0 <= lambda_mult <= 1.0:
+		raise ValueError('lambda_mult must be between 0 and 1')
+	if not results or any(result.get('embedding') is None for result in results):
+		# without vectors (e.g. a store that does not return them) keep the relevance order
+		return [_strip_vector(result) for result in results[:top_k]]
+
+	vectors = np.asarray([result['embedding'] for result in results], dtype=np.float32)
+	vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+	query = np.asarray(query_vector, dtype=np.float32)
+	query /= max(float(np.linalg.norm(query)), 1e-12)
+	relevance = vectors @ query
+	pairwise = vectors @ vectors.T
+
+	selected = [int(np.argmax(relevance))]
+	available = np.ones(len(results), dtype=bool)
+	available[selected[0]] = False
+	redundancy = pairwise[selected[0]].copy()
+	while len(selected) < min(top_k, len(results)):
+		scores = np.where(available, lambda_mult * relevance - (1.0 - lambda_mult) * redundancy, -np.inf)
+		best = int(np.argmax(scores))
+		selected.append(best)
+		available[best] = False
+		np.maximum(redundancy, pairwise[best], out=redundancy)
+	return [_strip_vector(results[idx]) for idx in selected]
+
+
+def _strip_vector(result: dict) -> dict:
+	return {key: value for key, value in result.items() if key != 'embedding'}
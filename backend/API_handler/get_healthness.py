@@ -1,16 +1,48 @@
+import time
+
 from flask import Blueprint, jsonify
 
+from metrics import set_queue_depth
+
+
+def _timed_check(check) -> dict:
+    start = time.perf_counter()
+    try:
+        check()
+    except Exception as exc:
+        return {'ok': False, 'latency_ms': round((time.perf_counter() - start) * 1000, 1), 'error': str(exc)}
+    return {'ok': True, 'latency_ms': round((time.perf_counter() - start) * 1000, 1)}
 
-def create_health_blueprint(uploads_repo):
-    """Create a blueprint that exposes a DB health endpoint.
 
-    uploads_repo: instance of UploadsRepository (or wrapper) — the function will
-    access its underlying engine to run a simple SELECT 1.
+def create_health_blueprint(dependencies: dict | None = None, queue_depth=None):
+    """Create a blueprint that exposes a dependency health endpoint.
+
+    dependencies: ``{name: callable}``; each callable raises when its
+      dependency is unreachable (e.g. ``vector_store.ping``). The endpoint
+      reports whether each check passed and how long it took.
+    queue_depth: optional callable returning the ``uploads`` queue depth
+      (``AWS_utils.db.count_pending_uploads``); its latency is reported as
+      the ``database`` dependency.
+    Responds 503 when any check fails.
     """
     bp = Blueprint('health_api', __name__)
 
     @bp.route('/get_healthness', methods=['GET'])
     def get_healthness():
-       return jsonify({'status': 'healthy'})
+        checks = {name: _timed_check(check) for name, check in (dependencies or {}).items()}
+        body = {'dependencies': checks}
+        if queue_depth is not None:
+            depth = {}
+
+            def _read_queue():
+                depth.update(queue_depth())
+
+            checks['database'] = _timed_check(_read_queue)
+            if depth:
+                body['queue'] = depth
+                set_queue_depth(depth)
+        healthy = all(check['ok'] for check in checks.values())
+        body['status'] = 'healthy' if healthy else 'unhealthy'
+        return jsonify(body), 200 if healthy else 503
 
-    return bp
\ No newline at end of file
+    return bp
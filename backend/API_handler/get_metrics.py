@@ -0,0 +1,28 @@
+import logging
+
+from flask import Blueprint, Response
+
+from metrics import render_latest, set_queue_depth
+
+logger = logging.getLogger(__name__)
+
+
+def create_metrics_blueprint(queue_depth=None):
+    """Create a blueprint serving Prometheus metrics at ``/metrics``.
+
+    queue_depth: optional callable returning the ``uploads`` queue depth
+      (``AWS_utils.db.count_pending_uploads``), refreshed on every scrape.
+    """
+    bp = Blueprint('metrics_api', __name__)
+
+    @bp.route('/metrics', methods=['GET'])
+    def get_metrics():
+        if queue_depth is not None:
+            try:
+                set_queue_depth(queue_depth())
+            except Exception:
+                logger.exception('failed to read upload queue depth')
+        body, content_type = render_latest()
+        return Response(body, content_type=content_type)
+
+    return bp
@@ -1,25 +1,54 @@
 from flask import Blueprint, request, jsonify
 from werkzeug.utils import secure_filename
+import hashlib
 import uuid
 import mimetypes
 
 # Optional DB recording
 try:
-    from AWS_utils.db import insert_upload_record
+    from AWS_utils.db import find_upload_by_content_hash, insert_upload_record
 except Exception:
+    find_upload_by_content_hash = None
     insert_upload_record = None
 
 ALLOWED_EXT = {'pdf'}
+HASH_CHUNK_BYTES = 1024 * 1024
 
 
-def create_upload_blueprint(storage_client):
+def _hash_stream(stream):
+    """Return ``(sha256 hex, size in bytes)`` of a seekable stream and rewind it."""
+    digest = hashlib.sha256()
+    size = 0
+    stream.seek(0)
+    while True:
+        block = stream.read(HASH_CHUNK_BYTES)
+        if not block:
+            break
+        digest.update(block)
+        size += len(block)
+    stream.seek(0)
+    return digest.hexdigest(), size
+
+
+def create_upload_blueprint(storage_client, on_recorded=None):
     """Return a Blueprint that exposes POST /upload for S3-only uploads.
 
     storage_client: required. Must implement:
       - upload_fileobj(fileobj, object_key, ExtraArgs=None)
       - get_public_url(object_key) -> str
-
-    The route returns JSON: {"doc_id": <object_key>, "s3_url": <public_url>}.
+    on_recorded: optional callable invoked with the doc_id once a new upload
+      is recorded, e.g. ``LocalUploadQueue.publish`` when the ingestion worker
+      runs in-process. Not needed with Postgres, where the insert itself
+      notifies listening workers.
+
+    The route returns JSON: {"doc_id": <object_key>, "s3_url": <public_url>,
+    "content_hash": <sha256>, "size_bytes": <int>}. When an embedded upload
+    with the same content already exists, nothing is written to S3: the
+    upload is recorded with status ``duplicate`` under its own ``doc_id`` and
+    the response carries that ``doc_id``, ``"s3_url": null`` and
+    ``"duplicate": true``. The existing document belongs to another upload,
+    so its ``doc_id`` and ``s3_url`` are not disclosed; searches filtered by
+    the caller's ``doc_id`` or ``uploader_id`` still find its chunks.
     """
 
     bp = Blueprint('upload_api', __name__)
@@ -50,6 +79,47 @@ def create_upload_blueprint(storage_client):
 
         # Prefer the file.stream when available
         file_obj = getattr(f, 'stream', f)
+        uploader_id = request.form.get('uploader_id') or request.headers.get('X-User-Id')
+        uploader_name = request.form.get('uploader_name') or request.headers.get('X-User-Name')
+
+        # werkzeug has already spooled the body to memory or a temp file, so
+        # hashing it here is a local read and lets duplicates skip S3 entirely
+        try:
+            content_hash, size_bytes = _hash_stream(file_obj)
+        except Exception as e:
+            return jsonify({'error': 'upload failed', 'details': str(e)}), 500
+
+        canonical = None
+        try:
+            if find_upload_by_content_hash is not None:
+                # a canonical that is still queued may yet fail, which would strand its duplicates
+                canonical = find_upload_by_content_hash(content_hash, embedded_only=True)
+        except Exception as e:  # dedup is an optimisation; fall back to a normal upload
+            print('upload dedup lookup failed:', e)
+
+        if canonical is not None:
+            try:
+                insert_upload_record(
+                    doc_id=object_key,
+                    file_name=filename,
+                    s3_url=canonical['s3_url'],
+                    uploader_id=uploader_id,
+                    uploader_name=uploader_name,
+                    content_type=content_type,
+                    size_bytes=size_bytes,
+                    metadata={'duplicate_of': canonical['doc_id']},
+                    status='duplicate',
+                    content_hash=content_hash,
+                )
+            except Exception as e:
+                print('upload DB record failed:', e)
+            return jsonify({
+                'doc_id': object_key,
+                's3_url': None,
+                'content_hash': content_hash,
+                'size_bytes': size_bytes,
+                'duplicate': True,
+            })
 
         try:
             # Upload using the provided storage client
@@ -61,9 +131,6 @@ def create_upload_blueprint(storage_client):
         # Try to record the upload in the database if helper is available.
         try:
             if insert_upload_record is not None:
-                uploader_id = request.form.get('uploader_id') or request.headers.get('X-User-Id')
-                uploader_name = request.form.get('uploader_name') or request.headers.get('X-User-Name')
-                # size_bytes is optional; file streams may not expose length reliably
                 insert_upload_record(
                     doc_id=object_key,
                     file_name=filename,
@@ -71,13 +138,16 @@ def create_upload_blueprint(storage_client):
                     uploader_id=uploader_id,
                     uploader_name=uploader_name,
                     content_type=content_type,
-                    size_bytes=None,
+                    size_bytes=size_bytes,
                     is_chunked=False,
                     chunk_count=None,
                     is_embedded=False,
                     embedding_model=None,
                     metadata=None,
+                    content_hash=content_hash,
                 )
+                if on_recorded is not None:
+                    on_recorded(object_key)
         except Exception as e:  # don't fail the upload if DB logging fails
             try:
                 # best-effort logging
@@ -85,6 +155,11 @@ def create_upload_blueprint(storage_client):
             except Exception:
                 pass
 
-        return jsonify({'doc_id': object_key, 's3_url': s3_url})
+        return jsonify({
+            'doc_id': object_key,
+            's3_url': s3_url,
+            'content_hash': content_hash,
+            'size_bytes': size_bytes,
+        })
 
     return bp
@@ -1,7 +1,10 @@
 import os
+import threading
+import time
 from contextlib import contextmanager
 import psycopg2
-from psycopg2.extras import Json
+from psycopg2.extras import Json, execute_values
+from psycopg2.pool import ThreadedConnectionPool
 
 
 def _get_dsn():
@@ -19,17 +22,109 @@ def _get_dsn():
     return f"postgresql://{user}:{password}@{host}:{port}/{dbname}"
 
 
+def dsn_configured() -> bool:
+    """True when ``UPLOADS_DB_DSN`` or the separate ``DB_*`` variables are set."""
+    try:
+        _get_dsn()
+    except RuntimeError:
+        return False
+    return True
+
+
+# ``insert_upload_record`` notifies this channel with the doc_id of every queued upload
+UPLOAD_CHANNEL = os.getenv('UPLOAD_NOTIFY_CHANNEL', 'uploads_queued')
+# ``mark_upload_processed`` notifies this channel with the doc_id of every (re-)indexed
+# document, so API processes can drop cached answers built from its old chunks
+INDEX_CHANNEL = os.getenv('INDEX_NOTIFY_CHANNEL', 'documents_indexed')
+
+# job lifecycle: queued -> processing -> embedded, or -> failed (retried with
+# backoff) -> dead_letter once MAX_ATTEMPTS is reached; duplicates never queue.
+# ``next_attempt_at`` is when a queued/failed row becomes claimable and, while
+# processing, when the worker's lease expires; other statuses leave it as is.
+QUEUE_STATUSES = ('queued', 'failed', 'processing')
+MAX_ATTEMPTS = int(os.getenv('UPLOAD_MAX_ATTEMPTS', '5'))
+RETRY_BASE_SECONDS = float(os.getenv('UPLOAD_RETRY_BASE_SECONDS', '30'))
+RETRY_MAX_SECONDS = float(os.getenv('UPLOAD_RETRY_MAX_SECONDS', '3600'))
+LEASE_SECONDS = int(os.getenv('UPLOAD_LEASE_SECONDS', '900'))
+
+_pool = None
+_pool_slots = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_last_used: dict[int, float] = {}
+
+
+def _get_pool():
+    # one pool per process; a forked worker must not reuse its parent's sockets
+    global _pool, _pool_slots, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            minconn = int(os.environ.get('DB_POOL_MIN', '1'))
+            maxconn = int(os.environ.get('DB_POOL_MAX', '10'))
+            _pool = ThreadedConnectionPool(minconn, maxconn, _get_dsn(), connect_timeout=5)
+            # ThreadedConnectionPool raises when exhausted; the semaphore makes callers wait instead
+            _pool_slots = threading.BoundedSemaphore(maxconn)
+            _pool_pid = os.getpid()
+            _last_used.clear()
+        return _pool, _pool_slots
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.closeall()
+        _pool = None
+
+
+def _is_healthy(conn) -> bool:
+    if conn.closed:
+        return False
+    idle_limit = float(os.environ.get('DB_POOL_HEALTHCHECK_IDLE_SECONDS', '30'))
+    last_used = _last_used.get(id(conn))
+    if last_used is None or time.monotonic() - last_used < idle_limit:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT 1')
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
 @contextmanager
 def get_conn():
-    dsn = _get_dsn()
-    conn = psycopg2.connect(dsn, connect_timeout=5)
+    """Borrow a pooled connection, health-checked if it sat idle.
+
+    Pool bounds come from ``DB_POOL_MIN`` / ``DB_POOL_MAX``; callers block for
+    up to ``DB_POOL_TIMEOUT`` seconds when every connection is in use. Any
+    uncommitted work is rolled back before the connection is returned.
+    """
+    pool, slots = _get_pool()
+    if not slots.acquire(timeout=float(os.environ.get('DB_POOL_TIMEOUT', '30'))):
+        raise RuntimeError('timed out waiting for a database connection from the pool')
+    conn = None
+    broken = False
     try:
+        conn = pool.getconn()
+        if not _is_healthy(conn):
+            pool.putconn(conn, close=True)
+            conn = pool.getconn()
         yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
     finally:
-        try:
-            conn.close()
-        except Exception:
-            pass
+        if conn is not None:
+            if not broken and not conn.closed:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    broken = True
+            _last_used[id(conn)] = time.monotonic()
+            pool.putconn(conn, close=broken or bool(conn.closed))
+        slots.release()
 
 
 def insert_upload_record(
@@ -45,15 +140,17 @@ def insert_upload_record(
     is_embedded=False,
     embedding_model=None,
     metadata=None,
-    status='uploaded',
+    status='queued',
     notes=None,
+    content_hash=None,
 ):
     sql = """
     INSERT INTO uploads (
       doc_id, file_name, s3_url, uploader_id, uploader_name,
       content_type, size_bytes, is_chunked, chunk_count,
-      is_embedded, embedding_model, metadata, status, notes
-    ) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+      is_embedded, embedding_model, metadata, status, notes, content_hash,
+      next_attempt_at
+    ) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,now())
     RETURNING id, uploaded_at
     """
     params = (
@@ -71,61 +168,453 @@ def insert_upload_record(
         Json(metadata) if metadata is not None else None,
         status,
         notes,
+        content_hash,
     )
     with get_conn() as conn:
         with conn.cursor() as cur:
             cur.execute(sql, params)
             row = cur.fetchone()
+            if status in QUEUE_STATUSES:
+                # delivered on commit, so a listening worker never wakes before the row is visible
+                cur.execute('SELECT pg_notify(%s, %s)', (UPLOAD_CHANNEL, doc_id))
             conn.commit()
             return {'id': str(row[0]), 'uploaded_at': row[1].isoformat()}
 
 
 def fetch_unprocessed_uploads(limit: int = 10):
+    """Return up to ``limit`` uploads that are due for (re)processing, without claiming them."""
     sql = """
     SELECT id, doc_id, file_name, s3_url, uploader_id, uploader_name
     FROM uploads
-    WHERE COALESCE(is_chunked, false) = false OR COALESCE(is_embedded, false) = false
-    ORDER BY uploaded_at ASC
+    WHERE status = ANY(%s)
+      AND next_attempt_at <= now()
+    ORDER BY next_attempt_at ASC
     LIMIT %s
     """
     with get_conn() as conn:
         with conn.cursor() as cur:
-            cur.execute(sql, (limit,))
+            cur.execute(sql, (list(QUEUE_STATUSES), limit))
             rows = cur.fetchall()
             columns = ['id', 'doc_id', 'file_name', 's3_url', 'uploader_id', 'uploader_name']
             return [dict(zip(columns, row)) for row in rows]
 
 
-def mark_upload_processed(doc_id: str, chunk_count: int, embedding_model: str, metadata_patch: dict | None = None):
+def count_pending_uploads() -> dict:
+    """Return the ingestion queue depth: rows per job status and the oldest pending age.
+
+    ``dead_letter`` rows are reported in ``by_status`` but are not pending.
+    """
+    sql = """
+    SELECT status, COUNT(*), EXTRACT(EPOCH FROM now() - MIN(uploaded_at))
+    FROM uploads
+    WHERE status = ANY(%s)
+    GROUP BY 1
+    """
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, (list(QUEUE_STATUSES) + ['dead_letter'],))
+            rows = cur.fetchall()
+    pending = [(status, count, age) for status, count, age in rows if status in QUEUE_STATUSES]
+    ages = [float(age) for _, _, age in pending if age is not None]
+    return {
+        'by_status': {status: count for status, count, _ in rows},
+        'pending': sum(count for _, count, _ in pending),
+        'oldest_pending_seconds': max(ages) if ages else 0.0,
+    }
+
+
+def claim_unprocessed_uploads(
+    worker_id: str,
+    limit: int = 10,
+    claim_timeout_seconds: int = LEASE_SECONDS,
+    max_attempts: int = MAX_ATTEMPTS,
+):
+    """Atomically claim up to ``limit`` due uploads for ``worker_id``.
+
+    Rows are locked with ``FOR UPDATE SKIP LOCKED`` so concurrent workers never
+    claim the same ``doc_id``. A claim is a lease of ``claim_timeout_seconds``:
+    once it expires (crashed worker) the row is claimable again, unless it has
+    used up ``max_attempts``, in which case it is dead-lettered. Every claim
+    counts as an attempt. Both statements walk the partial queue index, so a
+    claim costs O(limit) however large the table grows.
+    """
+    expire_sql = """
+    UPDATE uploads
+    SET status = 'dead_letter',
+        last_error = COALESCE(last_error || '; ', '') || 'lease expired on the last attempt'
+    WHERE status = 'processing'
+      AND next_attempt_at <= now()
+      AND attempts >= %s
+    """
+    claim_sql = """
+    UPDATE uploads AS u
+    SET status = 'processing',
+        attempts = u.attempts + 1,
+        claimed_by = %s,
+        next_attempt_at = now() + make_interval(secs => %s)
+    FROM (
+      SELECT id
+      FROM uploads
+      WHERE status = ANY(%s)
+        AND next_attempt_at <= now()
+      ORDER BY next_attempt_at ASC
+      LIMIT %s
+      FOR UPDATE SKIP LOCKED
+    ) AS due
+    WHERE u.id = due.id
+    RETURNING u.id, u.doc_id, u.file_name, u.s3_url, u.uploader_id, u.uploader_name, u.content_hash, u.attempts
+    """
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(expire_sql, (max_attempts,))
+            cur.execute(claim_sql, (worker_id, claim_timeout_seconds, list(QUEUE_STATUSES), limit))
+            rows = cur.fetchall()
+            conn.commit()
+            columns = ['id', 'doc_id', 'file_name', 's3_url', 'uploader_id', 'uploader_name', 'content_hash', 'attempts']
+            return [dict(zip(columns, row)) for row in rows]
+
+
+def renew_upload_lease(doc_id: str, worker_id: str, lease_seconds: int = LEASE_SECONDS) -> bool:
+    """Extend ``worker_id``'s lease on a processing upload; False once the lease has been lost.
+
+    Workers call this periodically while a document is processing, so a
+    document that takes longer than one lease is not claimed a second time.
+    """
     sql = """
     UPDATE uploads
+    SET next_attempt_at = now() + make_interval(secs => %s)
+    WHERE doc_id = %s
+      AND status = 'processing'
+      AND claimed_by = %s
+    """
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, (lease_seconds, doc_id, worker_id))
+            renewed = cur.rowcount
+            conn.commit()
+    return bool(renewed)
+
+
+# with a worker id, final status updates only apply while that worker still holds the lease
+_CLAIMED_BY_SQL = "AND ({param} IS NULL OR ({status} = 'processing' AND {claimed_by} = {param}))"
+
+
+def mark_upload_processed(
+    doc_id: str,
+    chunk_count: int,
+    embedding_model: str,
+    metadata_patch: dict | None = None,
+    claimed_by: str | None = None,
+) -> bool:
+    """Mark an upload as embedded; returns False if nothing was updated.
+
+    With ``claimed_by`` the row is only updated while that worker still holds
+    its lease, so a worker whose lease expired cannot overwrite the outcome of
+    the worker that re-claimed the document.
+    """
+    claimed = _CLAIMED_BY_SQL.format(param='%(claimed_by)s::text', status='status', claimed_by='claimed_by')
+    sql = f"""
+    UPDATE uploads
     SET is_chunked = true,
-        chunk_count = %s,
+        chunk_count = %(chunk_count)s,
         is_embedded = true,
-        embedding_model = %s,
+        embedding_model = %(embedding_model)s,
         status = 'embedded',
+        claimed_by = NULL,
+        last_error = NULL,
         metadata = CASE
-          WHEN %s IS NULL THEN metadata
-          ELSE COALESCE(metadata, '{}'::jsonb) || %s
+          WHEN %(patch)s IS NULL THEN metadata
+          ELSE COALESCE(metadata, '{{}}'::jsonb) || %(patch)s
         END
-    WHERE doc_id = %s
+    WHERE doc_id = %(doc_id)s
+      {claimed}
     """
-    patch = Json(metadata_patch) if metadata_patch is not None else None
-    params = (chunk_count, embedding_model, patch, patch, doc_id)
+    params = {
+        'chunk_count': chunk_count,
+        'embedding_model': embedding_model,
+        'patch': Json(metadata_patch) if metadata_patch is not None else None,
+        'doc_id': doc_id,
+        'claimed_by': claimed_by,
+    }
     with get_conn() as conn:
         with conn.cursor() as cur:
             cur.execute(sql, params)
+            updated = cur.rowcount
+            if updated:
+                cur.execute('SELECT pg_notify(%s, %s)', (INDEX_CHANNEL, doc_id))
             conn.commit()
+    return bool(updated)
 
 
-def mark_upload_failed(doc_id: str, notes: str):
+# retry delay for the n-th failed attempt: base * 2^(n-1), capped, with +-25% jitter
+_BACKOFF_SQL = """
+CASE WHEN {attempts} >= {max_attempts} THEN {current}
+ELSE now() + make_interval(secs => LEAST(
+  {retry_max}, {retry_base} * power(2, GREATEST({attempts}, 1) - 1)
+) * (0.75 + random() / 2))
+END
+"""
+
+
+def mark_upload_failed(
+    doc_id: str,
+    notes: str,
+    max_attempts: int = MAX_ATTEMPTS,
+    claimed_by: str | None = None,
+) -> str | None:
+    """Record a failed attempt; returns the new status (``failed`` or ``dead_letter``).
+
+    The upload is retried after an exponential backoff until it has used
+    ``max_attempts`` attempts, then parked as ``dead_letter``. The error goes
+    to both ``last_error`` and ``notes``. With ``claimed_by`` nothing is
+    updated (and None returned) once that worker has lost its lease.
+    """
+    backoff = _BACKOFF_SQL.format(
+        attempts='attempts',
+        max_attempts='%(max_attempts)s',
+        retry_base='%(retry_base)s',
+        retry_max='%(retry_max)s',
+        current='next_attempt_at',
+    )
+    claimed = _CLAIMED_BY_SQL.format(param='%(claimed_by)s::text', status='status', claimed_by='claimed_by')
+    sql = f"""
+    UPDATE uploads
+    SET status = CASE WHEN attempts >= %(max_attempts)s THEN 'dead_letter' ELSE 'failed' END,
+        next_attempt_at = {backoff},
+        claimed_by = NULL,
+        last_error = %(notes)s,
+        notes = %(notes)s
+    WHERE doc_id = %(doc_id)s
+      {claimed}
+    RETURNING status
+    """
+    params = {
+        'notes': notes,
+        'doc_id': doc_id,
+        'claimed_by': claimed_by,
+        'max_attempts': max_attempts,
+        'retry_base': RETRY_BASE_SECONDS,
+        'retry_max': RETRY_MAX_SECONDS,
+    }
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, params)
+            row = cur.fetchone()
+            conn.commit()
+    return row[0] if row else None
+
+
+def requeue_upload(doc_id: str, reset_attempts: bool = True):
+    """Put a failed or dead-lettered upload back at the head of the queue."""
     sql = """
     UPDATE uploads
-    SET status = 'failed',
-        notes = %s
+    SET status = 'queued',
+        next_attempt_at = now(),
+        claimed_by = NULL,
+        attempts = CASE WHEN %s THEN 0 ELSE attempts END
     WHERE doc_id = %s
+      AND status IN ('failed', 'dead_letter')
+    """
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, (reset_attempts, doc_id))
+            updated = cur.rowcount
+            conn.commit()
+    if not updated:
+        raise ValueError(f'no failed or dead-lettered upload {doc_id!r}')
+
+
+def find_upload_by_content_hash(content_hash: str, exclude_doc_id: str | None = None, embedded_only: bool = False):
+    """Return the canonical upload with ``content_hash``, or None.
+
+    Duplicates and failed or dead-lettered uploads never act as canonical. Among the rest an
+    already embedded upload wins, then the oldest one.
+    """
+    sql = """
+    SELECT id, doc_id, file_name, s3_url, status, chunk_count, embedding_model
+    FROM uploads
+    WHERE content_hash = %s
+      AND status NOT IN ('duplicate', 'failed', 'dead_letter')
+      AND doc_id IS DISTINCT FROM %s
+      AND (%s = false OR is_embedded = true)
+    ORDER BY is_embedded DESC, uploaded_at ASC
+    LIMIT 1
+    """
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, (content_hash, exclude_doc_id, embedded_only))
+            row = cur.fetchone()
+    if row is None:
+        return None
+    columns = ['id', 'doc_id', 'file_name', 's3_url', 'status', 'chunk_count', 'embedding_model']
+    return dict(zip(columns, row))
+
+
+def mark_upload_duplicate(doc_id: str, duplicate_of: str):
+    """Record ``doc_id`` as another upload of ``duplicate_of``'s content; it is never processed."""
+    sql = """
+    UPDATE uploads
+    SET status = 'duplicate',
+        metadata = COALESCE(metadata, '{}'::jsonb) || jsonb_build_object('duplicate_of', %s::text)
+    WHERE doc_id = %s
+    """
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, (duplicate_of, doc_id))
+            conn.commit()
+
+
+def fetch_duplicate_uploads(uploader_ids: list[str] | None = None, doc_ids: list[str] | None = None) -> list[dict]:
+    """Return ``{'doc_id', 'uploader_id', 'duplicate_of'}`` for the duplicate uploads by ``uploader_ids`` or with ``doc_ids``.
+
+    A duplicate has no chunks of its own; its content is indexed under ``duplicate_of``.
+    """
+    sql = """
+    SELECT doc_id, uploader_id, metadata->>'duplicate_of'
+    FROM uploads
+    WHERE status = 'duplicate'
+      AND (uploader_id = ANY(%s) OR doc_id = ANY(%s))
+      AND metadata ? 'duplicate_of'
+    """
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, (list(uploader_ids or []), list(doc_ids or [])))
+            rows = cur.fetchall()
+    return [dict(zip(['doc_id', 'uploader_id', 'duplicate_of'], row)) for row in rows]
+
+
+def fetch_unmigrated_uploads(target_index: str, limit: int = 20, exclude_doc_ids: list[str] | None = None):
+    """Return embedded uploads not yet migrated into ``target_index``, oldest first."""
+    sql = """
+    SELECT id, doc_id, file_name, s3_url, uploader_id, uploader_name
+    FROM uploads
+    WHERE status = 'embedded'
+      AND (metadata->'migrations'->%s->>'status') IS DISTINCT FROM 'done'
+      AND NOT (doc_id = ANY(%s))
+    ORDER BY uploaded_at ASC
+    LIMIT %s
+    """
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, (target_index, list(exclude_doc_ids or []), limit))
+            rows = cur.fetchall()
+    columns = ['id', 'doc_id', 'file_name', 's3_url', 'uploader_id', 'uploader_name']
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def mark_upload_migrated(doc_id: str, target_index: str, progress: dict):
+    """Store ``progress`` under ``metadata.migrations.<target_index>`` of ``doc_id``."""
+    sql = """
+    UPDATE uploads
+    SET metadata = COALESCE(metadata, '{}'::jsonb) || jsonb_build_object(
+      'migrations',
+      COALESCE(metadata->'migrations', '{}'::jsonb) || jsonb_build_object(%s::text, %s::jsonb)
+    )
+    WHERE doc_id = %s
+    """
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, (target_index, Json(progress), doc_id))
+            conn.commit()
+
+
+def count_migration_progress(target_index: str) -> dict:
+    sql = """
+    SELECT
+      COUNT(*),
+      COUNT(*) FILTER (WHERE metadata->'migrations'->%s->>'status' = 'done'),
+      COUNT(*) FILTER (WHERE metadata->'migrations'->%s->>'status' = 'failed')
+    FROM uploads
+    WHERE status = 'embedded'
+    """
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, (target_index, target_index))
+            total, done, failed = cur.fetchone()
+    return {'total': total, 'done': done, 'failed': failed, 'remaining': total - done}
+
+
+def mark_uploads_processed(items: list[dict], claimed_by: str | None = None) -> list[str]:
+    """Bulk variant of ``mark_upload_processed``: one round trip for many documents.
+
+    Each item needs ``doc_id``, ``chunk_count`` and ``embedding_model`` and may
+    carry a ``metadata_patch``. Returns the doc_ids that were updated.
+    """
+    if not items:
+        return []
+    claimed = _CLAIMED_BY_SQL.format(param='v.claimed_by', status='u.status', claimed_by='u.claimed_by')
+    sql = f"""
+    UPDATE uploads AS u
+    SET is_chunked = true,
+        chunk_count = v.chunk_count,
+        is_embedded = true,
+        embedding_model = v.embedding_model,
+        status = 'embedded',
+        claimed_by = NULL,
+        last_error = NULL,
+        metadata = CASE
+          WHEN v.metadata_patch IS NULL THEN u.metadata
+          ELSE COALESCE(u.metadata, '{{}}'::jsonb) || v.metadata_patch
+        END
+    FROM (VALUES %s) AS v(doc_id, chunk_count, embedding_model, metadata_patch, claimed_by)
+    WHERE u.doc_id = v.doc_id
+      {claimed}
+    RETURNING u.doc_id
+    """
+    rows = [
+        (
+            item['doc_id'],
+            item['chunk_count'],
+            item['embedding_model'],
+            Json(item['metadata_patch']) if item.get('metadata_patch') is not None else None,
+            claimed_by,
+        )
+        for item in items
+    ]
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            updated = [
+                row[0]
+                for row in execute_values(
+                    cur, sql, rows, template='(%s, %s::integer, %s::text, %s::jsonb, %s::text)', fetch=True
+                )
+            ]
+            cur.execute(
+                'SELECT pg_notify(%s, doc_id) FROM unnest(%s::text[]) AS doc_id',
+                (INDEX_CHANNEL, updated),
+            )
+            conn.commit()
+    return updated
+
+
+def mark_uploads_failed(failures: dict[str, str], max_attempts: int = MAX_ATTEMPTS, claimed_by: str | None = None):
+    """Bulk variant of ``mark_upload_failed`` taking ``{doc_id: notes}``."""
+    if not failures:
+        return
+    backoff = _BACKOFF_SQL.format(
+        attempts='u.attempts',
+        max_attempts='v.max_attempts',
+        retry_base='v.retry_base',
+        retry_max='v.retry_max',
+        current='u.next_attempt_at',
+    )
+    claimed = _CLAIMED_BY_SQL.format(param='v.claimed_by', status='u.status', claimed_by='u.claimed_by')
+    sql = f"""
+    UPDATE uploads AS u
+    SET status = CASE WHEN u.attempts >= v.max_attempts THEN 'dead_letter' ELSE 'failed' END,
+        next_attempt_at = {backoff},
+        claimed_by = NULL,
+        last_error = v.notes,
+        notes = v.notes
+    FROM (VALUES %s) AS v(doc_id, notes, max_attempts, retry_base, retry_max, claimed_by)
+    WHERE u.doc_id = v.doc_id
+      {claimed}
     """
+    rows = [
+        (doc_id, notes, max_attempts, RETRY_BASE_SECONDS, RETRY_MAX_SECONDS, claimed_by)
+        for doc_id, notes in failures.items()
+    ]
     with get_conn() as conn:
         with conn.cursor() as cur:
-            cur.execute(sql, (notes, doc_id))
+            execute_values(cur, sql, rows, template='(%s, %s::text, %s::integer, %s::float8, %s::float8, %s::text)')
             conn.commit()
@@ -0,0 +1,352 @@
+import fcntl
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import List
+
+import numpy as np
+
+from AWS_utils.search_filters import SHARED_DOC_FIELD, normalize_filters
+
+RESULT_FIELDS = ('doc_id', 'file_name', 's3_url', 'chunk_index', 'text', 'uploader_id', 'uploader_name')
+
+
+class LocalVectorStore:
+    """In-process vector store with the ``OpenSearchVectorStore`` surface.
+
+    Embeddings live in one contiguous float32 matrix memory-mapped from
+    ``<path>/<index_name>.f32``; chunk metadata lives in a SQLite file next to
+    it. Rows are only ever appended: re-indexing or deleting a chunk marks its
+    old row as a tombstone, and ``compact`` rewrites the matrix without them.
+    Search is an exact, batched matrix multiply followed by top-k selection,
+    scored like the OpenSearch ``l2`` space (``1 / (1 + d^2)``).
+
+    Several processes (the API and ingestion workers) may open the same store.
+    Writers hold an exclusive ``flock`` on ``<index_name>.lock`` and allocate
+    rows inside one SQLite transaction, which also bumps a generation counter.
+    Before every search and write an instance compares the counter with the
+    one it loaded, and reloads its row maps when another writer has been at
+    work.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        index_name: str,
+        dimension: int = 1536,
+        search_block_rows: int = 65536,
+        embedding_model_id: str | None = None,
+    ):
+        self.path = path
+        self.index_name = index_name
+        self.dimension = dimension
+        self.embedding_model_id = embedding_model_id
+        self.search_block_rows = search_block_rows
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+        self._matrix_path = os.path.join(path, f'{index_name}.f32')
+        self._lock_path = os.path.join(path, f'{index_name}.lock')
+        # autocommit; writes open their own transactions in _writing
+        self._meta = sqlite3.connect(
+            os.path.join(path, f'{index_name}.sqlite'),
+            check_same_thread=False,
+            isolation_level=None,
+            timeout=30,
+        )
+        self._meta.execute('PRAGMA journal_mode=WAL')
+        self.ensure_index()
+        self._load()
+
+    def ensure_index(self):
+        with self._lock:
+            self._meta.execute(
+                """
+                CREATE TABLE IF NOT EXISTS chunks (
+                  row INTEGER PRIMARY KEY,
+                  id TEXT NOT NULL,
+                  doc_id TEXT,
+                  content_hash TEXT,
+                  source TEXT NOT NULL,
+                  deleted INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            self._meta.execute('CREATE INDEX IF NOT EXISTS idx_chunks_id ON chunks (id) WHERE deleted = 0')
+            self._meta.execute('CREATE INDEX IF NOT EXISTS idx_chunks_doc_id ON chunks (doc_id) WHERE deleted = 0')
+            self._meta.execute('CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            self._meta.execute("INSERT OR IGNORE INTO state (key, value) VALUES ('generation', 0)")
+            # 'ab' creates the file without truncating one another process is using
+            open(self._matrix_path, 'ab').close()
+
+    def _generation_now(self) -> int:
+        (generation,) = self._meta.execute("SELECT value FROM state WHERE key = 'generation'").fetchone()
+        return generation
+
+    def _load(self):
+        """Rebuild the row maps from SQLite and remap the matrix."""
+        # read before the rows: a write landing in between only causes another reload
+        self._generation = self._generation_now()
+        rows = self._meta.execute('SELECT row, id, deleted FROM chunks').fetchall()
+        count = max((row for row, _, _ in rows), default=-1) + 1
+        self._count = count
+        capacity = max(os.path.getsize(self._matrix_path) // (4 * self.dimension), count)
+        self._map(capacity)
+        self._live = np.zeros(capacity, dtype=bool)
+        self._ids: List[str | None] = [None] * capacity
+        self._row_of: dict[str, int] = {}
+        for row, chunk_id, deleted in rows:
+            if deleted:
+                continue
+            self._live[row] = True
+            self._ids[row] = chunk_id
+            self._row_of[chunk_id] = row
+
+    def _refresh(self):
+        """Reload the row maps if another process or instance wrote since they were loaded."""
+        if self._generation_now() != self._generation:
+            self._load()
+
+    @contextmanager
+    def _writing(self):
+        """Run a write under the cross-process lock, in one SQLite transaction, on fresh row maps."""
+        with self._lock, open(self._lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._meta.execute('BEGIN IMMEDIATE')
+            try:
+                self._refresh()
+                yield
+                self._meta.execute("UPDATE state SET value = value + 1 WHERE key = 'generation'")
+                generation = self._generation_now()
+                self._meta.execute('COMMIT')
+            except BaseException:
+                self._meta.execute('ROLLBACK')
+                # the in-memory maps may already hold the rolled back rows
+                self._load()
+                raise
+            self._generation = generation
+
+    def _map(self, capacity: int):
+        # only writers grow the file (_reserve); readers map what is there
+        if capacity == 0:
+            self._vectors = np.zeros((0, self.dimension), dtype=np.float32)
+            return
+        self._vectors = np.memmap(self._matrix_path, dtype=np.float32, mode='r+', shape=(capacity, self.dimension))
+
+    def _reserve(self, extra: int):
+        capacity = self._vectors.shape[0]
+        needed = self._count + extra
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2, 1024)
+        if isinstance(self._vectors, np.memmap):
+            self._vectors.flush()
+        with open(self._matrix_path, 'r+b') as fh:
+            fh.truncate(new_capacity * self.dimension * 4)
+        self._map(new_capacity)
+        self._live = np.concatenate([self._live, np.zeros(new_capacity - capacity, dtype=bool)])
+        self._ids.extend([None] * (new_capacity - capacity))
+
+    def _tombstone(self, rows: List[int]):
+        if not rows:
+            return
+        self._live[rows] = False
+        for row in rows:
+            self._row_of.pop(self._ids[row], None)
+            self._ids[row] = None
+        self._meta.executemany('UPDATE chunks SET deleted = 1 WHERE row = ?', [(row,) for row in rows])
+
+    def index_meta(self) -> dict:
+        return {
+            'embedding_model_id': self.embedding_model_id,
+            'embedding_dimension': self.dimension,
+            'recorded': False,
+        }
+
+    def ping(self):
+        with self._lock:
+            self._meta.execute('SELECT 1').fetchone()
+
+    def upsert_chunks(self, records: List[dict]) -> dict:
+        if not records:
+            return {'succeeded': 0, 'errors': []}
+        vectors = np.asarray([record['embedding'] for record in records], dtype=np.float32)
+        if vectors.shape[1] != self.dimension:
+            raise ValueError(f'embedding dimension {vectors.shape[1]} does not match index dimension {self.dimension}')
+        with self._writing():
+            self._tombstone([self._row_of[r['id']] for r in records if r['id'] in self._row_of])
+            self._reserve(len(records))
+            start = self._count
+            self._vectors[start:start + len(records)] = vectors
+            self._vectors.flush()
+            rows = []
+            for offset, record in enumerate(records):
+                row = start + offset
+                source = {key: value for key, value in record.items() if key not in ('id', 'embedding')}
+                rows.append((row, record['id'], record.get('doc_id'), record.get('content_hash'), json.dumps(source)))
+                self._live[row] = True
+                self._ids[row] = record['id']
+                self._row_of[record['id']] = row
+            self._meta.executemany(
+                'INSERT INTO chunks (row, id, doc_id, content_hash, source) VALUES (?, ?, ?, ?, ?)',
+                rows,
+            )
+            self._count += len(records)
+        return {'succeeded': len(records), 'errors': []}
+
+    def delete_chunks_for_doc(self, doc_id: str):
+        with self._writing():
+            rows = [row for (row,) in self._meta.execute('SELECT row FROM chunks WHERE doc_id = ? AND deleted = 0', (doc_id,))]
+            self._tombstone(rows)
+
+    def delete_chunk_ids(self, chunk_ids: List[str]) -> dict:
+        with self._writing():
+            self._tombstone([self._row_of[chunk_id] for chunk_id in chunk_ids if chunk_id in self._row_of])
+        return {'succeeded': len(chunk_ids), 'errors': []}
+
+    def fetch_chunk_states(self, doc_id: str) -> dict[str, dict]:
+        with self._lock:
+            rows = self._meta.execute(
+                "SELECT id, content_hash, json_extract(source, '$.chunk_index') FROM chunks WHERE doc_id = ? AND deleted = 0",
+                (doc_id,),
+            ).fetchall()
+        return {chunk_id: {'content_hash': content_hash, 'chunk_index': chunk_index} for chunk_id, content_hash, chunk_index in rows}
+
+    def update_chunk_positions(self, doc_id: str, positions: dict[str, int]) -> dict:
+        errors = []
+        with self._writing():
+            for chunk_id, chunk_index in positions.items():
+                updated = self._meta.execute(
+                    "UPDATE chunks SET source = json_set(source, '$.chunk_index', ?) WHERE id = ? AND doc_id = ? AND deleted = 0",
+                    (chunk_index, chunk_id, doc_id),
+                ).rowcount
+                if not updated:
+                    errors.append({'id': chunk_id, 'status': 404, 'error': 'chunk not found'})
+        return {'succeeded': len(positions) - len(errors), 'errors': errors}
+
+    def count_chunks(self) -> int:
+        with self._lock:
+            (count,) = self._meta.execute('SELECT COUNT(*) FROM chunks WHERE deleted = 0').fetchone()
+        return count
+
+    def fetch_doc_chunks(self, doc_id: str) -> List[dict]:
+        with self._lock:
+            rows = self._meta.execute('SELECT id, source FROM chunks WHERE doc_id = ? AND deleted = 0', (doc_id,)).fetchall()
+        chunks = [{'id': chunk_id, **json.loads(source)} for chunk_id, source in rows]
+        return sorted(chunks, key=lambda chunk: chunk.get('chunk_index') or 0)
+
+    def _results(self, rows: List[int], scores: List[float], with_vectors: bool = False) -> List[dict]:
+        placeholders = ','.join('?' for _ in rows)
+        sources = dict(self._meta.execute(f'SELECT row, source FROM chunks WHERE row IN ({placeholders})', rows).fetchall())
+        results = []
+        for row, score in zip(rows, scores):
+            source = json.loads(sources[row])
+            result = {'id': self._ids[row], 'score': float(score)}
+            result.update({field: source.get(field) for field in RESULT_FIELDS})
+            if with_vectors:
+                result['embedding'] = self._vectors[row].tolist()
+            results.append(result)
+        return results
+
+    def _searchable_rows(self, count: int, filters: dict) -> np.ndarray:
+        """Mask of the live rows below ``count`` whose chunk matches ``filters``."""
+        live = self._live[:count]
+        if not filters:
+            return live
+        clauses, params = [], []
+        for field, values in filters.items():
+            if field == SHARED_DOC_FIELD:
+                continue
+            column = 'doc_id' if field == 'doc_id' else f"json_extract(source, '$.{field}')"
+            clause = f"{column} IN ({','.join('?' for _ in values)})"
+            params.extend(values)
+            if field == 'uploader_id' and SHARED_DOC_FIELD in filters:
+                shared = filters[SHARED_DOC_FIELD]
+                clause = f"({clause} OR doc_id IN ({','.join('?' for _ in shared)}))"
+                params.extend(shared)
+            clauses.append(clause)
+        matching = np.zeros(count, dtype=bool)
+        rows = self._meta.execute(f"SELECT row FROM chunks WHERE deleted = 0 AND {' AND '.join(clauses)}", params)
+        matching[[row for (row,) in rows if row < count]] = True
+        return live & matching
+
+    def knn_search_batch(
+        self,
+        query_vectors: List[List[float]],
+        top_k: int = 5,
+        filters: dict | None = None,
+        with_vectors: bool = False,
+    ) -> List[List[dict]]:
+        top_k = max(1, min(int(top_k), 50))
+        filters = normalize_filters(filters, internal=True)
+        queries = np.asarray(query_vectors, dtype=np.float32)
+        if queries.ndim != 2 or queries.shape[1] != self.dimension:
+            raise ValueError(f'query vectors must have dimension {self.dimension}')
+        with self._lock:
+            self._refresh()
+            count = self._count
+            # filtered rows are masked out before top-k selection, like OpenSearch's efficient filtering
+            searchable = self._searchable_rows(count, filters)
+            if count == 0 or not searchable.any():
+                return [[] for _ in range(len(queries))]
+            query_norms = np.einsum('ij,ij->i', queries, queries)
+            best_dist = np.full((len(queries), 0), np.inf, dtype=np.float32)
+            best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+            for start in range(0, count, self.search_block_rows):
+                stop = min(start + self.search_block_rows, count)
+                block = np.asarray(self._vectors[start:stop])
+                # ||q - x||^2 = ||q||^2 - 2 q.x + ||x||^2
+                dist = query_norms[:, None] - 2.0 * (queries @ block.T) + np.einsum('ij,ij->i', block, block)[None, :]
+                dist[:, ~searchable[start:stop]] = np.inf
+                dist = np.concatenate([best_dist, dist], axis=1)
+                rows = np.concatenate([best_rows, np.broadcast_to(np.arange(start, stop), (len(queries), stop - start))], axis=1)
+                keep = min(top_k, dist.shape[1])
+                part = np.argpartition(dist, keep - 1, axis=1)[:, :keep]
+                best_dist = np.take_along_axis(dist, part, axis=1)
+                best_rows = np.take_along_axis(rows, part, axis=1)
+            order = np.argsort(best_dist, axis=1)
+            best_dist = np.take_along_axis(best_dist, order, axis=1)
+            best_rows = np.take_along_axis(best_rows, order, axis=1)
+            batches = []
+            for dists, rows in zip(best_dist, best_rows):
+                hits = [(int(row), 1.0 / (1.0 + max(float(d), 0.0))) for row, d in zip(rows, dists) if np.isfinite(d)]
+                batches.append(
+                    self._results([row for row, _ in hits], [score for _, score in hits], with_vectors) if hits else []
+                )
+            return batches
+
+    def knn_search(
+        self,
+        query_vector: List[float],
+        top_k: int = 5,
+        source_fields: List[str] | None = None,
+        filters: dict | None = None,
+        with_vectors: bool = False,
+    ):
+        if not isinstance(query_vector, list):
+            raise ValueError('query_vector must be a list of floats')
+        if len(query_vector) != self.dimension:
+            raise ValueError(f'query_vector dimension {len(query_vector)} does not match index dimension {self.dimension}')
+        return self.knn_search_batch([query_vector], top_k=top_k, filters=filters, with_vectors=with_vectors)[0]
+
+    def compact(self):
+        """Rewrite the matrix without tombstoned rows.
+
+        The new matrix replaces the old file by rename, so processes still
+        searching the old mapping are unaffected until they reload.
+        """
+        with self._writing():
+            live_rows = np.nonzero(self._live[:self._count])[0]
+            vectors = np.asarray(self._vectors[live_rows]).copy()
+            metadata = self._meta.execute('SELECT row, id, doc_id, content_hash, source FROM chunks WHERE deleted = 0 ORDER BY row').fetchall()
+            self._meta.execute('DELETE FROM chunks')
+            self._meta.executemany(
+                'INSERT INTO chunks (row, id, doc_id, content_hash, source) VALUES (?, ?, ?, ?, ?)',
+                [(new_row, *meta[1:]) for new_row, meta in enumerate(metadata)],
+            )
+            tmp_path = f'{self._matrix_path}.tmp'
+            with open(tmp_path, 'wb') as fh:
+                fh.write(vectors.tobytes())
+            os.replace(tmp_path, self._matrix_path)
+            self._load()
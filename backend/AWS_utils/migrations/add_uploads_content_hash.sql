@@ -0,0 +1,8 @@
+-- Content-hash deduplication of uploads
+-- Repeated uploads of the same PDF are recorded with status 'duplicate' and
+-- metadata->>'duplicate_of' pointing at the canonical doc_id.
+
+ALTER TABLE uploads ADD COLUMN IF NOT EXISTS content_hash text NULL;
+
+CREATE INDEX IF NOT EXISTS idx_uploads_content_hash ON uploads (content_hash)
+  WHERE content_hash IS NOT NULL AND status IS DISTINCT FROM 'duplicate';
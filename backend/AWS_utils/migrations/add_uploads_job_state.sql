@@ -0,0 +1,28 @@
+-- Job lifecycle for ingestion: queued -> processing -> embedded, or
+-- failed (retried with exponential backoff) -> dead_letter after
+-- UPLOAD_MAX_ATTEMPTS. next_attempt_at is when a queued/failed row becomes
+-- claimable and, while processing, when the worker's lease expires.
+
+ALTER TABLE uploads ADD COLUMN IF NOT EXISTS attempts integer NOT NULL DEFAULT 0;
+ALTER TABLE uploads ADD COLUMN IF NOT EXISTS next_attempt_at timestamptz NULL;
+ALTER TABLE uploads ADD COLUMN IF NOT EXISTS claimed_by text NULL;
+ALTER TABLE uploads ADD COLUMN IF NOT EXISTS last_error text NULL;
+ALTER TABLE uploads ALTER COLUMN status SET DEFAULT 'queued';
+
+-- rows written before the state machine: pending uploads become queued,
+-- earlier failures are retried once more, embedded rows leave the queue
+UPDATE uploads
+SET status = 'queued', next_attempt_at = uploaded_at
+WHERE status IS NULL OR status = 'uploaded';
+
+UPDATE uploads
+SET attempts = 1, next_attempt_at = now(), last_error = notes
+WHERE status = 'failed' AND next_attempt_at IS NULL;
+
+UPDATE uploads
+SET status = 'queued', next_attempt_at = now(), claimed_by = metadata->>'claimed_by'
+WHERE status = 'processing' AND next_attempt_at IS NULL;
+
+-- the claim only ever scans due rows of the three queue statuses
+CREATE INDEX IF NOT EXISTS idx_uploads_queue ON uploads (next_attempt_at)
+  WHERE status IN ('queued', 'failed', 'processing');
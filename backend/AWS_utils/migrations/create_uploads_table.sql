@@ -17,10 +17,19 @@ CREATE TABLE IF NOT EXISTS uploads (
   is_embedded boolean NOT NULL DEFAULT false,
   embedding_model text NULL,
   metadata jsonb NULL,
-  status text DEFAULT 'uploaded',
-  notes text NULL
+  status text DEFAULT 'queued',
+  notes text NULL,
+  content_hash text NULL,
+  attempts integer NOT NULL DEFAULT 0,
+  next_attempt_at timestamptz NOT NULL DEFAULT now(),
+  claimed_by text NULL,
+  last_error text NULL
 );
 
 CREATE INDEX IF NOT EXISTS idx_uploads_uploaded_at ON uploads (uploaded_at);
 CREATE INDEX IF NOT EXISTS idx_uploads_uploader_id ON uploads (uploader_id);
 CREATE INDEX IF NOT EXISTS idx_uploads_doc_id ON uploads (doc_id);
+CREATE INDEX IF NOT EXISTS idx_uploads_content_hash ON uploads (content_hash)
+  WHERE content_hash IS NOT NULL AND status IS DISTINCT FROM 'duplicate';
+CREATE INDEX IF NOT EXISTS idx_uploads_queue ON uploads (next_attempt_at)
+  WHERE status IN ('queued', 'failed', 'processing');
@@ -0,0 +1,10 @@
+-- next_attempt_at can no longer be NULL: a NULL never compares <= now(), so
+-- a row inserted without it would sit in the queue unclaimed forever.
+-- Terminal rows (embedded, dead_letter, duplicate) keep their last value.
+
+UPDATE uploads
+SET next_attempt_at = uploaded_at
+WHERE next_attempt_at IS NULL;
+
+ALTER TABLE uploads ALTER COLUMN next_attempt_at SET DEFAULT now();
+ALTER TABLE uploads ALTER COLUMN next_attempt_at SET NOT NULL;
@@ -1,12 +1,118 @@
+import logging
+import math
+import random
+import time
+from contextlib import contextmanager
 from typing import List
 
 import boto3
+import numpy as np
 from opensearchpy import OpenSearch, RequestsHttpConnection, helpers
 from requests_aws4auth import AWS4Auth
 
+from AWS_utils.quantization import knn_field_mapping, quantize, unit_vector_int8_scale, validate_mode
+from AWS_utils.search_filters import SHARED_DOC_FIELD, normalize_filters
+
+logger = logging.getLogger(__name__)
+
+SPACE_TYPES = ('l2', 'cosinesimil', 'innerproduct')
+TENANT_LAYOUTS = ('shared', 'routing')
+# bulk items rejected because the cluster's write queue is full; worth retrying
+RETRYABLE_BULK_STATUSES = (429,)
+
+
+def exact_scores(space_type: str, query_vector, vectors) -> np.ndarray:
+    """Score ``vectors`` against ``query_vector`` exactly, as OpenSearch scores hits in ``space_type``."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    query = np.asarray(query_vector, dtype=np.float32)
+    if space_type == 'l2':
+        return 1.0 / (1.0 + ((vectors - query) ** 2).sum(axis=-1))
+    dots = vectors @ query
+    if space_type == 'cosinesimil':
+        norms = np.linalg.norm(vectors, axis=-1) * np.linalg.norm(query)
+        return (1.0 + dots / np.maximum(norms, 1e-12)) / 2.0
+    if space_type == 'innerproduct':
+        return np.where(dots >= 0, dots + 1.0, 1.0 / (1.0 - dots))
+    raise ValueError(f'unknown space type {space_type!r}; expected one of {", ".join(SPACE_TYPES)}')
+
 
 class OpenSearchVectorStore:
-    def __init__(self, host: str, index_name: str, region: str, service: str = 'aoss', dimension: int = 1536):
+    """Chunk vector index on OpenSearch / AOSS.
+
+    With ``quantization`` set to ``fp16``, ``int8`` or ``binary`` the kNN field
+    holds compressed vectors while the float32 originals are kept only in
+    ``_source``, outside the in-memory graph (``fp16`` is encoded server-side,
+    so ``embedding`` itself keeps the originals; the other modes store them
+    as ``embedding_full``). Searches then fetch ``oversample * top_k``
+    candidates from the compressed index and rescore them exactly against the
+    full-precision vectors.
+
+    The ``int8`` range is recorded as ``quantization_scale`` in the mapping
+    ``_meta`` when the index is created: ``quantization_scale`` if given
+    (derive it from your vectors with ``quantization.int8_scale``), otherwise
+    the ``int8_scale`` of random unit-length vectors of ``dimension``. Writes
+    and queries always use the recorded scale. ``binary`` keeps one bit per
+    dimension and is refused below ``MIN_BINARY_OVERSAMPLE``.
+
+    ``space_type``, ``hnsw_m`` and ``ef_construction`` only take effect when
+    the index is created. ``ef_search`` is sent with every kNN query (OpenSearch
+    2.16+); None keeps the engine default.
+
+    Writes go through ``parallel_bulk``: requests of at most
+    ``bulk_chunk_size`` documents and ``bulk_max_chunk_bytes`` bytes are sent
+    from ``bulk_threads`` threads. Items rejected with 429 are retried with
+    exponential backoff up to ``bulk_max_retries`` times; items that still
+    fail are returned to the caller rather than raised.
+
+    Searches accept ``filters`` (see ``normalize_filters``). They are applied
+    inside the kNN clause, so the engine only traverses matching chunks and
+    still returns ``top_k`` hits for a narrow filter instead of post-filtering
+    them away. With ``tenant_layout='routing'`` chunks are routed to a shard by
+    ``uploader_id``, and a search filtered by uploader only queries that
+    uploader's shards; switching layout needs a fresh index, since chunks
+    already written would be duplicated on their new shard.
+
+    The index records ``embedding_model_id`` and ``dimension`` in its mapping
+    ``_meta``. ``index_meta`` reads them back, re-reading at most every
+    ``meta_ttl_seconds``, from whichever index ``index_name`` resolves to.
+    After a migration cutover repoints the alias, readers then pick up the
+    new model and dimension (see ``IndexEmbeddings``).
+
+    With ``with_vectors`` set, searches also return each hit's full-precision
+    vector as ``embedding`` (for re-ranking such as MMR), read from the
+    ``_source`` the hits already carry.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        index_name: str,
+        region: str,
+        service: str = 'aoss',
+        dimension: int = 1536,
+        quantization: str = 'none',
+        quantization_scale: float | None = None,
+        oversample: float = 3.0,
+        space_type: str = 'l2',
+        hnsw_m: int = 16,
+        ef_construction: int = 128,
+        ef_search: int | None = None,
+        bulk_chunk_size: int = 500,
+        bulk_max_chunk_bytes: int = 10 * 1024 * 1024,
+        bulk_threads: int = 4,
+        bulk_max_retries: int = 5,
+        bulk_initial_backoff: float = 1.0,
+        bulk_max_backoff: float = 60.0,
+        tenant_layout: str = 'shared',
+        embedding_model_id: str | None = None,
+        meta_ttl_seconds: float = 30.0,
+    ):
+        if space_type not in SPACE_TYPES:
+            raise ValueError(f'unknown space type {space_type!r}; expected one of {", ".join(SPACE_TYPES)}')
+        if tenant_layout not in TENANT_LAYOUTS:
+            raise ValueError(f'unknown tenant layout {tenant_layout!r}; expected one of {", ".join(TENANT_LAYOUTS)}')
+        if tenant_layout == 'routing' and service == 'aoss':
+            raise ValueError('OpenSearch Serverless does not support custom routing; use the shared tenant layout')
         session = boto3.Session(region_name=region)
         credentials = session.get_credentials()
         if credentials is None:
@@ -19,7 +125,26 @@ class OpenSearchVectorStore:
             session_token=credentials.token,
         )
         self.index_name = index_name
+        self.service = service
         self.dimension = dimension
+        self.quantization = validate_mode(quantization, dimension, oversample)
+        self.quantization_scale = quantization_scale
+        self.oversample = oversample
+        self.space_type = space_type
+        self.hnsw_m = hnsw_m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.bulk_chunk_size = bulk_chunk_size
+        self.bulk_max_chunk_bytes = bulk_max_chunk_bytes
+        self.bulk_threads = bulk_threads
+        self.bulk_max_retries = bulk_max_retries
+        self.bulk_initial_backoff = bulk_initial_backoff
+        self.bulk_max_backoff = bulk_max_backoff
+        self.tenant_layout = tenant_layout
+        self.embedding_model_id = embedding_model_id
+        self.meta_ttl_seconds = meta_ttl_seconds
+        self._index_meta: dict | None = None
+        self._index_meta_expires = 0.0
         self.client = OpenSearch(
             hosts=[{'host': host, 'port': 443}],
             http_auth=awsauth,
@@ -31,6 +156,7 @@ class OpenSearchVectorStore:
 
     def ensure_index(self):
         if self.client.indices.exists(self.index_name):
+            self._record_embedding_model()
             return
         body = {
             'settings': {
@@ -39,6 +165,7 @@ class OpenSearchVectorStore:
                 }
             },
             'mappings': {
+                '_meta': {**self._embedding_meta(), **self._quantization_meta()},
                 'properties': {
                     'doc_id': {'type': 'keyword'},
                     'file_name': {'type': 'text'},
@@ -46,21 +173,84 @@ class OpenSearchVectorStore:
                     'chunk_index': {'type': 'integer'},
                     'uploader_id': {'type': 'keyword'},
                     'uploader_name': {'type': 'keyword'},
-                    'embedding': {
-                        'type': 'knn_vector',
-                        'dimension': self.dimension,
-                        'method': {
+                    'embedding': knn_field_mapping(
+                        self.dimension,
+                        self.quantization,
+                        {
                             'name': 'hnsw',
                             'engine': 'faiss',
-                            'space_type': 'l2',
+                            'space_type': self.space_type,
+                            'parameters': {'m': self.hnsw_m, 'ef_construction': self.ef_construction},
                         },
-                    },
+                    ),
                     'text': {'type': 'text'},
+                    'content_hash': {'type': 'keyword'},
                 }
             },
         }
+        if self.quantization in ('int8', 'binary'):
+            # kept only in _source for rescoring; not indexed, no doc values
+            body['mappings']['properties']['embedding_full'] = {'type': 'float', 'index': False, 'doc_values': False}
         self.client.indices.create(self.index_name, body=body)
 
+    def _embedding_meta(self) -> dict:
+        if not self.embedding_model_id:
+            return {}
+        return {'embedding_model_id': self.embedding_model_id, 'embedding_dimension': self.dimension}
+
+    def _quantization_meta(self) -> dict:
+        if self.quantization != 'int8':
+            return {}
+        return {'quantization_scale': self.quantization_scale or unit_vector_int8_scale(self.dimension)}
+
+    def _record_embedding_model(self):
+        """Stamp an index created before models were recorded with the configured model."""
+        meta = self.index_meta()
+        if not self.embedding_model_id or meta.get('recorded'):
+            return
+        stamp = self._embedding_meta()
+        if meta.get('quantization_scale'):
+            # put_mapping replaces _meta as a whole
+            stamp['quantization_scale'] = meta['quantization_scale']
+        self.client.indices.put_mapping(index=self.index_name, body={'_meta': stamp})
+        self._index_meta = None
+
+    @property
+    def _int8_scale(self) -> float | None:
+        if self.quantization != 'int8':
+            return None
+        # int8 indexes created before the scale was recorded were written with 1.0
+        return self.index_meta().get('quantization_scale') or self.quantization_scale or 1.0
+
+    def index_meta(self) -> dict:
+        """Return the model, dimension and int8 scale recorded by the index behind ``index_name``.
+
+        Keys: ``embedding_model_id``, ``embedding_dimension``,
+        ``quantization_scale`` and ``recorded``.
+
+        Falls back to the configured model and dimension (``recorded`` False)
+        when the index has none recorded; ``quantization_scale`` is None
+        unless the index recorded one.
+        """
+        now = time.monotonic()
+        if self._index_meta is None or now >= self._index_meta_expires:
+            mappings = self.client.indices.get_mapping(index=self.index_name)
+            # keyed by the concrete index, also when index_name is an alias
+            meta = next(iter(mappings.values()), {}).get('mappings', {}).get('_meta') or {}
+            self._index_meta = {
+                'embedding_model_id': meta.get('embedding_model_id') or self.embedding_model_id,
+                'embedding_dimension': int(meta.get('embedding_dimension') or self.dimension),
+                'quantization_scale': float(meta['quantization_scale']) if meta.get('quantization_scale') else None,
+                'recorded': bool(meta.get('embedding_model_id')),
+            }
+            self._index_meta_expires = now + self.meta_ttl_seconds
+        return self._index_meta
+
+    def ping(self):
+        # AOSS does not serve ``GET /``; an index existence check works on both flavours
+        if not self.client.indices.exists(index=self.index_name):
+            raise RuntimeError(f'index {self.index_name!r} does not exist')
+
     def delete_chunks_for_doc(self, doc_id: str):
         self.client.delete_by_query(
             index=self.index_name,
@@ -68,53 +258,452 @@ class OpenSearchVectorStore:
             conflicts='proceed',
         )
 
-    def upsert_chunks(self, records: List[dict]):
-        actions = (
-            {
-                '_op_type': 'index',
-                '_index': self.index_name,
-                '_id': record['id'],
-                '_source': record,
+    def fetch_chunk_states(self, doc_id: str) -> dict[str, dict]:
+        """Return ``{chunk_id: {'content_hash', 'chunk_index'}}`` for every indexed chunk of ``doc_id``.
+
+        Chunks indexed before content hashes were stored have a ``None`` hash
+        and are therefore always treated as changed.
+        """
+        resp = self.client.search(
+            index=self.index_name,
+            body={
+                'size': 10000,
+                'query': {'term': {'doc_id': doc_id}},
+                '_source': ['content_hash', 'chunk_index'],
+            },
+        )
+        hits = resp.get('hits', {}).get('hits', [])
+        return {
+            hit['_id']: {
+                'content_hash': hit.get('_source', {}).get('content_hash'),
+                'chunk_index': hit.get('_source', {}).get('chunk_index'),
             }
-            for record in records
+            for hit in hits
+        }
+
+    def update_chunk_positions(self, doc_id: str, positions: dict[str, int]) -> dict:
+        """Set ``chunk_index`` of the indexed chunks in ``positions`` (``{chunk_id: chunk_index}``).
+
+        Runs as one update-by-query scoped to ``doc_id``, so it finds the chunks
+        without knowing their routing and leaves vectors untouched.
+        """
+        if not positions:
+            return {'succeeded': 0, 'errors': []}
+        resp = self.client.update_by_query(
+            index=self.index_name,
+            body={
+                'query': {'bool': {'filter': [
+                    {'term': {'doc_id': doc_id}},
+                    {'ids': {'values': list(positions)}},
+                ]}},
+                'script': {
+                    'lang': 'painless',
+                    'source': 'ctx._source.chunk_index = params.positions.get(ctx._id)',
+                    'params': {'positions': positions},
+                },
+            },
+            conflicts='proceed',
         )
-        helpers.bulk(self.client, actions)
+        errors = [
+            {'id': failure.get('id'), 'status': failure.get('status'), 'error': failure.get('cause')}
+            for failure in resp.get('failures', [])
+        ]
+        missing = len(positions) - resp.get('updated', 0) - len(errors)
+        if missing > 0:
+            errors.append({'id': doc_id, 'status': 404, 'error': f'{missing} chunk(s) not found'})
+        return {'succeeded': resp.get('updated', 0), 'errors': errors}
 
-    def knn_search(self, query_vector: List[float], top_k: int = 5, source_fields: List[str] | None = None):
-        if not isinstance(query_vector, list):
-            raise ValueError('query_vector must be a list of floats')
-        if self.dimension and len(query_vector) != self.dimension:
-            raise ValueError(f'query_vector dimension {len(query_vector)} does not match index dimension {self.dimension}')
-        top_k = max(1, min(int(top_k), 50))
-        body = {
-            'size': top_k,
-            'query': {
-                'knn': {
-                    'embedding': {
-                        'vector': query_vector,
-                        'k': top_k,
-                    }
-                }
+    def count_chunks(self) -> int:
+        return self.client.count(index=self.index_name)['count']
+
+    def fetch_doc_chunks(self, doc_id: str) -> List[dict]:
+        """Return the stored chunks of ``doc_id`` (``id`` plus source fields, no vectors) in chunk order."""
+        resp = self.client.search(
+            index=self.index_name,
+            body={
+                'size': 10000,
+                'query': {'term': {'doc_id': doc_id}},
+                '_source': {'excludes': ['embedding', 'embedding_full']},
+                'sort': [{'chunk_index': 'asc'}],
             },
+        )
+        return [{'id': hit['_id'], **hit.get('_source', {})} for hit in resp.get('hits', {}).get('hits', [])]
+
+    def point_alias(self, alias: str, index: str | None = None) -> List[str]:
+        """Atomically make ``alias`` resolve to ``index`` (default: this index) only.
+
+        Returns the indices the alias resolved to before. They are kept, so
+        pointing the alias back at one of them rolls the change back. A
+        concrete index that still carries the alias name (the layout before
+        the first migration) cannot stay under that name: it is first cloned
+        to ``<alias>-<UTC timestamp>``, and only dropped in the alias request
+        once the clone holds as many chunks.
+        """
+        if self.service == 'aoss':
+            raise RuntimeError(
+                f'OpenSearch Serverless has no index aliases; point OPENSEARCH_INDEX at {self.index_name!r} instead'
+            )
+        index = index or self.index_name
+        if not self.client.indices.exists(index=index):
+            raise RuntimeError(f'index {index!r} does not exist')
+        actions, previous, blocked = [], [], None
+        if self.client.indices.exists_alias(name=alias):
+            for current in self.client.indices.get_alias(name=alias):
+                if current != index:
+                    actions.append({'remove': {'index': current, 'alias': alias}})
+                    previous.append(current)
+        elif self.client.indices.exists(index=alias):
+            backup = f"{alias}-{time.strftime('%Y%m%d%H%M%S', time.gmtime())}"
+            self._clone_index(alias, backup)
+            blocked = alias
+            actions.append({'remove_index': {'index': alias}})
+            previous.append(backup)
+        actions.append({'add': {'index': index, 'alias': alias}})
+        try:
+            self.client.indices.update_aliases(body={'actions': actions})
+        except Exception:
+            if blocked:
+                self._set_write_block(blocked, False)
+            raise
+        self._index_meta = None
+        return previous
+
+    def _set_write_block(self, index: str, blocked: bool):
+        self.client.indices.put_settings(index=index, body={'index': {'blocks': {'write': blocked}}})
+
+    def _clone_index(self, source: str, target: str):
+        """Copy ``source`` to ``target`` and check that the copy is complete.
+
+        Cloning needs ``source`` write-blocked; the block is lifted again if
+        the copy fails, and stays otherwise because ``source`` is about to be
+        dropped.
+        """
+        self._set_write_block(source, True)
+        try:
+            self.client.indices.clone(index=source, target=target)
+            self._set_write_block(target, False)
+            self.client.indices.refresh(index=target)
+            source_count = self.client.count(index=source)['count']
+            target_count = self.client.count(index=target)['count']
+            if source_count != target_count:
+                raise RuntimeError(f'clone {target!r} holds {target_count} of {source_count} chunk(s)')
+        except Exception:
+            self._set_write_block(source, False)
+            raise
+
+    def _bulk(self, actions: List[dict]) -> dict:
+        """Send ``actions`` with ``parallel_bulk``, retrying rejected items with backoff.
+
+        Returns ``{'succeeded': n, 'errors': [{'id', 'status', 'error'}, ...]}``
+        listing the items that failed for good.
+        """
+        pending = {action['_id']: action for action in actions}
+        succeeded, errors = 0, []
+        for attempt in range(self.bulk_max_retries + 1):
+            if attempt:
+                delay = min(self.bulk_max_backoff, self.bulk_initial_backoff * 2 ** (attempt - 1))
+                logger.warning('retrying %s rejected bulk item(s) in %.1fs', len(pending), delay)
+                time.sleep(delay * random.uniform(0.5, 1.0))
+            rejected = {}
+            for ok, item in helpers.parallel_bulk(
+                self.client,
+                list(pending.values()),
+                thread_count=self.bulk_threads,
+                chunk_size=self.bulk_chunk_size,
+                max_chunk_bytes=self.bulk_max_chunk_bytes,
+                raise_on_error=False,
+                raise_on_exception=False,
+            ):
+                op_type, info = next(iter(item.items()))
+                status = info.get('status')
+                # deleting a chunk that is already gone is not an error
+                if ok or (op_type == 'delete' and status == 404):
+                    succeeded += 1
+                elif status in RETRYABLE_BULK_STATUSES and attempt < self.bulk_max_retries:
+                    rejected[info['_id']] = pending[info['_id']]
+                else:
+                    errors.append({'id': info.get('_id'), 'status': status, 'error': info.get('error')})
+            if not rejected:
+                break
+            pending = rejected
+        return {'succeeded': succeeded, 'errors': errors}
+
+    @contextmanager
+    def bulk_indexing(self, refresh_interval: str = '-1'):
+        """Relax ``refresh_interval`` for a backfill, then restore it and refresh once.
+
+        Serverless collections manage refresh themselves; there this is a no-op.
+        """
+        if self.service == 'aoss':
+            yield
+            return
+        settings = self.client.indices.get_settings(index=self.index_name, name='index.refresh_interval')
+        # keyed by the concrete index, also when index_name is an alias; None restores the default
+        previous = next(iter(settings.values()), {}).get('settings', {}).get('index', {}).get('refresh_interval')
+        self.client.indices.put_settings(index=self.index_name, body={'index': {'refresh_interval': refresh_interval}})
+        try:
+            yield
+        finally:
+            self.client.indices.put_settings(index=self.index_name, body={'index': {'refresh_interval': previous}})
+            self.client.indices.refresh(index=self.index_name)
+
+    def delete_chunk_ids(self, chunk_ids: List[str]) -> dict:
+        if self.tenant_layout == 'routing':
+            return self._delete_ids_by_query(chunk_ids)
+        return self._bulk([{'_op_type': 'delete', '_index': self.index_name, '_id': chunk_id} for chunk_id in chunk_ids])
+
+    def _delete_ids_by_query(self, chunk_ids: List[str]) -> dict:
+        """Delete ``chunk_ids`` on every shard; with custom routing the id alone does not locate a chunk."""
+        if not chunk_ids:
+            return {'succeeded': 0, 'errors': []}
+        resp = self.client.delete_by_query(
+            index=self.index_name,
+            body={'query': {'ids': {'values': list(chunk_ids)}}},
+            conflicts='proceed',
+        )
+        errors = [
+            {'id': failure.get('id'), 'status': failure.get('status'), 'error': failure.get('cause')}
+            for failure in resp.get('failures', [])
+        ]
+        return {'succeeded': len(chunk_ids) - len(errors), 'errors': errors}
+
+    @property
+    def _full_precision_field(self) -> str:
+        return 'embedding_full' if self.quantization in ('int8', 'binary') else 'embedding'
+
+    def _to_source(self, record: dict) -> dict:
+        if self.quantization not in ('int8', 'binary'):
+            return record
+        compressed = quantize(record['embedding'], self.quantization, self._int8_scale)
+        return {**record, 'embedding': compressed.tolist(), 'embedding_full': record['embedding']}
+
+    def upsert_chunks(self, records: List[dict]) -> dict:
+        """Index ``records``; returns the ``_bulk`` result with the items that could not be written."""
+        actions = []
+        for record in records:
+            action = {'_op_type': 'index', '_index': self.index_name, '_id': record['id'], '_source': self._to_source(record)}
+            if self.tenant_layout == 'routing' and record.get('uploader_id'):
+                action['_routing'] = record['uploader_id']
+            actions.append(action)
+        return self._bulk(actions)
+
+    def _to_result(self, hit: dict, with_vectors: bool = False) -> dict:
+        result = self._hit_to_result(hit)
+        if with_vectors:
+            result['embedding'] = hit.get('_source', {}).get(self._full_precision_field)
+        return result
+
+    def _search_routing(self, filters: dict) -> str | None:
+        """Shard routing for a search scoped by ``filters``; None searches every shard."""
+        # deduplicated documents shared with the uploader live on their first uploader's shard
+        if self.tenant_layout != 'routing' or 'uploader_id' not in filters or SHARED_DOC_FIELD in filters:
+            return None
+        return ','.join(filters['uploader_id'])
+
+    @staticmethod
+    def _filter_clauses(filters: dict) -> List[dict]:
+        clauses = []
+        for field, values in filters.items():
+            if field == SHARED_DOC_FIELD:
+                continue
+            clause = {'terms': {field: values}}
+            if field == 'uploader_id' and SHARED_DOC_FIELD in filters:
+                shared = {'terms': {'doc_id': filters[SHARED_DOC_FIELD]}}
+                clause = {'bool': {'should': [clause, shared], 'minimum_should_match': 1}}
+            clauses.append(clause)
+        return clauses
+
+    @staticmethod
+    def _hit_to_result(hit: dict) -> dict:
+        source = hit.get('_source', {})
+        return {
+            'id': hit.get('_id'),
+            'score': hit.get('_score'),
+            'doc_id': source.get('doc_id'),
+            'file_name': source.get('file_name'),
+            's3_url': source.get('s3_url'),
+            'chunk_index': source.get('chunk_index'),
+            'text': source.get('text'),
+            'uploader_id': source.get('uploader_id'),
+            'uploader_name': source.get('uploader_name'),
         }
+
+    def _knn_body(
+        self,
+        query_vector: List[float],
+        top_k: int,
+        source_fields: List[str] | None = None,
+        filters: dict | None = None,
+        with_vectors: bool = False,
+    ) -> dict:
+        if not isinstance(query_vector, list):
+            raise ValueError('query_vector must be a list of floats')
+        dimension = self.index_meta()['embedding_dimension']
+        if dimension and len(query_vector) != dimension:
+            raise ValueError(f'query_vector dimension {len(query_vector)} does not match index dimension {dimension}')
+        if self.quantization in ('int8', 'binary'):
+            search_vector = quantize(query_vector, self.quantization, self._int8_scale).tolist()
+        else:
+            search_vector = query_vector
+        knn = {'vector': search_vector, 'k': top_k}
+        if self.ef_search:
+            knn['method_parameters'] = {'ef_search': max(self.ef_search, top_k)}
+        if filters:
+            # efficient filtering: applied while traversing the graph, not to its top k
+            knn['filter'] = {'bool': {'filter': self._filter_clauses(filters)}}
+        body = {'size': top_k, 'query': {'knn': {'embedding': knn}}}
+        vector_fields = [self._full_precision_field] if self.quantization != 'none' or with_vectors else []
         if source_fields:
-            body['_source'] = source_fields
-        resp = self.client.search(index=self.index_name, body=body)
-        hits = resp.get('hits', {}).get('hits', [])
+            body['_source'] = list(source_fields) + vector_fields
+        else:
+            body['_source'] = {'excludes': [f for f in ('embedding', 'embedding_full') if f not in vector_fields]}
+        return body
+
+    def _candidate_count(self, top_k: int) -> int:
+        if self.quantization == 'none':
+            return top_k
+        return max(top_k, min(math.ceil(top_k * self.oversample), 100))
+
+    def _rescore(self, query_vector: List[float], hits: List[dict], top_k: int, with_vectors: bool = False) -> List[dict]:
+        """Re-rank quantized candidates by their exact score against the full-precision vectors."""
+        if self.quantization == 'none' or not hits:
+            return [self._to_result(hit, with_vectors) for hit in hits][:top_k]
+        full = [hit['_source'][self._full_precision_field] for hit in hits]
+        scores = exact_scores(self.space_type, query_vector, full)
         results = []
-        for hit in hits:
-            source = hit.get('_source', {})
-            results.append(
-                {
-                    'id': hit.get('_id'),
-                    'score': hit.get('_score'),
-                    'doc_id': source.get('doc_id'),
-                    'file_name': source.get('file_name'),
-                    's3_url': source.get('s3_url'),
-                    'chunk_index': source.get('chunk_index'),
-                    'text': source.get('text'),
-                    'uploader_id': source.get('uploader_id'),
-                    'uploader_name': source.get('uploader_name'),
-                }
-            )
+        for idx in np.argsort(-scores, kind='stable')[:top_k]:
+            result = self._to_result(hits[idx], with_vectors)
+            result['score'] = float(scores[idx])
+            results.append(result)
         return results
+
+    def _lexical_body(self, query_text: str, top_k: int, filters: dict | None = None, with_vectors: bool = False) -> dict:
+        query = {
+            'multi_match': {
+                'query': query_text,
+                'fields': ['text', 'file_name'],
+            }
+        }
+        if filters:
+            query = {'bool': {'must': query, 'filter': self._filter_clauses(filters)}}
+        vector_fields = [self._full_precision_field] if with_vectors else []
+        return {
+            'size': top_k,
+            'query': query,
+            '_source': {'excludes': [f for f in ('embedding', 'embedding_full') if f not in vector_fields]},
+        }
+
+    def _msearch_header(self, filters: dict) -> dict:
+        header = {'index': self.index_name}
+        routing = self._search_routing(filters)
+        if routing:
+            header['routing'] = routing
+        return header
+
+    def knn_search(
+        self,
+        query_vector: List[float],
+        top_k: int = 5,
+        source_fields: List[str] | None = None,
+        filters: dict | None = None,
+        with_vectors: bool = False,
+    ):
+        """Return the ``top_k`` nearest chunks, restricted to those matching ``filters``."""
+        top_k = max(1, min(int(top_k), 50))
+        filters = normalize_filters(filters, internal=True)
+        body = self._knn_body(query_vector, self._candidate_count(top_k), source_fields, filters, with_vectors)
+        resp = self.client.search(index=self.index_name, body=body, routing=self._search_routing(filters))
+        hits = resp.get('hits', {}).get('hits', [])
+        return self._rescore(query_vector, hits, top_k, with_vectors)
+
+    def knn_search_batch(
+        self,
+        query_vectors: List[List[float]],
+        top_k: int = 5,
+        filters: dict | None = None,
+        with_vectors: bool = False,
+    ) -> List[List[dict]]:
+        """Run one kNN query per vector in a single ``msearch`` round trip, in input order.
+
+        ``filters`` apply to every query of the batch.
+        """
+        if not query_vectors:
+            return []
+        top_k = max(1, min(int(top_k), 50))
+        filters = normalize_filters(filters, internal=True)
+        header = self._msearch_header(filters)
+        body = []
+        for query_vector in query_vectors:
+            body.extend([header, self._knn_body(query_vector, self._candidate_count(top_k), None, filters, with_vectors)])
+        resp = self.client.msearch(body=body)
+        batches = []
+        for query_vector, item in zip(query_vectors, resp.get('responses', [])):
+            if 'error' in item:
+                raise RuntimeError(f"batch search sub-query failed: {item['error']}")
+            batches.append(self._rescore(query_vector, item.get('hits', {}).get('hits', []), top_k, with_vectors))
+        return batches
+
+    def lexical_search(self, query_text: str, top_k: int = 5, filters: dict | None = None, with_vectors: bool = False):
+        top_k = max(1, min(int(top_k), 50))
+        filters = normalize_filters(filters, internal=True)
+        resp = self.client.search(
+            index=self.index_name,
+            body=self._lexical_body(query_text, top_k, filters, with_vectors),
+            routing=self._search_routing(filters),
+        )
+        hits = resp.get('hits', {}).get('hits', [])
+        return [self._to_result(hit, with_vectors) for hit in hits]
+
+    def hybrid_search(
+        self,
+        query_text: str,
+        query_vector: List[float],
+        top_k: int = 5,
+        lexical_weight: float = 1.0,
+        vector_weight: float = 1.0,
+        rank_constant: int = 60,
+        candidates: int | None = None,
+        filters: dict | None = None,
+        with_vectors: bool = False,
+    ):
+        """Run BM25 and kNN in one ``msearch`` round trip and fuse them with RRF.
+
+        Each list contributes ``weight / (rank_constant + rank)`` per hit. Both
+        queries fetch ``candidates`` hits (default ``2 * top_k``) so that chunks
+        ranked just below ``top_k`` by one retriever can still surface.
+        ``filters`` scope both queries.
+        """
+        top_k = max(1, min(int(top_k), 50))
+        candidates = max(top_k, min(int(candidates or top_k * 2), 100))
+        filters = normalize_filters(filters, internal=True)
+        header = self._msearch_header(filters)
+        body = [
+            header,
+            self._knn_body(query_vector, self._candidate_count(candidates), None, filters, with_vectors),
+            header,
+            self._lexical_body(query_text, candidates, filters, with_vectors),
+        ]
+        resp = self.client.msearch(body=body)
+        ranked_lists = []
+        for item in resp.get('responses', []):
+            if 'error' in item:
+                raise RuntimeError(f"hybrid search sub-query failed: {item['error']}")
+            ranked_lists.append(item.get('hits', {}).get('hits', []))
+        ranked_lists = [
+            self._rescore(query_vector, ranked_lists[0], candidates, with_vectors),
+            [self._to_result(hit, with_vectors) for hit in ranked_lists[1]],
+        ]
+        return reciprocal_rank_fusion(ranked_lists, [vector_weight, lexical_weight], rank_constant, top_k)
+
+
+def reciprocal_rank_fusion(ranked_lists: List[List[dict]], weights: List[float], rank_constant: int = 60, top_k: int = 5):
+    """Fuse ranked result lists by weighted reciprocal rank; ``score`` becomes the fused score."""
+    fused: dict[str, dict] = {}
+    scores: dict[str, float] = {}
+    for results, weight in zip(ranked_lists, weights):
+        for rank, result in enumerate(results, start=1):
+            key = result['id']
+            fused.setdefault(key, result)
+            scores[key] = scores.get(key, 0.0) + weight / (rank_constant + rank)
+    ordered = sorted(fused, key=lambda key: scores[key], reverse=True)[:top_k]
+    return [{**fused[key], 'score': scores[key]} for key in ordered]
@@ -0,0 +1,100 @@
+import numpy as np
+
+QUANTIZATION_MODES = ('none', 'fp16', 'int8', 'binary')
+INT8_SCALE_PERCENTILE = 99.9
+# one bit per dimension ranks candidates poorly; rescoring only recovers recall from a wide shortlist
+MIN_BINARY_OVERSAMPLE = 10.0
+
+
+def validate_mode(mode: str, dimension: int, oversample: float | None = None) -> str:
+    mode = (mode or 'none').lower()
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f'unknown quantization {mode!r}; expected one of {", ".join(QUANTIZATION_MODES)}')
+    if mode == 'binary' and dimension % 8:
+        raise ValueError('binary quantization requires a dimension divisible by 8')
+    if mode == 'binary' and oversample is not None and oversample < MIN_BINARY_OVERSAMPLE:
+        raise ValueError(
+            f'binary quantization requires a rescore oversample of at least {MIN_BINARY_OVERSAMPLE:g}, got {oversample:g}'
+        )
+    return mode
+
+
+def int8_scale(vectors, percentile: float = INT8_SCALE_PERCENTILE) -> float:
+    """Return the ``percentile`` of the absolute component values of ``vectors``.
+
+    Used as the int8 range so the 127 levels cover the values that actually
+    occur: a unit-length 1536-d vector stays within about ``±0.1``, a tenth
+    of ``[-1, 1]``. Only the rarest outliers are clipped.
+    """
+    values = np.abs(np.asarray(vectors, dtype=np.float32))
+    if not values.size:
+        raise ValueError('cannot derive an int8 scale from no vectors')
+    scale = float(np.percentile(values, percentile))
+    if scale <= 0:
+        raise ValueError('cannot derive an int8 scale from all-zero vectors')
+    return scale
+
+
+def unit_vector_int8_scale(dimension: int, samples: int = 256, seed: int = 0) -> float:
+    """``int8_scale`` of random unit-length vectors of ``dimension``, for indexes created before any data exists."""
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(samples, dimension)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return int8_scale(vectors)
+
+
+def quantize(vectors, mode: str, scale: float | None = None) -> np.ndarray:
+    """Compress float vectors (1-D or 2-D) into the storage type of ``mode``.
+
+    ``int8`` maps ``[-scale, scale]`` linearly onto ``[-127, 127]``; values
+    outside are clipped, and ``scale`` is required (see ``int8_scale``).
+    ``binary`` keeps one sign bit per dimension, packed into signed bytes as
+    OpenSearch's ``binary`` data type expects.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if mode == 'none':
+        return vectors
+    if mode == 'fp16':
+        return vectors.astype(np.float16)
+    if mode == 'int8':
+        if not scale:
+            raise ValueError('int8 quantization requires a scale')
+        return np.clip(np.rint(vectors / scale * 127.0), -128, 127).astype(np.int8)
+    if mode == 'binary':
+        return np.packbits(vectors > 0, axis=-1).view(np.int8)
+    raise ValueError(f'unknown quantization {mode!r}')
+
+
+def bytes_per_vector(dimension: int, mode: str) -> int:
+    return {
+        'none': 4 * dimension,
+        'fp16': 2 * dimension,
+        'int8': dimension,
+        'binary': dimension // 8,
+    }[mode]
+
+
+def knn_field_mapping(dimension: int, mode: str, method: dict) -> dict:
+    """Return the ``knn_vector`` mapping for ``mode`` built on top of ``method``."""
+    if mode == 'none':
+        return {'type': 'knn_vector', 'dimension': dimension, 'method': method}
+    if mode == 'fp16':
+        parameters = {**method.get('parameters', {}), 'encoder': {'name': 'sq', 'parameters': {'type': 'fp16'}}}
+        return {
+            'type': 'knn_vector',
+            'dimension': dimension,
+            'method': {**method, 'engine': 'faiss', 'parameters': parameters},
+        }
+    if mode == 'int8':
+        return {
+            'type': 'knn_vector',
+            'dimension': dimension,
+            'data_type': 'byte',
+            'method': {**method, 'engine': 'lucene'},
+        }
+    return {
+        'type': 'knn_vector',
+        'dimension': dimension,
+        'data_type': 'binary',
+        'method': {**method, 'engine': 'faiss', 'space_type': 'hamming'},
+    }
@@ -1,4 +1,7 @@
 import os
+import tempfile
+from contextlib import contextmanager
+
 import boto3
 from botocore.exceptions import BotoCoreError, ClientError
 
@@ -14,6 +17,11 @@ class S3Client:
             raise RuntimeError('S3 bucket not configured')
         self.client.upload_fileobj(fileobj, self.bucket, object_key, ExtraArgs=ExtraArgs or {})
 
+    def ping(self):
+        if not self.bucket:
+            raise RuntimeError('S3 bucket not configured')
+        self.client.head_bucket(Bucket=self.bucket)
+
     def get_public_url(self, object_key: str) -> str:
         if not self.bucket:
             raise RuntimeError('S3 bucket not configured')
@@ -32,3 +40,26 @@ class S3Client:
         if body is None:
             raise RuntimeError('S3 object response missing body stream')
         return body.read()
+
+    @contextmanager
+    def spool_object(self, object_key: str, spool_dir: str | None = None):
+        """Stream an object to a temporary file and yield its path.
+
+        ``download_fileobj`` fetches the body in ranged parts, so memory use stays
+        flat no matter how large the object is. The file is removed on exit.
+        """
+        if not self.bucket:
+            raise RuntimeError('S3 bucket not configured')
+        fd, path = tempfile.mkstemp(suffix=os.path.splitext(object_key)[1], dir=spool_dir)
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                try:
+                    self.client.download_fileobj(self.bucket, object_key, fh)
+                except (BotoCoreError, ClientError) as exc:
+                    raise RuntimeError(f'failed to download {object_key} from S3: {exc}')
+            yield path
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,47 @@
+from typing import List
+
+# keyword fields a search can be scoped by
+FILTER_FIELDS = ('uploader_id', 'doc_id')
+# set by the API, never by clients: documents that also match the ``uploader_id``
+# filter because the uploader's upload of them was deduplicated
+SHARED_DOC_FIELD = 'shared_doc_id'
+MAX_FILTER_VALUES = 1024
+
+
+def normalize_filters(filters, internal: bool = False) -> dict[str, List[str]]:
+    """Validate search ``filters`` and return them as ``{field: sorted unique values}``.
+
+    Each key must be one of ``FILTER_FIELDS`` and maps to one value or a list
+    of values; a chunk matches when, for every key, its field equals one of
+    the listed values. None or ``{}`` means no filtering. With ``internal``
+    (the stores), ``SHARED_DOC_FIELD`` is accepted as well: a chunk whose
+    ``doc_id`` is listed there satisfies the ``uploader_id`` filter.
+    """
+    if not filters:
+        return {}
+    if not isinstance(filters, dict):
+        raise ValueError('filters must be an object')
+    normalized = {}
+    for field, values in filters.items():
+        if internal and field == SHARED_DOC_FIELD:
+            if 'uploader_id' not in filters:
+                raise ValueError(f'filter {field!r} requires an uploader_id filter')
+            normalized[field] = sorted(set(values))
+            continue
+        if field not in FILTER_FIELDS:
+            raise ValueError(f'unknown filter field {field!r}; expected one of {", ".join(FILTER_FIELDS)}')
+        if isinstance(values, str):
+            values = [values]
+        if not isinstance(values, list) or not values:
+            raise ValueError(f'filter {field!r} must be a string or a non-empty list of strings')
+        if not all(isinstance(value, str) and value for value in values):
+            raise ValueError(f'filter {field!r} must be a string or a non-empty list of strings')
+        if len(values) > MAX_FILTER_VALUES:
+            raise ValueError(f'filter {field!r} accepts at most {MAX_FILTER_VALUES} values')
+        normalized[field] = sorted(set(values))
+    return normalized
+
+
+def filters_key(filters: dict[str, List[str]] | None) -> tuple:
+    """Hashable form of normalized ``filters``, for cache and coalescing keys."""
+    return tuple((field, tuple(values)) for field, values in sorted((filters or {}).items()))
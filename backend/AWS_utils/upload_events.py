@@ -0,0 +1,108 @@
+import logging
+import select
+import threading
+import time
+
+import psycopg2
+from psycopg2 import sql
+
+from AWS_utils.db import UPLOAD_CHANNEL, _get_dsn
+
+logger = logging.getLogger(__name__)
+
+
+class PostgresUploadListener:
+    """Wait for upload notifications on a dedicated ``LISTEN`` connection.
+
+    ``channel`` defaults to ``UPLOAD_CHANNEL``; the API listens on
+    ``INDEX_CHANNEL`` the same way to invalidate cached answers.
+
+    The connection is kept outside the shared pool because it stays
+    subscribed for the worker's lifetime. Notifications that arrive while the
+    worker is busy are buffered by the connection and returned by the next
+    ``wait``. After a connection error the listener retries every
+    ``reconnect_seconds``; until then ``wait`` simply sleeps, so the caller
+    falls back to its periodic sweep. Without a configured DSN it never
+    connects and ``wait`` always just sleeps.
+    """
+
+    def __init__(self, channel: str = UPLOAD_CHANNEL, dsn: str | None = None, reconnect_seconds: float = 5.0):
+        self.channel = channel
+        self.dsn = dsn
+        self.reconnect_seconds = reconnect_seconds
+        self._conn = None
+        self._retry_at = 0.0
+        self._disabled = False
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn or _get_dsn(), connect_timeout=5)
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL('LISTEN {}').format(sql.Identifier(self.channel)))
+        self._conn = conn
+        logger.info('listening for uploads on channel %s', self.channel)
+
+    def wait(self, timeout: float) -> list[str]:
+        """Block up to ``timeout`` seconds and return the doc_ids notified meanwhile."""
+        if self._conn is None:
+            if self._disabled or time.monotonic() < self._retry_at:
+                time.sleep(timeout)
+                return []
+            try:
+                self._connect()
+            except RuntimeError:
+                # no DSN configured; that does not change while the process runs
+                logger.error('cannot listen on channel %s without a database DSN; polling only', self.channel)
+                self._disabled = True
+                return []
+            except psycopg2.Error:
+                logger.exception('failed to subscribe to channel %s', self.channel)
+                self._retry_at = time.monotonic() + self.reconnect_seconds
+                return []
+        try:
+            if not self._conn.notifies and select.select([self._conn], [], [], timeout)[0]:
+                self._conn.poll()
+            payloads = [notify.payload for notify in self._conn.notifies]
+            self._conn.notifies.clear()
+            return payloads
+        except (psycopg2.Error, OSError):
+            logger.exception('upload listener connection lost')
+            self.close()
+            self._retry_at = time.monotonic() + self.reconnect_seconds
+            return []
+
+    def close(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except psycopg2.Error:
+                pass
+            self._conn = None
+
+
+class LocalUploadQueue:
+    """In-process stand-in for ``PostgresUploadListener``.
+
+    For an ingestion worker running in the same process as the upload route
+    (local development, tests): pass ``publish`` to the upload blueprint and
+    the queue to ``RagPipeline.run_forever``.
+    """
+
+    def __init__(self):
+        self._pending: list[str] = []
+        self._cond = threading.Condition()
+
+    def publish(self, doc_id: str):
+        with self._cond:
+            self._pending.append(doc_id)
+            self._cond.notify_all()
+
+    def wait(self, timeout: float) -> list[str]:
+        with self._cond:
+            if not self._pending:
+                self._cond.wait(timeout)
+            pending, self._pending = self._pending, []
+        return pending
+
+    def close(self):
+        pass
@@ -0,0 +1,97 @@
+import os
+import threading
+from typing import Callable, List
+
+from AWS_utils.local_vector_store import LocalVectorStore
+from AWS_utils.opensearch import OpenSearchVectorStore
+
+
+def build_vector_store(
+    region: str,
+    dimension: int,
+    index_name: str | None = None,
+    embedding_model_id: str | None = None,
+):
+    """Build the vector store selected by ``VECTOR_STORE_BACKEND`` (``opensearch`` or ``local``).
+
+    ``index_name`` defaults to ``OPENSEARCH_INDEX``. ``embedding_model_id`` is
+    the model the index is (or will be) embedded with; see ``IndexEmbeddings``.
+    """
+    backend = os.environ.get('VECTOR_STORE_BACKEND', 'opensearch').lower()
+    index_name = index_name or os.environ.get('OPENSEARCH_INDEX', 'doc-embeddings')
+    if backend == 'local':
+        return LocalVectorStore(
+            os.environ.get('LOCAL_VECTOR_STORE_PATH', '.vector_store'),
+            index_name,
+            dimension=dimension,
+            embedding_model_id=embedding_model_id,
+        )
+    if backend != 'opensearch':
+        raise RuntimeError(f'unknown VECTOR_STORE_BACKEND {backend!r}; expected "opensearch" or "local"')
+    host = os.environ.get('OPENSEARCH_HOST')
+    if not host:
+        raise RuntimeError('OPENSEARCH_HOST env var is required for the opensearch vector store backend')
+    ef_search = os.environ.get('OPENSEARCH_HNSW_EF_SEARCH')
+    quantization_scale = os.environ.get('OPENSEARCH_QUANTIZATION_SCALE')
+    return OpenSearchVectorStore(
+        host,
+        index_name,
+        region=region,
+        service=os.environ.get('OPENSEARCH_SERVICE', 'aoss'),
+        dimension=dimension,
+        quantization=os.environ.get('OPENSEARCH_QUANTIZATION', 'none'),
+        quantization_scale=float(quantization_scale) if quantization_scale else None,
+        oversample=float(os.environ.get('OPENSEARCH_RESCORE_OVERSAMPLE', '3.0')),
+        space_type=os.environ.get('OPENSEARCH_SPACE_TYPE', 'l2'),
+        hnsw_m=int(os.environ.get('OPENSEARCH_HNSW_M', '16')),
+        ef_construction=int(os.environ.get('OPENSEARCH_HNSW_EF_CONSTRUCTION', '128')),
+        ef_search=int(ef_search) if ef_search else None,
+        bulk_chunk_size=int(os.environ.get('OPENSEARCH_BULK_CHUNK_SIZE', '500')),
+        bulk_max_chunk_bytes=int(os.environ.get('OPENSEARCH_BULK_MAX_BYTES', str(10 * 1024 * 1024))),
+        bulk_threads=int(os.environ.get('OPENSEARCH_BULK_THREADS', '4')),
+        bulk_max_retries=int(os.environ.get('OPENSEARCH_BULK_MAX_RETRIES', '5')),
+        tenant_layout=os.environ.get('OPENSEARCH_TENANT_LAYOUT', 'shared').lower(),
+        embedding_model_id=embedding_model_id,
+        meta_ttl_seconds=float(os.environ.get('OPENSEARCH_META_TTL_SECONDS', '30')),
+    )
+
+
+class IndexEmbeddings:
+    """Embed with the model the vector store's index was built with.
+
+    The model and dimension come from ``vector_store.index_meta()``. A
+    migration cutover that repoints the index alias therefore switches
+    queries and new chunks to the new model without a redeploy.
+    ``factory(model_id, dimension)`` builds the client for a model, and one
+    client is kept per model. ``default_model_id`` covers stores that record
+    no model.
+    """
+
+    def __init__(self, vector_store, factory: Callable, default_model_id: str, default_dimension: int):
+        self.vector_store = vector_store
+        self.factory = factory
+        self.default_model_id = default_model_id
+        self.default_dimension = default_dimension
+        self._clients: dict = {}
+        self._lock = threading.Lock()
+
+    def current(self):
+        """Return the embeddings client for the index's current model."""
+        meta = self.vector_store.index_meta() if hasattr(self.vector_store, 'index_meta') else {}
+        model_id = meta.get('embedding_model_id') or self.default_model_id
+        with self._lock:
+            client = self._clients.get(model_id)
+            if client is None:
+                dimension = meta.get('embedding_dimension') or self.default_dimension
+                client = self._clients[model_id] = self.factory(model_id, dimension)
+        return client
+
+    @property
+    def model_id(self) -> str:
+        return self.current().model_id
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.current().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.current().embed_query(text)
@@ -1,12 +1,22 @@
 import logging
+import multiprocessing
 import os
+import signal
+import threading
 
 from langchain_aws.embeddings import BedrockEmbeddings
 from langchain_experimental.text_splitter import SemanticChunker
 
+from AWS_utils import db as db_utils
 from AWS_utils.s3 import S3Client
-from AWS_utils.opensearch import OpenSearchVectorStore
+from AWS_utils.upload_events import PostgresUploadListener
+from AWS_utils.vector_stores import IndexEmbeddings, build_vector_store
+from chunking import CHUNKING_MODES, SentenceReuseChunker, TokenCountSplitter
 from config import load_config
+from embedding_cache import EmbeddingCache
+from embedding_executor import BatchedEmbeddings, FakeEmbeddings
+from metrics import start_metrics_server
+from migration import EmbeddingMigration
 from pipeline import RagPipeline
 
 
@@ -15,6 +25,75 @@ logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO'))
 
 EMBEDDING_MODEL_ID = os.getenv('BEDROCK_EMBEDDING_MODEL_ID', 'amazon.titan-embed-text-v1')
 EMBEDDING_DIMENSION = int(os.getenv('EMBEDDING_DIMENSION', '1536'))
+
+
+def build_embeddings(
+	region: str,
+	model_id: str = EMBEDDING_MODEL_ID,
+	dimension: int = EMBEDDING_DIMENSION,
+	requests_per_second: float | None = None,
+) -> BatchedEmbeddings:
+	backend_name = os.environ.get('EMBEDDING_BACKEND', 'bedrock').lower()
+	if backend_name == 'fake':
+		backend = FakeEmbeddings(
+			dimension=dimension,
+			latency_seconds=float(os.environ.get('FAKE_EMBEDDING_LATENCY', '0')),
+			model_id=model_id,
+		)
+	elif backend_name == 'bedrock':
+		backend = BedrockEmbeddings(model_id=model_id, region_name=region)
+	else:
+		raise RuntimeError(f'unknown EMBEDDING_BACKEND {backend_name!r}; expected "bedrock" or "fake"')
+	rate = os.environ.get('EMBED_REQUESTS_PER_SECOND')
+	if requests_per_second is None and rate:
+		requests_per_second = float(rate)
+	return BatchedEmbeddings(
+		backend,
+		batch_size=int(os.environ.get('EMBED_BATCH_SIZE', '16')),
+		max_concurrency=int(os.environ.get('EMBED_CONCURRENCY', '4')),
+		requests_per_second=requests_per_second,
+		max_retries=int(os.environ.get('EMBED_MAX_RETRIES', '6')),
+	)
+
+
+def build_splitter(mode: str, embeddings, embedding_cache: EmbeddingCache | None = None):
+	if mode == 'semantic':
+		return SemanticChunker(embeddings)
+	if mode == 'sentence_reuse':
+		return SentenceReuseChunker(
+			embeddings,
+			breakpoint_percentile=float(os.environ.get('RAG_BREAKPOINT_PERCENTILE', '95')),
+			embedding_cache=embedding_cache,
+		)
+	if mode == 'tokens':
+		return TokenCountSplitter(
+			chunk_tokens=int(os.environ.get('RAG_CHUNK_TOKENS', '400')),
+			overlap_tokens=int(os.environ.get('RAG_CHUNK_OVERLAP_TOKENS', '50')),
+		)
+	raise RuntimeError(f'unknown RAG_CHUNKING_MODE {mode!r}; expected one of {", ".join(CHUNKING_MODES)}')
+
+
+def build_migration(region: str, source_store, embedding_cache=None, requests_per_second: float | None = None):
+	"""Build the embedding model migration named by ``MIGRATION_TARGET_INDEX``, or None outside a migration."""
+	target_index = os.environ.get('MIGRATION_TARGET_INDEX')
+	if not target_index:
+		return None
+	model_id = os.environ.get('MIGRATION_EMBEDDING_MODEL_ID')
+	if not model_id:
+		raise RuntimeError('MIGRATION_TARGET_INDEX requires MIGRATION_EMBEDDING_MODEL_ID')
+	if model_id == EMBEDDING_MODEL_ID:
+		raise RuntimeError(f'MIGRATION_EMBEDDING_MODEL_ID {model_id!r} is already the current embedding model')
+	dimension = int(os.environ.get('MIGRATION_EMBEDDING_DIMENSION', str(EMBEDDING_DIMENSION)))
+	if target_index == source_store.index_name:
+		raise RuntimeError(f'MIGRATION_TARGET_INDEX {target_index!r} is the current index')
+	return EmbeddingMigration(
+		source_store,
+		build_vector_store(region, dimension, index_name=target_index, embedding_model_id=model_id),
+		build_embeddings(region, model_id=model_id, dimension=dimension, requests_per_second=requests_per_second),
+		embedding_cache=embedding_cache,
+	)
+
+
 def build_pipeline() -> RagPipeline:
 	config = load_config()
 	s3_client = S3Client(
@@ -23,28 +102,101 @@ def build_pipeline() -> RagPipeline:
 		aws_access_key_id=config.aws_access_key_id,
 		aws_secret_access_key=config.aws_secret_access_key,
 	)
-	embeddings = BedrockEmbeddings(model_id=EMBEDDING_MODEL_ID, region_name=config.aws_region)
-	splitter = SemanticChunker(embeddings)
-	opensearch_host = os.environ.get('OPENSEARCH_HOST')
-	index_name = os.environ.get('OPENSEARCH_INDEX', 'doc-embeddings')
-	if not opensearch_host:
-		raise RuntimeError('OPENSEARCH_HOST env var is required for the RAG pipeline')
-	service = os.environ.get('OPENSEARCH_SERVICE', 'aoss')
-	vector_store = OpenSearchVectorStore(
-		opensearch_host,
-		index_name,
-		region=config.aws_region,
-		service=service,
-		dimension=EMBEDDING_DIMENSION,
+	vector_store = build_vector_store(config.aws_region, EMBEDDING_DIMENSION, embedding_model_id=EMBEDDING_MODEL_ID)
+	# after a migration cutover the index alias names the new model; follow it
+	embeddings = IndexEmbeddings(
+		vector_store,
+		lambda model_id, dimension: build_embeddings(config.aws_region, model_id=model_id, dimension=dimension),
+		EMBEDDING_MODEL_ID,
+		EMBEDDING_DIMENSION,
+	)
+	cache_path = os.environ.get('EMBEDDING_CACHE_PATH')
+	embedding_cache = None
+	if cache_path:
+		embedding_cache = EmbeddingCache(
+			cache_path,
+			max_entries=int(os.environ.get('EMBEDDING_CACHE_MAX_ENTRIES', '200000')),
+		)
+	splitter = build_splitter(os.environ.get('RAG_CHUNKING_MODE', 'semantic').lower(), embeddings, embedding_cache)
+	return RagPipeline(
+		s3_client,
+		splitter,
+		embeddings,
+		vector_store,
+		embedding_cache=embedding_cache,
+		pdf_workers=int(os.environ.get('PDF_EXTRACT_WORKERS', '2')),
+		chunk_window_chars=int(os.environ.get('RAG_CHUNK_WINDOW_CHARS', '20000')),
+		index_mode=os.environ.get('RAG_INDEX_MODE', 'incremental'),
+		migration=build_migration(config.aws_region, vector_store, embedding_cache=embedding_cache),
+	)
+
+
+def run_worker(batch_size: int, max_workers: int, poll_interval: float):
+	stop_event = threading.Event()
+
+	def _stop(signum, _frame):
+		logger.info('received signal %s, finishing current batch', signum)
+		stop_event.set()
+
+	signal.signal(signal.SIGTERM, _stop)
+	signal.signal(signal.SIGINT, _stop)
+	pipeline = build_pipeline()
+	events = os.getenv('RAG_UPLOAD_EVENTS', 'postgres' if db_utils.dsn_configured() else 'off').lower()
+	if events not in ('postgres', 'off'):
+		raise RuntimeError(f'unknown RAG_UPLOAD_EVENTS {events!r}; expected "postgres" or "off"')
+	pipeline.run_forever(
+		batch_size=batch_size,
+		max_workers=max_workers,
+		poll_interval=poll_interval,
+		stop_event=stop_event,
+		upload_events=PostgresUploadListener() if events == 'postgres' else None,
 	)
-	return RagPipeline(s3_client, splitter, embeddings, vector_store)
 
 
 def main():
 	batch_size = int(os.getenv('RAG_BATCH_SIZE', '5'))
-	pipeline = build_pipeline()
-	processed = pipeline.process_pending(batch_size=batch_size)
-	logger.info('processed %s document(s)', processed)
+	max_workers = int(os.getenv('RAG_MAX_WORKERS', '1'))
+	mode = os.getenv('RAG_WORKER_MODE', 'once').lower()
+	if mode == 'once':
+		pipeline = build_pipeline()
+		processed = pipeline.process_pending(batch_size=batch_size, max_workers=max_workers)
+		logger.info('processed %s document(s)', processed)
+		return
+	if mode != 'worker':
+		raise RuntimeError(f'unknown RAG_WORKER_MODE {mode!r}; expected "once" or "worker"')
+
+	poll_interval = float(os.getenv('RAG_POLL_INTERVAL', '10'))
+	processes = int(os.getenv('RAG_WORKER_PROCESSES', '1'))
+	metrics_port = os.getenv('RAG_METRICS_PORT')
+	if metrics_port:
+		if processes > 1 and not os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+			logger.warning('RAG_WORKER_PROCESSES > 1 without PROMETHEUS_MULTIPROC_DIR: child metrics are not exported')
+		start_metrics_server(int(metrics_port))
+	if processes <= 1:
+		run_worker(batch_size, max_workers, poll_interval)
+		return
+	# each process builds its own clients; rows are claimed with SKIP LOCKED so
+	# the processes never pick up the same document
+	children = [
+		multiprocessing.Process(
+			target=run_worker,
+			args=(batch_size, max_workers, poll_interval),
+			name=f'rag-worker-{idx}',
+		)
+		for idx in range(processes)
+	]
+	for child in children:
+		child.start()
+
+	def _forward(signum, _frame):
+		for child in children:
+			if child.is_alive():
+				os.kill(child.pid, signal.SIGTERM)
+
+	signal.signal(signal.SIGTERM, _forward)
+	signal.signal(signal.SIGINT, _forward)
+	for child in children:
+		child.join()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,96 @@
+import re
+from typing import List, Tuple
+
+import numpy as np
+
+from embedding_cache import EmbeddingCache, embed_with_cache
+
+CHUNKING_MODES = ('semantic', 'sentence_reuse', 'tokens')
+
+
+class SentenceReuseChunker:
+    """Semantic chunking that embeds every sentence exactly once.
+
+    Like ``SemanticChunker`` it splits where the cosine distance between
+    neighbouring sentences exceeds the ``breakpoint_percentile`` of all
+    distances. The sentence vectors are then averaged into the chunk vector,
+    so the chunks never have to be embedded a second time.
+
+    Sentence vectors go through ``embedding_cache`` when one is given, so the
+    sentences of a carried-over window or a reprocessed document are not
+    embedded again.
+    """
+
+    mode = 'sentence_reuse'
+
+    def __init__(
+        self,
+        embeddings,
+        breakpoint_percentile: float = 95.0,
+        sentence_split_regex: str = r'(?<=[.?!])\s+',
+        embedding_cache: EmbeddingCache | None = None,
+    ):
+        self.embeddings = embeddings
+        self.breakpoint_percentile = breakpoint_percentile
+        self.sentence_split_regex = sentence_split_regex
+        self.embedding_cache = embedding_cache
+
+    def split_with_embeddings(self, text: str) -> List[Tuple[str, List[float]]]:
+        sentences = [s.strip() for s in re.split(self.sentence_split_regex, text) if s.strip()]
+        if not sentences:
+            return []
+        embedded, _, _ = embed_with_cache(self.embeddings, sentences, self.embedding_cache)
+        vectors = np.asarray(embedded, dtype=np.float32)
+        if len(sentences) == 1:
+            return [(sentences[0], vectors[0].tolist())]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        unit = vectors / np.where(norms == 0, 1.0, norms)
+        distances = 1.0 - np.einsum('ij,ij->i', unit[:-1], unit[1:])
+        threshold = np.percentile(distances, self.breakpoint_percentile)
+        ends = [int(idx) + 1 for idx in np.nonzero(distances > threshold)[0]] + [len(sentences)]
+        chunks = []
+        start = 0
+        for end in ends:
+            chunks.append((' '.join(sentences[start:end]), vectors[start:end].mean(axis=0).tolist()))
+            start = end
+        return chunks
+
+    def split_text(self, text: str) -> List[str]:
+        return [chunk for chunk, _ in self.split_with_embeddings(text)]
+
+
+class TokenCountSplitter:
+    """Cheap fixed-size splitter for bulk backfills.
+
+    Tokens are approximated by whitespace-separated words; chunks hold
+    ``chunk_tokens`` tokens and overlap by ``overlap_tokens``. No embedding
+    calls are made while splitting.
+    """
+
+    mode = 'tokens'
+
+    def __init__(self, chunk_tokens: int = 400, overlap_tokens: int = 50):
+        if overlap_tokens >= chunk_tokens:
+            raise ValueError('overlap_tokens must be smaller than chunk_tokens')
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+
+    def split_text(self, text: str) -> List[str]:
+        tokens = text.split()
+        step = self.chunk_tokens - self.overlap_tokens
+        chunks = []
+        for start in range(0, len(tokens), step):
+            chunks.append(' '.join(tokens[start:start + self.chunk_tokens]))
+            if start + self.chunk_tokens >= len(tokens):
+                break
+        return chunks
+
+
+def splitter_mode(splitter) -> str:
+    """Return the ``RAG_CHUNKING_MODE`` name recorded for chunks produced by ``splitter``."""
+    mode = getattr(splitter, 'mode', None)
+    if mode:
+        return mode
+    # LangChain's SemanticChunker carries no mode attribute
+    name = type(splitter).__name__
+    return 'semantic' if name == 'SemanticChunker' else name
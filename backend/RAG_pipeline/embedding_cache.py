@@ -0,0 +1,115 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from typing import List, Sequence
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """Persistent, size-bounded cache of chunk vectors backed by SQLite.
+
+    Entries are keyed by ``(model_id, sha256(text))`` so a vector is only ever
+    reused for the exact text and embedding model it was computed with. Once
+    the cache holds more than ``max_entries`` rows the least recently used
+    ones are evicted.
+    """
+
+    def __init__(self, path: str, max_entries: int = 200_000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+              model_id TEXT NOT NULL,
+              text_hash TEXT NOT NULL,
+              vector BLOB NOT NULL,
+              last_used REAL NOT NULL,
+              PRIMARY KEY (model_id, text_hash)
+            )
+            """
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)')
+        self._conn.commit()
+
+    def get_many(self, model_id: str, hashes: Sequence[str]) -> dict[str, List[float]]:
+        found: dict[str, List[float]] = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            # stay well below SQLite's bound-parameter limit
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                placeholders = ','.join('?' for _ in batch)
+                rows = self._conn.execute(
+                    f'SELECT text_hash, vector FROM embeddings WHERE model_id = ? AND text_hash IN ({placeholders})',
+                    (model_id, *batch),
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array('f', blob).tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    'UPDATE embeddings SET last_used = ? WHERE model_id = ? AND text_hash = ?',
+                    [(now, model_id, key) for key in found],
+                )
+                self._conn.commit()
+        return found
+
+    def put_many(self, model_id: str, items: dict[str, Sequence[float]]):
+        if not items:
+            return
+        now = time.time()
+        rows = [(model_id, key, array('f', vector).tobytes(), now) for key, vector in items.items()]
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO embeddings (model_id, text_hash, vector, last_used) VALUES (?, ?, ?, ?)',
+                rows,
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        (count,) = self._conn.execute('SELECT COUNT(*) FROM embeddings').fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                'DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY last_used ASC LIMIT ?)',
+                (overflow,),
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def embed_with_cache(embeddings, texts: List[str], cache: EmbeddingCache | None, model_id: str | None = None):
+    """Embed ``texts`` and return ``(vectors, hits, misses)``.
+
+    Only texts missing from ``cache`` are sent to ``embeddings``; duplicate
+    texts within one call are embedded once.
+    """
+    if cache is None:
+        return embeddings.embed_documents(texts), 0, len(texts)
+    model_id = model_id or embeddings.model_id
+    hashes = [text_hash(text) for text in texts]
+    cached = cache.get_many(model_id, hashes)
+    missing: dict[str, str] = {}
+    for key, text in zip(hashes, texts):
+        if key not in cached and key not in missing:
+            missing[key] = text
+    if missing:
+        fresh = embeddings.embed_documents(list(missing.values()))
+        if len(fresh) != len(missing):
+            raise RuntimeError('embedding count does not match chunk count')
+        computed = dict(zip(missing.keys(), fresh))
+        cache.put_many(model_id, computed)
+        cached.update(computed)
+    hits = sum(1 for key in hashes if key not in missing)
+    return [cached[key] for key in hashes], hits, len(texts) - hits
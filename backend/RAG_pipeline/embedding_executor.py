@@ -0,0 +1,172 @@
+import hashlib
+import logging
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+
+from botocore.exceptions import ClientError
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+THROTTLING_ERROR_CODES = (
+    'ThrottlingException',
+    'TooManyRequestsException',
+    'ServiceUnavailableException',
+    'ModelNotReadyException',
+)
+
+
+def is_throttling_error(exc: BaseException) -> bool:
+    if isinstance(exc, ClientError):
+        return exc.response.get('Error', {}).get('Code') in THROTTLING_ERROR_CODES
+    # langchain_aws re-raises boto errors as ValueError with the original message
+    message = str(exc)
+    return any(code in message for code in THROTTLING_ERROR_CODES) or 'Too many requests' in message
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at ``rate`` tokens per second."""
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0):
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class BatchedEmbeddings(Embeddings):
+    """Embedding executor around a LangChain embeddings backend.
+
+    Inputs are split into ``batch_size`` batches that run on up to
+    ``max_concurrency`` threads. Every text costs one token from an optional
+    ``requests_per_second`` bucket (Bedrock Titan embeds one text per request).
+    Throttled batches are retried with full-jitter exponential backoff, and the
+    output keeps the order of the input.
+    """
+
+    def __init__(
+        self,
+        backend: Embeddings,
+        batch_size: int = 16,
+        max_concurrency: int = 4,
+        requests_per_second: float | None = None,
+        max_retries: int = 6,
+        base_delay: float = 0.5,
+        max_delay: float = 20.0,
+    ):
+        self.backend = backend
+        self.batch_size = max(1, batch_size)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rate_limiter = TokenBucket(requests_per_second, capacity=max(requests_per_second, self.batch_size)) if requests_per_second else None
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix='embed')
+
+    @property
+    def model_id(self) -> str:
+        return self.backend.model_id
+
+    def _call(self, fn: Callable, cost: int):
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(cost)
+            try:
+                return fn()
+            except Exception as exc:
+                if attempt >= self.max_retries or not is_throttling_error(exc):
+                    raise
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+                attempt += 1
+                logger.warning('embedding request throttled, retry %s/%s in %.2fs', attempt, self.max_retries, delay)
+                time.sleep(delay)
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        vectors = self._call(lambda: self.backend.embed_documents(batch), cost=len(batch))
+        if len(vectors) != len(batch):
+            raise RuntimeError('embedding count does not match batch size')
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        batches = [texts[start:start + self.batch_size] for start in range(0, len(texts), self.batch_size)]
+        if len(batches) <= 1:
+            return self._embed_batch(batches[0]) if batches else []
+        futures = [self._pool.submit(self._embed_batch, batch) for batch in batches]
+        vectors: List[List[float]] = []
+        for future in futures:
+            vectors.extend(future.result())
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._call(lambda: self.backend.embed_query(text), cost=1)
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic offline embedding backend for throughput tests.
+
+    Vectors are derived from a hash of the text, each call sleeps for
+    ``latency_seconds`` plus ``per_text_seconds`` per text, and a
+    ``throttle_rate`` fraction of calls fails with a Bedrock-style
+    ``ThrottlingException``.
+    """
+
+    def __init__(
+        self,
+        dimension: int = 1536,
+        latency_seconds: float = 0.0,
+        per_text_seconds: float = 0.0,
+        throttle_rate: float = 0.0,
+        model_id: str = 'fake-embedding',
+        seed: int = 0,
+    ):
+        self.dimension = dimension
+        self.latency_seconds = latency_seconds
+        self.per_text_seconds = per_text_seconds
+        self.throttle_rate = throttle_rate
+        self.model_id = model_id
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'big')
+        rng = random.Random(seed)
+        values = [rng.gauss(0.0, 1.0) for _ in range(self.dimension)]
+        norm = math.sqrt(sum(v * v for v in values)) or 1.0
+        return [v / norm for v in values]
+
+    def _simulate_call(self, count: int):
+        with self._lock:
+            self.calls += 1
+            throttled = self._random.random() < self.throttle_rate
+        time.sleep(self.latency_seconds + self.per_text_seconds * count)
+        if throttled:
+            raise ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}}, 'InvokeModel')
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self._simulate_call(len(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self._simulate_call(1)
+        return self._vector(text)
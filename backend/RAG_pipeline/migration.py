@@ -0,0 +1,254 @@
+"""Move the chunk index to a new embedding model without downtime.
+
+A migration writes every chunk, re-embedded with the target model, into a
+shadow index while the current index keeps serving reads:
+
+1. ``backfill`` re-embeds the chunk texts already stored in the source index
+   (no PDF is downloaded or re-chunked) at a throttled rate. Progress is
+   recorded per document under ``uploads.metadata.migrations.<target index>``,
+   so an interrupted run resumes where it stopped.
+2. Workers started with ``MIGRATION_TARGET_INDEX`` dual-write every document
+   they ingest to the shadow index as well, so uploads arriving during the
+   backfill are not missed.
+3. ``cutover`` atomically points the ``OPENSEARCH_INDEX`` alias at the shadow
+   index once every embedded document has been migrated. Each index records
+   its embedding model, so the API and workers switch models with the alias
+   (``IndexEmbeddings``). The previous index is kept; ``rollback`` points the
+   alias back at it.
+
+Run from ``backend/RAG_pipeline``::
+
+    python migration.py status|backfill|cutover [--force]
+    python migration.py rollback --index <previous index>
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import List
+
+from AWS_utils import db as db_utils
+from embedding_cache import EmbeddingCache, embed_with_cache, text_hash
+from metrics import ingest_stage
+from pipeline import raise_for_index_errors
+
+logger = logging.getLogger(__name__)
+
+# stored fields that belong to the source model and must not be copied across
+_VECTOR_FIELDS = ('embedding', 'embedding_full')
+
+
+def _is_indexed(indexed: dict, chunk: dict) -> bool:
+    """True when ``indexed`` already holds ``chunk`` with the same, known content hash."""
+    indexed_hash = indexed.get(chunk['id'], {}).get('content_hash')
+    return indexed_hash is not None and indexed_hash == chunk.get('content_hash')
+
+
+class EmbeddingMigration:
+    def __init__(
+        self,
+        source_store,
+        target_store,
+        embeddings,
+        embedding_cache: EmbeddingCache | None = None,
+        uploads=db_utils,
+    ):
+        self.source = source_store
+        self.target = target_store
+        # usually a BatchedEmbeddings with ``requests_per_second`` set, which throttles the backfill
+        self.embeddings = embeddings
+        self.embedding_cache = embedding_cache
+        self.uploads = uploads
+
+    @property
+    def target_index(self) -> str:
+        return self.target.index_name
+
+    def write_document(self, doc_id: str, chunks: List[dict]) -> int:
+        """Embed ``chunks`` with the target model, write them to the shadow index and record the progress.
+
+        ``chunks`` are chunk records without vectors (``id``, ``text``,
+        ``content_hash`` plus the stored fields). Chunks the shadow index
+        already holds with the same hash are not re-embedded, only their
+        ``chunk_index`` is updated if it moved; chunks of ``doc_id`` it holds
+        but ``chunks`` lacks are deleted. Chunks indexed before content
+        hashes were stored get their hash computed here.
+        """
+        chunks = [
+            chunk if chunk.get('content_hash') else {**chunk, 'content_hash': text_hash(chunk['text'])}
+            for chunk in chunks
+        ]
+        indexed = self.target.fetch_chunk_states(doc_id)
+        # a re-run or a re-ingested document only needs its changed chunks re-embedded
+        changed = [chunk for chunk in chunks if not _is_indexed(indexed, chunk)]
+        if changed:
+            texts = [chunk['text'] for chunk in changed]
+            with ingest_stage('migration_embedding'):
+                vectors, _, _ = embed_with_cache(self.embeddings, texts, self.embedding_cache)
+            if len(vectors) != len(texts):
+                raise RuntimeError('embedding count does not match chunk count')
+            records = []
+            for chunk, vector in zip(changed, vectors):
+                record = {key: value for key, value in chunk.items() if key not in _VECTOR_FIELDS}
+                record['embedding'] = vector
+                records.append(record)
+            with ingest_stage('migration_upsert'):
+                raise_for_index_errors(self.target.upsert_chunks(records), 'index')
+        moved = {
+            chunk['id']: chunk['chunk_index'] for chunk in chunks
+            if _is_indexed(indexed, chunk) and indexed[chunk['id']].get('chunk_index') != chunk.get('chunk_index')
+        }
+        if moved:
+            with ingest_stage('migration_reorder'):
+                raise_for_index_errors(self.target.update_chunk_positions(doc_id, moved), 'update')
+        current_ids = {chunk['id'] for chunk in chunks}
+        stale_ids = [chunk_id for chunk_id in indexed if chunk_id not in current_ids]
+        if stale_ids:
+            with ingest_stage('migration_delete'):
+                raise_for_index_errors(self.target.delete_chunk_ids(stale_ids), 'delete')
+        self.uploads.mark_upload_migrated(
+            doc_id,
+            self.target_index,
+            {
+                'status': 'done',
+                'chunks': len(chunks),
+                'embedding_model': self.embeddings.model_id,
+                'migrated_at': datetime.now(timezone.utc).isoformat(),
+            },
+        )
+        return len(chunks)
+
+    def migrate_document(self, doc: dict) -> bool:
+        """Copy one embedded document from the source index into the shadow index."""
+        doc_id = doc['doc_id']
+        try:
+            chunks = self.source.fetch_doc_chunks(doc_id)
+            if not chunks:
+                raise RuntimeError('document has no chunks in the source index')
+            count = self.write_document(doc_id, chunks)
+        except Exception as exc:
+            logger.exception('failed to migrate %s', doc_id)
+            self.uploads.mark_upload_migrated(
+                doc_id,
+                self.target_index,
+                {'status': 'failed', 'error': str(exc), 'failed_at': datetime.now(timezone.utc).isoformat()},
+            )
+            return False
+        logger.info('migrated %s: %s chunk(s)', doc_id, count)
+        return True
+
+    def backfill(
+        self,
+        batch_size: int = 20,
+        max_documents: int | None = None,
+        pause_seconds: float = 0.0,
+        stop_event: threading.Event | None = None,
+    ) -> dict:
+        """Migrate embedded documents not yet in the shadow index until none are left.
+
+        Documents that fail are recorded as ``failed`` and retried by the next
+        run rather than this one. ``pause_seconds`` is slept between batches on
+        top of the embedding rate limit.
+        """
+        stop_event = stop_event or threading.Event()
+        attempted: list[str] = []
+        # the shadow index serves no reads yet, so refreshing it during the backfill is wasted work
+        relaxed = getattr(self.target, 'bulk_indexing', None)
+        with relaxed() if relaxed else contextlib.nullcontext():
+            migrated = self._backfill_batches(batch_size, max_documents, pause_seconds, stop_event, attempted)
+        return {'attempted': len(attempted), 'migrated': migrated, 'failed': len(attempted) - migrated}
+
+    def _backfill_batches(self, batch_size, max_documents, pause_seconds, stop_event, attempted) -> int:
+        migrated = 0
+        while not stop_event.is_set():
+            limit = batch_size
+            if max_documents is not None:
+                limit = min(limit, max_documents - len(attempted))
+                if limit <= 0:
+                    break
+            docs = self.uploads.fetch_unmigrated_uploads(self.target_index, limit=limit, exclude_doc_ids=attempted)
+            if not docs:
+                break
+            for doc in docs:
+                if stop_event.is_set():
+                    break
+                attempted.append(doc['doc_id'])
+                migrated += self.migrate_document(doc)
+            if pause_seconds:
+                stop_event.wait(pause_seconds)
+        return migrated
+
+    def progress(self) -> dict:
+        return self.uploads.count_migration_progress(self.target_index)
+
+    def cutover(self, alias: str, force: bool = False) -> List[str]:
+        """Atomically point ``alias`` at the shadow index and return the indices it pointed at before.
+
+        Refuses while embedded documents are still missing from the shadow
+        index, or while it holds a different number of chunks than the source
+        index, unless ``force`` is set.
+        """
+        progress = self.progress()
+        if progress['remaining'] and not force:
+            raise RuntimeError(f"{progress['remaining']} document(s) are not migrated to {self.target_index!r} yet")
+        source_chunks, target_chunks = self.source.count_chunks(), self.target.count_chunks()
+        if source_chunks != target_chunks and not force:
+            raise RuntimeError(
+                f'{self.target_index!r} holds {target_chunks} chunk(s) but the source index holds {source_chunks}'
+            )
+        if not hasattr(self.target, 'point_alias'):
+            raise RuntimeError(f'{type(self.target).__name__} does not support index aliases')
+        previous = self.target.point_alias(alias)
+        logger.info('alias %s now points at %s (previously %s)', alias, self.target_index, ', '.join(previous) or '-')
+        return previous
+
+
+def main():
+    # chucker imports this module to wire up dual writes
+    from AWS_utils.vector_stores import build_vector_store
+    from chucker import EMBEDDING_DIMENSION, EMBEDDING_MODEL_ID, build_migration
+    from config import load_config
+
+    parser = argparse.ArgumentParser(description='Embedding model migration (see MIGRATION_* in the README).')
+    parser.add_argument('command', choices=['status', 'backfill', 'cutover', 'rollback'])
+    parser.add_argument('--force', action='store_true', help='cut over even if documents are not migrated')
+    parser.add_argument('--index', help='rollback: the index to point the alias back at')
+    args = parser.parse_args()
+
+    region = load_config().aws_region
+    rate = os.getenv('MIGRATION_EMBED_REQUESTS_PER_SECOND', '2')
+    migration = build_migration(
+        region,
+        build_vector_store(region, EMBEDDING_DIMENSION, embedding_model_id=EMBEDDING_MODEL_ID),
+        requests_per_second=float(rate) if rate else None,
+    )
+    if migration is None:
+        raise RuntimeError('MIGRATION_TARGET_INDEX is not set')
+    if args.command == 'status':
+        print(json.dumps({'target_index': migration.target_index, **migration.progress()}))
+    elif args.command == 'backfill':
+        start = time.perf_counter()
+        result = migration.backfill(
+            batch_size=int(os.getenv('MIGRATION_BATCH_SIZE', '20')),
+            pause_seconds=float(os.getenv('MIGRATION_PAUSE_SECONDS', '0')),
+        )
+        result['seconds'] = round(time.perf_counter() - start, 1)
+        print(json.dumps({**result, **migration.progress()}))
+    elif args.command == 'cutover':
+        alias = os.getenv('OPENSEARCH_INDEX', 'doc-embeddings')
+        previous = migration.cutover(alias, force=args.force)
+        print(json.dumps({'alias': alias, 'index': migration.target_index, 'previous': previous}))
+    else:
+        if not args.index:
+            raise RuntimeError('rollback requires --index')
+        alias = os.getenv('OPENSEARCH_INDEX', 'doc-embeddings')
+        previous = migration.target.point_alias(alias, index=args.index)
+        print(json.dumps({'alias': alias, 'index': args.index, 'previous': previous}))
+
+
+if __name__ == '__main__':
+    main()
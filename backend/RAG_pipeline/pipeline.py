@@ -1,5 +1,12 @@
 import logging
-from typing import List
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Iterable, Iterator, List
 
 from langchain_aws.embeddings import BedrockEmbeddings
 from langchain_experimental.text_splitter import SemanticChunker
@@ -7,64 +14,376 @@ from langchain_experimental.text_splitter import SemanticChunker
 from AWS_utils import db as db_utils
 from AWS_utils.opensearch import OpenSearchVectorStore
 from AWS_utils.s3 import S3Client
-from text_utils import extract_pdf_text
+from chunking import splitter_mode
+from embedding_cache import EmbeddingCache, embed_with_cache, text_hash
+from metrics import INGEST_CHUNKS, INGEST_DOCUMENTS, INGEST_STAGE_SECONDS, TimedIterator, ingest_stage
+from text_utils import iter_pdf_pages
 
 logger = logging.getLogger(__name__)
 
 
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def raise_for_index_errors(result: dict | None, action: str):
+    """Fail the document when the vector store reports chunks it could not ``action``."""
+    errors = (result or {}).get('errors') or []
+    if not errors:
+        return
+    INGEST_CHUNKS.labels(action='failed').inc(len(errors))
+    sample = '; '.join(f"{error['id']}: {error['status']} {error['error']}" for error in errors[:3])
+    raise RuntimeError(f'{len(errors)} chunk(s) failed to {action}: {sample}')
+
+
+def assign_chunk_ids(doc_id: str, chunk_hashes: List[str], indexed: dict[str, dict]) -> tuple[List[str], List[int]]:
+    """Give each chunk an id, reusing the id of an indexed chunk with the same content hash.
+
+    ``indexed`` is ``{chunk_id: {'content_hash', 'chunk_index'}}`` as returned
+    by ``fetch_chunk_states``. Returns the ids in chunk order and the indexes of
+    the chunks that got a new id, i.e. the ones to embed and write. New ids are
+    derived from the content hash and never collide with an indexed id, so the
+    stale chunks deleted afterwards are never chunks just written.
+    """
+    by_hash: dict[str, List[str]] = {}
+    ordered = sorted(indexed.items(), key=lambda item: (item[1].get('chunk_index') is None, item[1].get('chunk_index') or 0))
+    for chunk_id, state in ordered:
+        if state.get('content_hash') is not None:
+            by_hash.setdefault(state['content_hash'], []).append(chunk_id)
+    chunk_ids, new = [], []
+    taken = set(indexed)
+    for idx, content_hash in enumerate(chunk_hashes):
+        reusable = by_hash.get(content_hash)
+        if reusable:
+            chunk_ids.append(reusable.pop(0))
+            continue
+        chunk_id, suffix = f"{doc_id}::{content_hash[:16]}", 1
+        while chunk_id in taken:
+            chunk_id, suffix = f"{doc_id}::{content_hash[:16]}-{suffix}", suffix + 1
+        taken.add(chunk_id)
+        chunk_ids.append(chunk_id)
+        new.append(idx)
+    return chunk_ids, new
+
+
 class RagPipeline:
-    def __init__(self, s3: S3Client, splitter: SemanticChunker, embeddings: BedrockEmbeddings, vector_store: OpenSearchVectorStore):
+    def __init__(
+        self,
+        s3: S3Client,
+        splitter: SemanticChunker,
+        embeddings: BedrockEmbeddings,
+        vector_store: OpenSearchVectorStore,
+        worker_id: str | None = None,
+        embedding_cache: EmbeddingCache | None = None,
+        pdf_workers: int = 0,
+        chunk_window_chars: int = 20_000,
+        index_mode: str = 'incremental',
+        uploads=db_utils,
+        migration=None,
+        lease_seconds: int = db_utils.LEASE_SECONDS,
+    ):
         self.s3 = s3
+        # AWS_utils.db, or any stand-in exposing the same uploads-table functions
+        self.uploads = uploads
         self.splitter = splitter
         self.embeddings = embeddings
         self.vector_store = vector_store
+        self.worker_id = worker_id or default_worker_id()
+        self.embedding_cache = embedding_cache
+        self.chunk_window_chars = chunk_window_chars
+        if index_mode not in ('incremental', 'replace'):
+            raise ValueError(f'unknown index mode {index_mode!r}')
+        self.index_mode = index_mode
+        # recorded in upload metadata; taken from the splitter so it cannot disagree with it
+        self.chunking_mode = splitter_mode(splitter)
+        # a migration.EmbeddingMigration in progress; every indexed document is also written to its shadow index
+        self.migration = migration
+        # claims are leases of this length, renewed every third of it while a document is processing
+        self.lease_seconds = lease_seconds
+        self.pdf_executor = None
+        if pdf_workers > 0:
+            # spawn rather than fork: the parent holds boto/psycopg2 threads and locks
+            self.pdf_executor = ProcessPoolExecutor(
+                max_workers=pdf_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
 
-    def process_pending(self, batch_size: int = 5) -> int:
-        docs = db_utils.fetch_unprocessed_uploads(limit=batch_size)
-        if not docs:
-            logger.info('no pending documents to process')
-            return 0
-        processed = 0
-        for doc in docs:
-            doc_id = doc['doc_id']
-            logger.info('processing %s', doc_id)
-            try:
-                pdf_bytes = self.s3.get_object_bytes(doc_id)
-                text = extract_pdf_text(pdf_bytes)
-                if not text.strip():
-                    raise RuntimeError('no extractable text found in PDF')
-                chunk_texts = [chunk.strip() for chunk in self.splitter.split_text(text) if chunk.strip()]
-                if not chunk_texts:
-                    raise RuntimeError('SemanticChunker produced zero chunks')
-                vectors = self.embeddings.embed_documents(chunk_texts)
-                if len(vectors) != len(chunk_texts):
-                    raise RuntimeError('embedding count does not match chunk count')
-                records: List[dict] = []
-                for idx, (chunk_text, embedding) in enumerate(zip(chunk_texts, vectors)):
-                    chunk_id = f"{doc_id}::chunk-{idx}"
-                    records.append(
-                        {
-                            'id': chunk_id,
-                            'doc_id': doc_id,
-                            'file_name': doc['file_name'],
-                            's3_url': doc['s3_url'],
-                            'chunk_index': idx,
-                            'text': chunk_text,
-                            'embedding': embedding,
-                            'uploader_id': doc.get('uploader_id'),
-                            'uploader_name': doc.get('uploader_name'),
-                        }
+    def _split(self, text: str) -> list[tuple[str, list[float] | None]]:
+        # splitters that already embedded their spans hand the vectors back
+        if hasattr(self.splitter, 'split_with_embeddings'):
+            pairs = self.splitter.split_with_embeddings(text)
+        else:
+            pairs = [(chunk, None) for chunk in self.splitter.split_text(text)]
+        return [(chunk.strip(), vector) for chunk, vector in pairs if chunk.strip()]
+
+    def split_pages(self, pages: Iterable[str]) -> Iterator[tuple[str, list[float] | None]]:
+        """Chunk page texts incrementally, one window of ``chunk_window_chars`` at a time.
+
+        Yields ``(chunk_text, vector)`` pairs; ``vector`` is None unless the
+        splitter computed it. The last chunk of each window is carried over into
+        the next one because its natural boundary may lie on a later page.
+        """
+        buffer = ''
+        for page in pages:
+            if not page.strip():
+                continue
+            buffer = f'{buffer}\n{page}' if buffer else page
+            if len(buffer) < self.chunk_window_chars:
+                continue
+            chunks = self._split(buffer)
+            if len(chunks) <= 1:
+                yield from chunks
+                buffer = ''
+                continue
+            yield from chunks[:-1]
+            buffer = chunks[-1][0]
+        if buffer.strip():
+            yield from self._split(buffer)
+
+    def _skip_duplicate(self, doc: dict) -> bool:
+        """Record ``doc`` as a duplicate when its content is already embedded under another doc_id.
+
+        The upload route catches most duplicates; this covers identical files
+        uploaded concurrently, before either had been processed.
+        """
+        if not doc.get('content_hash'):
+            return False
+        canonical = self.uploads.find_upload_by_content_hash(
+            doc['content_hash'], exclude_doc_id=doc['doc_id'], embedded_only=True
+        )
+        if canonical is None:
+            return False
+        # a re-claimed document may have been indexed before it became a duplicate
+        with ingest_stage('delete'):
+            self.vector_store.delete_chunks_for_doc(doc['doc_id'])
+        with ingest_stage('db_update'):
+            self.uploads.mark_upload_duplicate(doc['doc_id'], canonical['doc_id'])
+        INGEST_DOCUMENTS.labels(outcome='duplicate').inc()
+        logger.info('%s duplicates %s; skipped', doc['doc_id'], canonical['doc_id'])
+        return True
+
+    @contextmanager
+    def _lease_heartbeat(self, doc_id: str):
+        """Keep renewing this worker's lease on ``doc_id`` until the block exits."""
+        if not hasattr(self.uploads, 'renew_upload_lease'):
+            yield
+            return
+        stop = threading.Event()
+
+        def renew():
+            while not stop.wait(self.lease_seconds / 3):
+                try:
+                    if not self.uploads.renew_upload_lease(doc_id, self.worker_id, self.lease_seconds):
+                        logger.warning('lease on %s was lost; another worker may re-claim it', doc_id)
+                        return
+                except Exception:
+                    logger.exception('failed to renew the lease on %s', doc_id)
+
+        heartbeat = threading.Thread(target=renew, name=f'lease-{doc_id}', daemon=True)
+        heartbeat.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            heartbeat.join()
+
+    def process_document(self, doc: dict) -> bool:
+        with self._lease_heartbeat(doc['doc_id']):
+            return self._process_document(doc)
+
+    def _process_document(self, doc: dict) -> bool:
+        doc_id = doc['doc_id']
+        logger.info('processing %s', doc_id)
+        try:
+            if self._skip_duplicate(doc):
+                return True
+            with ExitStack() as spool:
+                with ingest_stage('s3_download'):
+                    pdf_path = spool.enter_context(self.s3.spool_object(doc_id))
+                # extraction is lazy and interleaved with chunking; time the two apart
+                pages = TimedIterator(iter_pdf_pages(pdf_path, executor=self.pdf_executor))
+                start = time.perf_counter()
+                chunks = list(self.split_pages(pages))
+                INGEST_STAGE_SECONDS.labels(stage='pdf_extract').observe(pages.seconds)
+                INGEST_STAGE_SECONDS.labels(stage='chunking').observe(time.perf_counter() - start - pages.seconds)
+            if not chunks:
+                raise RuntimeError('no extractable text found in PDF')
+            chunk_texts = [chunk_text for chunk_text, _ in chunks]
+            chunk_hashes = [text_hash(chunk_text) for chunk_text in chunk_texts]
+            # pin the model for this document when the embeddings follow the index (IndexEmbeddings)
+            embeddings = self.embeddings.current() if hasattr(self.embeddings, 'current') else self.embeddings
+
+            incremental = self.index_mode == 'incremental'
+            indexed = {}
+            if incremental:
+                with ingest_stage('fetch_hashes'):
+                    indexed = self.vector_store.fetch_chunk_states(doc_id)
+            # chunks are matched by content, so only new text is embedded and written;
+            # chunks that merely moved only get their chunk_index updated
+            chunk_ids, changed = assign_chunk_ids(doc_id, chunk_hashes, indexed)
+            moved = {
+                chunk_id: idx for idx, chunk_id in enumerate(chunk_ids)
+                if chunk_id in indexed and indexed[chunk_id].get('chunk_index') != idx
+            }
+            current_ids = set(chunk_ids)
+            stale_ids = [chunk_id for chunk_id in indexed if chunk_id not in current_ids]
+
+            vectors = {idx: chunks[idx][1] for idx in changed if chunks[idx][1] is not None}
+            to_embed = [idx for idx in changed if idx not in vectors]
+            cache_hits, cache_misses = 0, 0
+            if to_embed:
+                with ingest_stage('embedding'):
+                    embedded, cache_hits, cache_misses = embed_with_cache(
+                        embeddings, [chunk_texts[idx] for idx in to_embed], self.embedding_cache
                     )
-                self.vector_store.delete_chunks_for_doc(doc_id)
-                self.vector_store.upsert_chunks(records)
-                db_utils.mark_upload_processed(
+                if len(embedded) != len(to_embed):
+                    raise RuntimeError('embedding count does not match chunk count')
+                vectors.update(zip(to_embed, embedded))
+            logger.info('embedded %s: %s cache hit(s), %s miss(es)', doc_id, cache_hits, cache_misses)
+            chunk_records: List[dict] = [
+                {
+                    'id': chunk_ids[idx],
+                    'doc_id': doc_id,
+                    'file_name': doc['file_name'],
+                    's3_url': doc['s3_url'],
+                    'chunk_index': idx,
+                    'text': chunk_texts[idx],
+                    'content_hash': chunk_hashes[idx],
+                    'uploader_id': doc.get('uploader_id'),
+                    'uploader_name': doc.get('uploader_name'),
+                }
+                for idx in range(len(chunk_texts))
+            ]
+            records = [{**chunk_records[idx], 'embedding': vectors[idx]} for idx in changed]
+            if incremental:
+                # write before deleting so the document stays searchable throughout
+                if records:
+                    with ingest_stage('upsert'):
+                        raise_for_index_errors(self.vector_store.upsert_chunks(records), 'index')
+                if moved:
+                    with ingest_stage('reorder'):
+                        raise_for_index_errors(self.vector_store.update_chunk_positions(doc_id, moved), 'update')
+                if stale_ids:
+                    with ingest_stage('delete'):
+                        raise_for_index_errors(self.vector_store.delete_chunk_ids(stale_ids), 'delete')
+            else:
+                with ingest_stage('delete'):
+                    self.vector_store.delete_chunks_for_doc(doc_id)
+                with ingest_stage('upsert'):
+                    raise_for_index_errors(self.vector_store.upsert_chunks(records), 'index')
+            unchanged = len(chunk_texts) - len(records) - len(moved)
+            logger.info(
+                'indexed %s: %s written, %s moved, %s deleted, %s unchanged',
+                doc_id, len(records), len(moved), len(stale_ids), unchanged,
+            )
+            if self.migration is not None:
+                with ingest_stage('migration_dual_write'):
+                    self.migration.write_document(doc_id, chunk_records)
+            with ingest_stage('db_update'):
+                recorded = self.uploads.mark_upload_processed(
                     doc_id,
-                    chunk_count=len(records),
-                    embedding_model=self.embeddings.model_id,
-                    metadata_patch={'vector_index': self.vector_store.index_name},
+                    chunk_count=len(chunk_texts),
+                    embedding_model=embeddings.model_id,
+                    metadata_patch={
+                        'vector_index': self.vector_store.index_name,
+                        'chunking_mode': self.chunking_mode,
+                        'embedding_cache': {'hits': cache_hits, 'misses': cache_misses},
+                        'index_update': {
+                            'mode': self.index_mode,
+                            'written': len(records),
+                            'moved': len(moved),
+                            'deleted': len(stale_ids),
+                            'unchanged': unchanged,
+                        },
+                    },
+                    claimed_by=self.worker_id,
                 )
-                processed += 1
-            except Exception as exc:
-                logger.exception('failed to process %s', doc_id)
-                db_utils.mark_upload_failed(doc_id, str(exc))
-        return processed
+            if recorded is False:
+                # the chunks are written under content-hash ids, so the new owner's run converges on the same index
+                logger.warning('lease on %s expired before it finished; status left to the worker that re-claimed it', doc_id)
+            INGEST_DOCUMENTS.labels(outcome='processed' if recorded is not False else 'lease_lost').inc()
+            INGEST_CHUNKS.labels(action='written').inc(len(records))
+            INGEST_CHUNKS.labels(action='deleted').inc(len(stale_ids))
+            INGEST_CHUNKS.labels(action='moved').inc(len(moved))
+            INGEST_CHUNKS.labels(action='unchanged').inc(unchanged)
+            return True
+        except Exception as exc:
+            logger.exception('failed to process %s (attempt %s)', doc_id, doc.get('attempts'))
+            with ingest_stage('db_update'):
+                status = self.uploads.mark_upload_failed(doc_id, str(exc), claimed_by=self.worker_id)
+            if status == 'dead_letter':
+                logger.error('%s moved to the dead-letter queue', doc_id)
+            INGEST_DOCUMENTS.labels(outcome=status or 'lease_lost').inc()
+            return False
+
+    def process_pending(self, batch_size: int = 5, max_workers: int = 1) -> int:
+        """Claim up to ``batch_size`` pending uploads and process them; returns how many succeeded.
+
+        Rows are claimed atomically, so several workers (threads, processes or
+        nodes) can call this concurrently without embedding the same document
+        twice. With ``max_workers > 1`` the claimed documents are processed on a
+        thread pool; the work is dominated by S3, Bedrock and OpenSearch I/O.
+        """
+        return self.process_batch(batch_size, max_workers)[1]
+
+    def process_batch(self, batch_size: int = 5, max_workers: int = 1) -> tuple[int, int]:
+        """Like ``process_pending`` but returns ``(claimed, succeeded)``."""
+        docs = self.uploads.claim_unprocessed_uploads(
+            self.worker_id, limit=batch_size, claim_timeout_seconds=self.lease_seconds
+        )
+        if not docs:
+            logger.info('no pending documents to process')
+            return 0, 0
+        if max_workers <= 1 or len(docs) == 1:
+            return len(docs), sum(1 for doc in docs if self.process_document(doc))
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(docs)), thread_name_prefix='rag-worker') as pool:
+            return len(docs), sum(1 for ok in pool.map(self.process_document, docs) if ok)
+
+    def run_forever(
+        self,
+        batch_size: int = 5,
+        max_workers: int = 1,
+        poll_interval: float = 10.0,
+        stop_event: threading.Event | None = None,
+        upload_events=None,
+    ):
+        """Keep claiming and processing batches until ``stop_event`` is set.
+
+        A full batch, whether or not its documents succeeded, is followed
+        immediately by another claim; the worker only sleeps for
+        ``poll_interval`` seconds once the queue is drained. With
+        ``upload_events`` (``AWS_utils.upload_events.PostgresUploadListener`` or
+        ``LocalUploadQueue``) a new upload ends the sleep at once, and
+        ``poll_interval`` becomes the period of the fallback sweep that picks
+        up retries and uploads whose notification was missed.
+        """
+        stop_event = stop_event or threading.Event()
+        logger.info('worker %s started (batch_size=%s, max_workers=%s)', self.worker_id, batch_size, max_workers)
+        while not stop_event.is_set():
+            try:
+                # failed documents count too: a full claim means a backlog may be waiting
+                claimed, _ = self.process_batch(batch_size=batch_size, max_workers=max_workers)
+            except Exception:
+                logger.exception('worker %s failed to claim pending documents', self.worker_id)
+                claimed = 0
+            if claimed < batch_size:
+                self._idle(poll_interval, stop_event, upload_events)
+        if upload_events is not None:
+            upload_events.close()
+        logger.info('worker %s stopped', self.worker_id)
+
+    @staticmethod
+    def _idle(poll_interval: float, stop_event: threading.Event, upload_events):
+        if upload_events is None:
+            stop_event.wait(poll_interval)
+            return
+        deadline = time.monotonic() + poll_interval
+        # wait in short slices so a stop request is honoured promptly
+        while not stop_event.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            doc_ids = upload_events.wait(min(remaining, 1.0))
+            if doc_ids:
+                logger.debug('woken by upload(s) %s', ', '.join(doc_ids))
+                return
@@ -1,4 +1,8 @@
 import io
+from collections import deque
+from concurrent.futures import Executor
+from typing import Iterator
+
 from pypdf import PdfReader
 
 
@@ -10,3 +14,41 @@ def extract_pdf_text(pdf_bytes: bytes) -> str:
         if text:
             pages.append(text)
     return '\n'.join(pages)
+
+
+def count_pdf_pages(path: str) -> int:
+    return len(PdfReader(path).pages)
+
+
+def extract_page_range(path: str, start: int, stop: int) -> list[str]:
+    # module-level so it can be pickled into a process pool
+    reader = PdfReader(path)
+    return [reader.pages[idx].extract_text() or '' for idx in range(start, stop)]
+
+
+def iter_pdf_pages(path: str, executor: Executor | None = None, pages_per_task: int = 8, max_pending: int = 8) -> Iterator[str]:
+    """Yield the text of each page of the PDF at ``path`` in page order.
+
+    With an ``executor`` (normally a process pool) page ranges are parsed in
+    parallel. At most ``max_pending`` ranges are in flight, so memory stays
+    bounded and callers can start consuming early pages while later ones are
+    still being parsed.
+    """
+    total = count_pdf_pages(path)
+    ranges = [(start, min(start + pages_per_task, total)) for start in range(0, total, pages_per_task)]
+    if executor is None:
+        for start, stop in ranges:
+            yield from extract_page_range(path, start, stop)
+        return
+    pending = deque()
+    remaining = iter(ranges)
+    for start, stop in remaining:
+        pending.append(executor.submit(extract_page_range, path, start, stop))
+        if len(pending) >= max_pending:
+            break
+    while pending:
+        pages = pending.popleft().result()
+        next_range = next(remaining, None)
+        if next_range is not None:
+            pending.append(executor.submit(extract_page_range, path, *next_range))
+        yield from pages
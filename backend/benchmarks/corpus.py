@@ -0,0 +1,86 @@
+"""Synthetic PDF corpus for the offline benchmarks.
+
+Documents are built from a fixed, seeded vocabulary so that runs are
+reproducible. Each page is a real single-font PDF page readable by
+``pypdf``; sentences are kept so they can be reused as benchmark queries.
+"""
+import random
+
+
+def _escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def make_pdf(pages: list[str], line_chars: int = 90) -> bytes:
+    """Return a minimal PDF with one text page per entry of ``pages``."""
+    objects = [b'<< /Type /Catalog /Pages 2 0 R >>']
+    kids = ' '.join(f'{4 + 2 * idx} 0 R' for idx in range(len(pages)))
+    objects.append(f'<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>'.encode())
+    objects.append(b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>')
+    for idx, text in enumerate(pages):
+        lines, current = [], ''
+        for word in text.split():
+            if current and len(current) + len(word) + 1 > line_chars:
+                lines.append(current)
+                current = word
+            else:
+                current = f'{current} {word}' if current else word
+        if current:
+            lines.append(current)
+        content = 'BT /F1 9 Tf 11 TL 40 760 Td ' + ' '.join(f'({_escape(line)}) Tj T*' for line in lines) + ' ET'
+        stream = content.encode('latin-1', 'replace')
+        objects.append(
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+            f'/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * idx} 0 R >>'.encode()
+        )
+        objects.append(b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream')
+
+    out = b'%PDF-1.4\n'
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f'{number} 0 obj\n'.encode() + body + b'\nendobj\n'
+    xref = len(out)
+    out += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode()
+    for offset in offsets:
+        out += f'{offset:010d} 00000 n \n'.encode()
+    out += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode()
+    return out
+
+
+class CorpusGenerator:
+    """Seeded generator of topical documents made of pseudo-English sentences."""
+
+    def __init__(self, seed: int = 0, vocabulary_size: int = 5000, topics: int = 50):
+        self._random = random.Random(seed)
+        syllables = ['ka', 'lo', 'mi', 'ne', 'ra', 'tu', 'vo', 'si', 'de', 'pa', 'gri', 'sol', 'ven', 'tor']
+        words = set()
+        while len(words) < vocabulary_size:
+            words.add(''.join(self._random.choice(syllables) for _ in range(self._random.randint(2, 4))))
+        self.vocabulary = sorted(words)
+        # each topic favours its own slice of the vocabulary so documents differ in content
+        self.topics = [self._random.sample(self.vocabulary, 200) for _ in range(topics)]
+
+    def sentence(self, topic: list[str]) -> str:
+        length = self._random.randint(8, 20)
+        words = [
+            self._random.choice(topic) if self._random.random() < 0.6 else self._random.choice(self.vocabulary)
+            for _ in range(length)
+        ]
+        return ' '.join(words).capitalize() + '.'
+
+    def document(self, pages: int, words_per_page: int) -> list[list[str]]:
+        """Return the sentences of each page of one document."""
+        topic = self._random.choice(self.topics)
+        document = []
+        for _ in range(pages):
+            sentences, count = [], 0
+            while count < words_per_page:
+                sentence = self.sentence(topic)
+                sentences.append(sentence)
+                count += len(sentence.split())
+            document.append(sentences)
+        return document
+
+    def sample(self, items: list, count: int) -> list:
+        return self._random.sample(items, min(count, len(items)))
@@ -0,0 +1,283 @@
+"""Local stand-ins for the AWS-backed clients, used by the offline benchmarks.
+
+``FakeEmbeddings`` lives next to the real embedding executor in
+``RAG_pipeline/embedding_executor.py``; the vector store stand-in is
+``AWS_utils.local_vector_store.LocalVectorStore``.
+"""
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+
+class FakeChatModel:
+    """Deterministic chat model with configurable latency.
+
+    Each call waits ``latency_seconds`` (time to first token) and then
+    ``per_token_seconds`` for every one of the ``answer_tokens`` words of
+    the answer. Supports ``invoke``/``stream`` and their async variants.
+    """
+
+    def __init__(self, latency_seconds: float = 0.0, per_token_seconds: float = 0.0, answer_tokens: int = 40):
+        self.latency_seconds = latency_seconds
+        self.per_token_seconds = per_token_seconds
+        self.answer_tokens = answer_tokens
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def _words(self, messages) -> list[str]:
+        with self._lock:
+            self.calls += 1
+        return ['[1]'] + [f'word{i}' for i in range(self.answer_tokens - 1)]
+
+    def _usage(self, messages, words) -> dict:
+        input_tokens = sum(len(message.content) for message in messages) // 4
+        return {'input_tokens': input_tokens, 'output_tokens': len(words), 'total_tokens': input_tokens + len(words)}
+
+    def invoke(self, messages):
+        words = self._words(messages)
+        time.sleep(self.latency_seconds + self.per_token_seconds * len(words))
+        return AIMessage(content=' '.join(words), usage_metadata=self._usage(messages, words))
+
+    def stream(self, messages):
+        words = self._words(messages)
+        time.sleep(self.latency_seconds)
+        for idx, word in enumerate(words):
+            time.sleep(self.per_token_seconds)
+            yield AIMessageChunk(content=word if idx == 0 else f' {word}')
+
+    async def ainvoke(self, messages):
+        words = self._words(messages)
+        await asyncio.sleep(self.latency_seconds + self.per_token_seconds * len(words))
+        return AIMessage(content=' '.join(words), usage_metadata=self._usage(messages, words))
+
+    async def astream(self, messages):
+        words = self._words(messages)
+        await asyncio.sleep(self.latency_seconds)
+        for idx, word in enumerate(words):
+            await asyncio.sleep(self.per_token_seconds)
+            yield AIMessageChunk(content=word if idx == 0 else f' {word}')
+
+
+class LocalS3:
+    """Filesystem-backed replacement for ``S3Client``; object keys are file names under ``root``."""
+
+    def __init__(self, root: str, bucket: str = 'local'):
+        self.root = root
+        self.bucket = bucket
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, object_key: str) -> str:
+        return os.path.join(self.root, object_key)
+
+    def upload_fileobj(self, fileobj, object_key: str, ExtraArgs: dict | None = None):
+        with open(self._path(object_key), 'wb') as fh:
+            shutil.copyfileobj(fileobj, fh)
+
+    def put_bytes(self, object_key: str, data: bytes):
+        with open(self._path(object_key), 'wb') as fh:
+            fh.write(data)
+
+    def get_public_url(self, object_key: str) -> str:
+        return f'file://{os.path.abspath(self._path(object_key))}'
+
+    def get_object_bytes(self, object_key: str) -> bytes:
+        with open(self._path(object_key), 'rb') as fh:
+            return fh.read()
+
+    @contextmanager
+    def spool_object(self, object_key: str, spool_dir: str | None = None):
+        # the object already is a local file, so there is nothing to spool
+        path = self._path(object_key)
+        if not os.path.exists(path):
+            raise RuntimeError(f'object {object_key!r} not found')
+        yield path
+
+
+class SqliteUploads:
+    """SQLite stand-in for the ``uploads`` table functions of ``AWS_utils.db``.
+
+    Implements what ``RagPipeline`` calls (``claim_unprocessed_uploads``,
+    ``renew_upload_lease``, ``mark_upload_processed``, ``mark_upload_failed``,
+    ``find_upload_by_content_hash``, ``mark_upload_duplicate``) plus
+    ``insert_upload_record`` to seed it.
+    """
+
+    def __init__(self, path: str = ':memory:'):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS uploads (
+              doc_id TEXT PRIMARY KEY,
+              file_name TEXT,
+              s3_url TEXT,
+              uploader_id TEXT,
+              uploader_name TEXT,
+              status TEXT NOT NULL DEFAULT 'queued',
+              attempts INTEGER NOT NULL DEFAULT 0,
+              next_attempt_at REAL NOT NULL,
+              claimed_by TEXT,
+              last_error TEXT,
+              chunk_count INTEGER,
+              embedding_model TEXT,
+              metadata TEXT NOT NULL DEFAULT '{}',
+              notes TEXT,
+              content_hash TEXT,
+              uploaded_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def insert_upload_record(
+        self,
+        doc_id,
+        file_name,
+        s3_url,
+        uploader_id=None,
+        uploader_name=None,
+        metadata=None,
+        status='queued',
+        content_hash=None,
+        **_,
+    ):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO uploads (doc_id, file_name, s3_url, uploader_id, uploader_name, metadata, status, content_hash, uploaded_at, next_attempt_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (
+                    doc_id, file_name, s3_url, uploader_id, uploader_name, json.dumps(metadata or {}), status, content_hash,
+                    now, now,
+                ),
+            )
+            self._conn.commit()
+        return {'id': doc_id}
+
+    def claim_unprocessed_uploads(self, worker_id: str, limit: int = 10, claim_timeout_seconds: int = 900, max_attempts: int = 5):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE uploads SET status = 'dead_letter' "
+                "WHERE status = 'processing' AND next_attempt_at <= ? AND attempts >= ?",
+                (now, max_attempts),
+            )
+            rows = self._conn.execute(
+                """
+                SELECT doc_id, file_name, s3_url, uploader_id, uploader_name, content_hash, attempts + 1
+                FROM uploads WHERE status IN ('queued', 'failed', 'processing') AND next_attempt_at <= ?
+                ORDER BY next_attempt_at LIMIT ?
+                """,
+                (now, limit),
+            ).fetchall()
+            self._conn.executemany(
+                "UPDATE uploads SET status = 'processing', attempts = ?, claimed_by = ?, next_attempt_at = ? WHERE doc_id = ?",
+                [(row[6], worker_id, now + claim_timeout_seconds, row[0]) for row in rows],
+            )
+            self._conn.commit()
+        keys = ('doc_id', 'file_name', 's3_url', 'uploader_id', 'uploader_name', 'content_hash', 'attempts')
+        return [{'id': row[0], **dict(zip(keys, row))} for row in rows]
+
+    def renew_upload_lease(self, doc_id: str, worker_id: str, lease_seconds: int = 900) -> bool:
+        with self._lock:
+            renewed = self._conn.execute(
+                "UPDATE uploads SET next_attempt_at = ? WHERE doc_id = ? AND status = 'processing' AND claimed_by = ?",
+                (time.time() + lease_seconds, doc_id, worker_id),
+            ).rowcount
+            self._conn.commit()
+        return bool(renewed)
+
+    def _holds_lease(self, doc_id: str, claimed_by: str | None) -> bool:
+        if claimed_by is None:
+            return True
+        row = self._conn.execute('SELECT status, claimed_by FROM uploads WHERE doc_id = ?', (doc_id,)).fetchone()
+        return row == ('processing', claimed_by)
+
+    def mark_upload_processed(
+        self,
+        doc_id: str,
+        chunk_count: int,
+        embedding_model: str,
+        metadata_patch: dict | None = None,
+        claimed_by: str | None = None,
+    ) -> bool:
+        with self._lock:
+            if not self._holds_lease(doc_id, claimed_by):
+                return False
+            (metadata,) = self._conn.execute('SELECT metadata FROM uploads WHERE doc_id = ?', (doc_id,)).fetchone()
+            merged = {**json.loads(metadata), **(metadata_patch or {})}
+            self._conn.execute(
+                "UPDATE uploads SET status = 'embedded', chunk_count = ?, embedding_model = ?, metadata = ?, "
+                "claimed_by = NULL, last_error = NULL WHERE doc_id = ?",
+                (chunk_count, embedding_model, json.dumps(merged), doc_id),
+            )
+            self._conn.commit()
+        return True
+
+    def mark_upload_failed(
+        self,
+        doc_id: str,
+        notes: str,
+        max_attempts: int = 5,
+        claimed_by: str | None = None,
+        retry_base_seconds: float = 30.0,
+    ) -> str | None:
+        with self._lock:
+            if not self._holds_lease(doc_id, claimed_by):
+                return None
+            (attempts, next_attempt_at) = self._conn.execute(
+                'SELECT attempts, next_attempt_at FROM uploads WHERE doc_id = ?', (doc_id,)
+            ).fetchone()
+            status = 'dead_letter' if attempts >= max_attempts else 'failed'
+            if status == 'failed':
+                next_attempt_at = time.time() + retry_base_seconds * 2 ** max(attempts - 1, 0)
+            self._conn.execute(
+                'UPDATE uploads SET status = ?, next_attempt_at = ?, claimed_by = NULL, last_error = ?, notes = ? '
+                'WHERE doc_id = ?',
+                (status, next_attempt_at, notes, notes, doc_id),
+            )
+            self._conn.commit()
+        return status
+
+    def find_upload_by_content_hash(self, content_hash: str, exclude_doc_id: str | None = None, embedded_only: bool = False):
+        statuses = ('embedded',) if embedded_only else ('embedded', 'queued', 'processing')
+        with self._lock:
+            row = self._conn.execute(
+                f"""
+                SELECT doc_id, file_name, s3_url, status, chunk_count, embedding_model
+                FROM uploads
+                WHERE content_hash = ? AND doc_id != ? AND status IN ({','.join('?' for _ in statuses)})
+                ORDER BY status = 'embedded' DESC, uploaded_at
+                LIMIT 1
+                """,
+                (content_hash, exclude_doc_id or '', *statuses),
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('doc_id', 'file_name', 's3_url', 'status', 'chunk_count', 'embedding_model'), row))
+
+    def mark_upload_duplicate(self, doc_id: str, duplicate_of: str):
+        with self._lock:
+            (metadata,) = self._conn.execute('SELECT metadata FROM uploads WHERE doc_id = ?', (doc_id,)).fetchone()
+            merged = {**json.loads(metadata), 'duplicate_of': duplicate_of}
+            self._conn.execute(
+                "UPDATE uploads SET status = 'duplicate', metadata = ? WHERE doc_id = ?",
+                (json.dumps(merged), doc_id),
+            )
+            self._conn.commit()
+
+    def status_counts(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._conn.execute('SELECT status, COUNT(*) FROM uploads GROUP BY status').fetchall())
+
+    def total_chunks(self) -> int:
+        with self._lock:
+            (total,) = self._conn.execute("SELECT COALESCE(SUM(chunk_count), 0) FROM uploads WHERE status = 'embedded'").fetchone()
+        return total
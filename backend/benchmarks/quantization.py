@@ -0,0 +1,128 @@
+"""Offline benchmark for quantized vector storage with full-precision rescoring.
+
+Reports vector memory per mode and recall@k against exact float32 search,
+both for the raw quantized ranking and after rescoring an oversampled
+candidate set. Run from ``backend/``::
+
+    python -m benchmarks.quantization --vectors corpus.npy --queries queries.npy
+
+Without ``--vectors`` a random corpus of unit-length vectors is generated,
+like the normalized embeddings the index stores. ``--scale`` defaults to
+the int8 range a new index records: ``OPENSEARCH_QUANTIZATION_SCALE`` when
+set, otherwise the unit-vector estimate for the dimension. The scale used,
+the share of values it clips and the scale derived from the corpus itself
+(``int8_scale``, a value to set before creating the index) are printed with
+the results.
+"""
+import argparse
+import os
+
+import numpy as np
+
+from AWS_utils.quantization import QUANTIZATION_MODES, bytes_per_vector, int8_scale, quantize, unit_vector_int8_scale
+
+
+def _l2(queries: np.ndarray, corpus: np.ndarray) -> np.ndarray:
+    return (
+        np.einsum('ij,ij->i', queries, queries)[:, None]
+        - 2.0 * queries @ corpus.T
+        + np.einsum('ij,ij->i', corpus, corpus)[None, :]
+    )
+
+
+def _hamming(queries: np.ndarray, corpus: np.ndarray, block: int = 8) -> np.ndarray:
+    corpus_bits = corpus.view(np.uint8)
+    out = np.empty((queries.shape[0], corpus.shape[0]), dtype=np.int32)
+    for start in range(0, queries.shape[0], block):
+        xor = np.bitwise_xor(queries[start:start + block].view(np.uint8)[:, None, :], corpus_bits[None, :, :])
+        out[start:start + block] = np.unpackbits(xor, axis=-1).sum(axis=-1)
+    return out
+
+
+def _top(distances: np.ndarray, k: int) -> np.ndarray:
+    part = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    order = np.argsort(np.take_along_axis(distances, part, axis=1), axis=1)
+    return np.take_along_axis(part, order, axis=1)
+
+
+def _recall(found: np.ndarray, truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    return float(np.mean([len(set(f[:k]) & set(t)) / k for f, t in zip(found, truth)]))
+
+
+def run(corpus: np.ndarray, queries: np.ndarray, k: int, oversample: float, scale: float) -> list[dict]:
+    exact = _top(_l2(queries, corpus), k)
+    candidates = min(corpus.shape[0], int(np.ceil(k * oversample)))
+    rows = []
+    for mode in QUANTIZATION_MODES:
+        stored = quantize(corpus, mode, scale)
+        query_codes = quantize(queries, mode, scale)
+        if mode == 'binary':
+            distances = _hamming(query_codes, stored)
+        else:
+            distances = _l2(query_codes.astype(np.float32), stored.astype(np.float32))
+        raw = _top(distances, k)
+        shortlist = _top(distances, candidates)
+        rescored = np.empty_like(raw)
+        for qi, rows_idx in enumerate(shortlist):
+            exact_dist = ((corpus[rows_idx] - queries[qi]) ** 2).sum(axis=1)
+            rescored[qi] = rows_idx[np.argsort(exact_dist)[:k]]
+        per_vector = bytes_per_vector(corpus.shape[1], mode)
+        rows.append({
+            'mode': mode,
+            'bytes_per_vector': per_vector,
+            'index_mb': per_vector * corpus.shape[0] / 2**20,
+            'memory_saved': 1.0 - per_vector / bytes_per_vector(corpus.shape[1], 'none'),
+            'recall_raw': _recall(raw, exact),
+            'recall_rescored': _recall(rescored, exact),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--vectors', help='.npy corpus matrix (n x d)')
+    parser.add_argument('--queries', help='.npy query matrix; defaults to perturbed corpus rows')
+    parser.add_argument('--count', type=int, default=20000, help='generated corpus size')
+    parser.add_argument('--dimension', type=int, default=1536, help='generated vector dimension')
+    parser.add_argument('--num-queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--oversample', type=float, default=3.0)
+    parser.add_argument(
+        '--scale',
+        type=float,
+        default=None,
+        help='int8 clipping range; defaults to the scale the vector store records for a new index',
+    )
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.vectors:
+        corpus = np.load(args.vectors).astype(np.float32)
+    else:
+        corpus = rng.normal(size=(args.count, args.dimension)).astype(np.float32)
+        corpus /= np.linalg.norm(corpus, axis=1, keepdims=True)
+    if args.queries:
+        queries = np.load(args.queries).astype(np.float32)
+    else:
+        picks = rng.choice(corpus.shape[0], size=min(args.num_queries, corpus.shape[0]), replace=False)
+        queries = corpus[picks] + rng.normal(scale=0.1 * corpus.std(), size=(len(picks), corpus.shape[1])).astype(np.float32)
+    configured = os.environ.get('OPENSEARCH_QUANTIZATION_SCALE')
+    scale = args.scale or (float(configured) if configured else unit_vector_int8_scale(corpus.shape[1]))
+    clipped = float(np.mean(np.abs(corpus) > scale))
+
+    print(f'corpus={corpus.shape[0]}x{corpus.shape[1]} queries={len(queries)} k={args.k} oversample={args.oversample}')
+    print(
+        f'int8 scale={scale:.4g} ({clipped:.2%} of values clipped; '
+        f'derived from this corpus: OPENSEARCH_QUANTIZATION_SCALE={int8_scale(corpus):.4g})'
+    )
+    print(f"{'mode':<8}{'bytes/vec':>10}{'index MB':>10}{'saved':>8}{'recall':>9}{'rescored':>10}")
+    for row in run(corpus, queries, args.k, args.oversample, scale):
+        print(
+            f"{row['mode']:<8}{row['bytes_per_vector']:>10}{row['index_mb']:>10.1f}"
+            f"{row['memory_saved']:>8.0%}{row['recall_raw']:>9.3f}{row['recall_rescored']:>10.3f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+"""Offline benchmark for ingestion throughput and chat query latency.
+
+Runs the real ``RagPipeline`` and chat blueprint against local stand-ins:
+a synthetic PDF corpus in a filesystem "bucket", a SQLite uploads table,
+``LocalVectorStore`` and deterministic fake embedding / chat models with
+configurable latency. For each corpus size it reports documents and chunks
+per second, p50/p95/p99 latency of ``POST /api/chat/search`` and peak RSS.
+Run from ``backend/``::
+
+    python -m benchmarks.rag --sizes 10 100 500 --json results.json
+    python -m benchmarks.rag --sizes 100 --baseline results.json
+
+With ``--baseline`` the run exits non-zero when throughput drops or p95
+latency grows by more than ``--tolerance`` compared with the stored run.
+"""
+import argparse
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the pipeline modules import their siblings flat and the API modules via ``backend.``
+for _path in (os.path.join(BACKEND_DIR, 'RAG_pipeline'), os.path.dirname(BACKEND_DIR)):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+from flask import Flask  # noqa: E402
+
+from AWS_utils.local_vector_store import LocalVectorStore  # noqa: E402
+from backend.API_handler.chat import create_chat_blueprint  # noqa: E402
+from benchmarks.corpus import CorpusGenerator, make_pdf  # noqa: E402
+from benchmarks.fakes import FakeChatModel, LocalS3, SqliteUploads  # noqa: E402
+from chucker import build_splitter  # noqa: E402
+from embedding_executor import BatchedEmbeddings, FakeEmbeddings  # noqa: E402
+from pipeline import RagPipeline  # noqa: E402
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux (bytes on macOS); children covers the PDF workers
+    scale = 1 if sys.platform == 'darwin' else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return (own + children) * scale / 2**20
+
+
+def seed_corpus(root: str, uploads: SqliteUploads, generator: CorpusGenerator, size: int, args) -> tuple[LocalS3, list[str]]:
+    """Write ``size`` PDFs into a local bucket, register them as uploads and return sample sentences."""
+    s3 = LocalS3(os.path.join(root, 'bucket'))
+    sentences = []
+    for idx in range(size):
+        doc_id = f'bench-{idx:06d}'
+        document = generator.document(args.pages, args.words_per_page)
+        s3.put_bytes(doc_id, make_pdf([' '.join(page) for page in document]))
+        uploads.insert_upload_record(doc_id, f'{doc_id}.pdf', s3.get_public_url(doc_id), uploader_id='bench')
+        sentences.extend(generator.sample([s for page in document for s in page], 2))
+    return s3, sentences
+
+
+def run_ingestion(pipeline: RagPipeline, uploads: SqliteUploads, args) -> dict:
+    start = time.perf_counter()
+    while pipeline.process_batch(batch_size=args.batch_size, max_workers=args.max_workers)[0]:
+        pass
+    elapsed = time.perf_counter() - start
+    counts = uploads.status_counts()
+    docs = counts.get('embedded', 0)
+    chunks = uploads.total_chunks()
+    return {
+        'ingest_seconds': elapsed,
+        'docs_per_second': docs / elapsed if elapsed else 0.0,
+        'chunks_per_second': chunks / elapsed if elapsed else 0.0,
+        'documents': docs,
+        'chunks': chunks,
+        'failed': counts.get('failed', 0),
+    }
+
+
+def run_queries(client, queries: list[str], args) -> dict:
+    def one(query: str) -> float:
+        start = time.perf_counter()
+        resp = client.post('/api/chat/search', json={'query': query, 'top_k': args.top_k})
+        if resp.status_code != 200:
+            raise RuntimeError(f'query failed with {resp.status_code}: {resp.get_json()}')
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.query_concurrency) as pool:
+        latencies = np.asarray(list(pool.map(one, queries))) * 1000.0
+    elapsed = time.perf_counter() - start
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {'queries': len(queries), 'qps': len(queries) / elapsed, 'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99}
+
+
+def run_size(size: int, generator: CorpusGenerator, args) -> dict:
+    with tempfile.TemporaryDirectory(prefix='rag-bench-') as root:
+        uploads = SqliteUploads(os.path.join(root, 'uploads.sqlite'))
+        s3, sentences = seed_corpus(root, uploads, generator, size, args)
+        embeddings = BatchedEmbeddings(
+            FakeEmbeddings(
+                dimension=args.dimension,
+                latency_seconds=args.embed_latency,
+                per_text_seconds=args.embed_per_text,
+            ),
+            batch_size=args.embed_batch_size,
+            max_concurrency=args.embed_concurrency,
+        )
+        vector_store = LocalVectorStore(os.path.join(root, 'vectors'), 'bench', dimension=args.dimension)
+        pipeline = RagPipeline(
+            s3,
+            build_splitter(args.chunking_mode, embeddings),
+            embeddings,
+            vector_store,
+            worker_id='bench',
+            pdf_workers=args.pdf_workers,
+            uploads=uploads,
+        )
+        try:
+            row = {'size': size, **run_ingestion(pipeline, uploads, args)}
+        finally:
+            if pipeline.pdf_executor is not None:
+                pipeline.pdf_executor.shutdown()
+
+        app = Flask(__name__)
+        llm = FakeChatModel(latency_seconds=args.llm_latency, per_token_seconds=args.llm_per_token)
+        app.register_blueprint(create_chat_blueprint(embeddings, vector_store, llm), url_prefix='/api')
+        queries = [sentences[idx % len(sentences)] for idx in range(args.queries)]
+        row.update(run_queries(app.test_client(), queries, args))
+        row['peak_rss_mb'] = peak_rss_mb()
+        return row
+
+
+def compare(rows: list[dict], baseline: list[dict], tolerance: float) -> list[str]:
+    previous = {row['size']: row for row in baseline}
+    regressions = []
+    for row in rows:
+        old = previous.get(row['size'])
+        if old is None:
+            continue
+        for key in ('docs_per_second', 'chunks_per_second', 'qps'):
+            if row[key] < old[key] * (1.0 - tolerance):
+                regressions.append(f"size {row['size']}: {key} {row[key]:.2f} < baseline {old[key]:.2f}")
+        for key in ('p95_ms', 'p99_ms'):
+            if row[key] > old[key] * (1.0 + tolerance):
+                regressions.append(f"size {row['size']}: {key} {row[key]:.1f} > baseline {old[key]:.1f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 50, 200], help='corpus sizes in documents')
+    parser.add_argument('--pages', type=int, default=5, help='pages per document')
+    parser.add_argument('--words-per-page', type=int, default=400)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunking-mode', default='tokens', help='semantic, sentence_reuse or tokens')
+    parser.add_argument('--dimension', type=int, default=1536)
+    parser.add_argument('--embed-latency', type=float, default=0.02, help='seconds per embedding request')
+    parser.add_argument('--embed-per-text', type=float, default=0.001, help='extra seconds per embedded text')
+    parser.add_argument('--embed-batch-size', type=int, default=16)
+    parser.add_argument('--embed-concurrency', type=int, default=4)
+    parser.add_argument('--pdf-workers', type=int, default=0)
+    parser.add_argument('--batch-size', type=int, default=10, help='documents claimed per batch')
+    parser.add_argument('--max-workers', type=int, default=4, help='documents processed concurrently')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--query-concurrency', type=int, default=8)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--llm-latency', type=float, default=0.05, help='seconds to first token')
+    parser.add_argument('--llm-per-token', type=float, default=0.0)
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--baseline', help='results file of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative regression')
+    args = parser.parse_args()
+    # per-document pipeline logging would dominate the output
+    logging.getLogger().setLevel(logging.WARNING)
+
+    generator = CorpusGenerator(seed=args.seed)
+    print(f"{'docs':>6}{'chunks':>8}{'docs/s':>9}{'chunks/s':>10}{'qps':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'RSS MB':>9}")
+    rows = []
+    for size in sorted(args.sizes):
+        row = run_size(size, generator, args)
+        rows.append(row)
+        print(
+            f"{row['documents']:>6}{row['chunks']:>8}{row['docs_per_second']:>9.2f}{row['chunks_per_second']:>10.1f}"
+            f"{row['qps']:>8.1f}{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}{row['peak_rss_mb']:>9.0f}"
+        )
+        if row['failed']:
+            print(f"  {row['failed']} document(s) failed to ingest", file=sys.stderr)
+
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump(rows, fh, indent=2)
+    if args.baseline:
+        with open(args.baseline) as fh:
+            regressions = compare(rows, json.load(fh), args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
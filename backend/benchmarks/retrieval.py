@@ -0,0 +1,309 @@
+"""Offline retrieval evaluation and HNSW parameter sweep.
+
+Chunks and embeds a corpus once per chunking mode, then answers the
+questions of a golden set with exact brute-force search and with each
+approximate configuration of the sweep. For every configuration it reports
+recall@k and MRR against the golden set, recall@k against the exact
+neighbours, and per-query latency. Run from ``backend/``::
+
+    python -m benchmarks.retrieval --pdf-dir pdfs/ --golden golden.jsonl \\
+        --chunking-modes tokens semantic --space-types l2 cosinesimil \\
+        --engine hnswlib --m 8 16 32 --ef-search 16 64 256 \\
+        --recall-target 0.9 --target-k 5 --json sweep.json
+
+The golden set is JSON lines of ``{"question": ..., "doc_ids": [...]}``,
+optionally with ``"chunk_ids"`` when relevance is labelled per chunk (chunk
+ids are positional, so only for the chunking mode they were labelled with).
+Without ``--pdf-dir`` a synthetic corpus is generated and each question is
+a sentence taken from its relevant document. The embedding model is chosen
+as for the pipeline (``EMBEDDING_BACKEND``, ``BEDROCK_EMBEDDING_MODEL_ID``);
+golden-set scores are only meaningful with a real model.
+
+``--engine hnswlib`` needs the optional ``hnswlib`` package.
+``--engine opensearch`` builds one throwaway index per ``m`` /
+``ef_construction`` pair on ``OPENSEARCH_HOST`` and varies ``ef_search`` per
+query.
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+import uuid
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if os.path.join(BACKEND_DIR, 'RAG_pipeline') not in sys.path:
+    sys.path.insert(0, os.path.join(BACKEND_DIR, 'RAG_pipeline'))
+
+from AWS_utils.opensearch import SPACE_TYPES, OpenSearchVectorStore, exact_scores  # noqa: E402
+from benchmarks.corpus import CorpusGenerator  # noqa: E402
+from chucker import build_embeddings, build_splitter  # noqa: E402
+from pipeline import RagPipeline, raise_for_index_errors  # noqa: E402
+from text_utils import iter_pdf_pages  # noqa: E402
+
+# hnswlib names the spaces differently; its orderings match the OpenSearch ones
+HNSWLIB_SPACES = {'l2': 'l2', 'cosinesimil': 'cosine', 'innerproduct': 'ip'}
+
+
+def load_golden(path: str) -> list[dict]:
+    with open(path) as fh:
+        golden = [json.loads(line) for line in fh if line.strip()]
+    for item in golden:
+        if not item.get('question') or not (item.get('doc_ids') or item.get('chunk_ids')):
+            raise ValueError(f'golden entry needs a question and doc_ids or chunk_ids: {item}')
+    return golden
+
+
+def load_pdf_corpus(pdf_dir: str) -> dict[str, list[str]]:
+    """Return ``{doc_id: page texts}``; the doc_id is the file name without ``.pdf``."""
+    corpus = {}
+    for name in sorted(os.listdir(pdf_dir)):
+        if name.lower().endswith('.pdf'):
+            corpus[name[:-4]] = list(iter_pdf_pages(os.path.join(pdf_dir, name)))
+    if not corpus:
+        raise ValueError(f'no PDF files in {pdf_dir}')
+    return corpus
+
+
+def synthetic_corpus(docs: int, questions: int, seed: int) -> tuple[dict[str, list[str]], list[dict]]:
+    generator = CorpusGenerator(seed=seed)
+    corpus, sentences = {}, []
+    for idx in range(docs):
+        doc_id = f'eval-{idx:05d}'
+        document = generator.document(pages=3, words_per_page=300)
+        corpus[doc_id] = [' '.join(page) for page in document]
+        sentences.extend((doc_id, sentence) for page in document for sentence in page)
+    golden = [{'question': sentence, 'doc_ids': [doc_id]} for doc_id, sentence in generator.sample(sentences, questions)]
+    return corpus, golden
+
+
+def chunk_corpus(corpus: dict[str, list[str]], mode: str, embeddings) -> tuple[list[dict], np.ndarray]:
+    """Chunk and embed ``corpus`` the way the ingestion pipeline would in ``mode``."""
+    pipeline = RagPipeline(None, build_splitter(mode, embeddings), embeddings, None, worker_id='eval')
+    chunks, vectors, missing = [], [], []
+    for doc_id, pages in corpus.items():
+        for idx, (text, vector) in enumerate(pipeline.split_pages(pages)):
+            chunks.append({'id': f'{doc_id}::chunk-{idx}', 'doc_id': doc_id, 'chunk_index': idx, 'text': text})
+            vectors.append(vector)
+            if vector is None:
+                missing.append(len(vectors) - 1)
+    for position, vector in zip(missing, embeddings.embed_documents([chunks[pos]['text'] for pos in missing])):
+        vectors[position] = vector
+    return chunks, np.asarray(vectors, dtype=np.float32)
+
+
+def _relevant_ranking(item: dict, chunk_ids: list[str], doc_of: dict[str, str]) -> tuple[list[str], set[str]]:
+    # chunk-labelled questions are judged per chunk, the others per distinct document
+    if item.get('chunk_ids'):
+        return chunk_ids, set(item['chunk_ids'])
+    seen, docs = set(), []
+    for chunk_id in chunk_ids:
+        doc_id = doc_of[chunk_id]
+        if doc_id not in seen:
+            seen.add(doc_id)
+            docs.append(doc_id)
+    return docs, set(item['doc_ids'])
+
+
+def score_rankings(golden, rankings, exact, doc_of, ks) -> dict:
+    """Return recall@k and MRR against the golden set plus recall@k against the exact neighbours."""
+    row = {}
+    reciprocal_ranks = []
+    per_k = {k: [] for k in ks}
+    for item, chunk_ids in zip(golden, rankings):
+        ranking, relevant = _relevant_ranking(item, chunk_ids, doc_of)
+        for k in ks:
+            per_k[k].append(len(relevant & set(ranking[:k])) / len(relevant))
+        first = next((rank for rank, key in enumerate(ranking, start=1) if key in relevant), None)
+        reciprocal_ranks.append(1.0 / first if first else 0.0)
+    for k in ks:
+        row[f'recall@{k}'] = float(np.mean(per_k[k]))
+        row[f'exact_recall@{k}'] = float(np.mean([len(set(found[:k]) & set(truth[:k])) / k for found, truth in zip(rankings, exact)]))
+    row['mrr'] = float(np.mean(reciprocal_ranks))
+    return row
+
+
+def _latency(latencies: list[float]) -> dict:
+    p50, p95 = np.percentile(np.asarray(latencies) * 1000.0, [50, 95])
+    return {'p50_ms': float(p50), 'p95_ms': float(p95)}
+
+
+def search_exact(vectors: np.ndarray, queries: np.ndarray, space_type: str, k: int):
+    rankings, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        scores = exact_scores(space_type, query, vectors)
+        top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+        rankings.append(top[np.argsort(-scores[top], kind='stable')].tolist())
+        latencies.append(time.perf_counter() - start)
+    return rankings, latencies
+
+
+def sweep_hnswlib(vectors, queries, space_type, k, args):
+    try:
+        import hnswlib
+    except ImportError as exc:
+        raise RuntimeError('--engine hnswlib requires the hnswlib package (pip install hnswlib)') from exc
+    for m, ef_construction in itertools.product(args.m, args.ef_construction):
+        index = hnswlib.Index(space=HNSWLIB_SPACES[space_type], dim=vectors.shape[1])
+        start = time.perf_counter()
+        index.init_index(max_elements=len(vectors), M=m, ef_construction=ef_construction, random_seed=args.seed)
+        index.add_items(vectors, np.arange(len(vectors)))
+        build_seconds = time.perf_counter() - start
+        for ef_search in args.ef_search:
+            index.set_ef(max(ef_search, k))
+            rankings, latencies = [], []
+            for query in queries:
+                start = time.perf_counter()
+                labels, _ = index.knn_query(query, k=min(k, len(vectors)), num_threads=1)
+                latencies.append(time.perf_counter() - start)
+                rankings.append(labels[0].tolist())
+            params = {'m': m, 'ef_construction': ef_construction, 'ef_search': ef_search, 'build_seconds': build_seconds}
+            yield params, rankings, latencies
+
+
+def sweep_opensearch(chunks, vectors, queries, space_type, k, args):
+    host = os.environ.get('OPENSEARCH_HOST')
+    if not host:
+        raise RuntimeError('--engine opensearch requires OPENSEARCH_HOST')
+    position = {chunk['id']: idx for idx, chunk in enumerate(chunks)}
+    for m, ef_construction in itertools.product(args.m, args.ef_construction):
+        store = OpenSearchVectorStore(
+            host,
+            f'{args.index_prefix}-{uuid.uuid4().hex[:8]}',
+            region=os.environ.get('AWS_REGION', 'us-east-1'),
+            service=os.environ.get('OPENSEARCH_SERVICE', 'aoss'),
+            dimension=vectors.shape[1],
+            space_type=space_type,
+            hnsw_m=m,
+            ef_construction=ef_construction,
+        )
+        try:
+            start = time.perf_counter()
+            with store.bulk_indexing():
+                raise_for_index_errors(
+                    store.upsert_chunks([{**chunk, 'embedding': vector.tolist()} for chunk, vector in zip(chunks, vectors)]),
+                    'index',
+                )
+            build_seconds = time.perf_counter() - start
+            # AOSS refreshes on its own schedule; elsewhere bulk_indexing refreshed on exit
+            if store.service == 'aoss':
+                time.sleep(args.aoss_refresh_seconds)
+            for ef_search in args.ef_search:
+                store.ef_search = ef_search
+                rankings, latencies = [], []
+                for query in queries:
+                    start = time.perf_counter()
+                    hits = store.knn_search(query.tolist(), top_k=k)
+                    latencies.append(time.perf_counter() - start)
+                    rankings.append([position[hit['id']] for hit in hits])
+                params = {'m': m, 'ef_construction': ef_construction, 'ef_search': ef_search, 'build_seconds': build_seconds}
+                yield params, rankings, latencies
+        finally:
+            store.client.indices.delete(index=store.index_name)
+
+
+def evaluate(corpus, golden, embeddings, args) -> list[dict]:
+    k = max(args.k)
+    # questions are embedded as queries, like /chat/search does; some models embed queries and passages differently
+    query_vectors = np.asarray([embeddings.embed_query(item['question']) for item in golden], dtype=np.float32)
+    rows = []
+    for mode in args.chunking_modes:
+        chunks, vectors = chunk_corpus(corpus, mode, embeddings)
+        ids = [chunk['id'] for chunk in chunks]
+        doc_of = {chunk['id']: chunk['doc_id'] for chunk in chunks}
+        for space_type in args.space_types:
+            exact, latencies = search_exact(vectors, query_vectors, space_type, k)
+            exact_ids = [[ids[idx] for idx in ranking] for ranking in exact]
+            base = {'chunking_mode': mode, 'chunks': len(chunks), 'space_type': space_type}
+            rows.append({**base, 'engine': 'exact', **_latency(latencies), **score_rankings(golden, exact_ids, exact_ids, doc_of, args.k)})
+            if args.engine == 'exact':
+                continue
+            sweep = sweep_hnswlib if args.engine == 'hnswlib' else sweep_opensearch
+            sweep_args = (vectors, query_vectors, space_type, k, args)
+            if args.engine == 'opensearch':
+                sweep_args = (chunks, *sweep_args)
+            for params, rankings, latencies in sweep(*sweep_args):
+                found = [[ids[idx] for idx in ranking] for ranking in rankings]
+                rows.append(
+                    {**base, 'engine': args.engine, **params, **_latency(latencies), **score_rankings(golden, found, exact_ids, doc_of, args.k)}
+                )
+    return rows
+
+
+def fastest_meeting(rows: list[dict], metric: str, target: float) -> dict | None:
+    """Return the approximate setting with the lowest p95 latency whose ``metric`` reaches ``target``.
+
+    The brute-force ``exact`` rows are baselines, not deployable settings, so
+    they are never recommended.
+    """
+    passing = [row for row in rows if row['engine'] != 'exact' and row[metric] >= target]
+    return min(passing, key=lambda row: row['p95_ms']) if passing else None
+
+
+def _describe(row: dict) -> str:
+    params = [f"{row['chunking_mode']}", row['space_type'], row['engine']]
+    params += [f'{key}={row[key]}' for key in ('m', 'ef_construction', 'ef_search') if key in row]
+    return ' '.join(params)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--golden', help='golden set (JSON lines); required with --pdf-dir')
+    parser.add_argument('--pdf-dir', help='directory of PDFs; the file name without .pdf is the doc_id')
+    parser.add_argument('--docs', type=int, default=200, help='synthetic corpus size without --pdf-dir')
+    parser.add_argument('--questions', type=int, default=200, help='synthetic golden set size without --golden')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--k', type=int, nargs='+', default=[1, 5, 10], help='cut-offs for recall@k')
+    parser.add_argument('--chunking-modes', nargs='+', default=['tokens'], help='semantic, sentence_reuse or tokens')
+    parser.add_argument('--space-types', nargs='+', default=['l2'], choices=SPACE_TYPES)
+    parser.add_argument('--engine', default='exact', choices=['exact', 'hnswlib', 'opensearch'])
+    parser.add_argument('--m', type=int, nargs='+', default=[16])
+    parser.add_argument('--ef-construction', type=int, nargs='+', default=[128])
+    parser.add_argument('--ef-search', type=int, nargs='+', default=[16, 64, 256])
+    parser.add_argument('--index-prefix', default='retrieval-eval', help='name prefix of the throwaway OpenSearch indices')
+    parser.add_argument('--aoss-refresh-seconds', type=float, default=15.0)
+    parser.add_argument('--recall-target', type=float, help='report the fastest setting reaching this recall')
+    parser.add_argument('--target-k', type=int, help='k of the recall target (default: the largest --k)')
+    parser.add_argument('--target-metric', default='recall', choices=['recall', 'exact_recall'])
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+    if args.pdf_dir and not args.golden:
+        parser.error('--pdf-dir requires --golden')
+    if args.target_k is not None and args.target_k not in args.k:
+        parser.error('--target-k must be one of --k')
+    if args.recall_target is not None and args.engine == 'exact':
+        parser.error('--recall-target needs an approximate --engine to choose a setting from')
+
+    if args.pdf_dir:
+        corpus, golden = load_pdf_corpus(args.pdf_dir), load_golden(args.golden)
+    else:
+        corpus, golden = synthetic_corpus(args.docs, args.questions, args.seed)
+        if args.golden:
+            golden = load_golden(args.golden)
+    embeddings = build_embeddings(os.environ.get('AWS_REGION', 'us-east-1'))
+    rows = evaluate(corpus, golden, embeddings, args)
+
+    cut_offs = ''.join(f"{f'R@{k}':>8}{f'eR@{k}':>8}" for k in args.k)
+    print(f"{'configuration':<48}{'chunks':>8}{cut_offs}{'MRR':>7}{'p50 ms':>9}{'p95 ms':>9}")
+    for row in rows:
+        recalls = ''.join(f"{row[f'recall@{k}']:>8.3f}{row[f'exact_recall@{k}']:>8.3f}" for k in args.k)
+        print(f"{_describe(row):<48}{row['chunks']:>8}{recalls}{row['mrr']:>7.3f}{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}")
+
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump(rows, fh, indent=2)
+    if args.recall_target is not None:
+        metric = f'{args.target_metric}@{args.target_k or max(args.k)}'
+        best = fastest_meeting(rows, metric, args.recall_target)
+        if best is None:
+            print(f'no setting reaches {metric} >= {args.recall_target}', file=sys.stderr)
+            sys.exit(1)
+        print(f"fastest setting with {metric} >= {args.recall_target}: {_describe(best)} (p95 {best['p95_ms']:.2f} ms)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    start_http_server,
+)
+from prometheus_client import multiprocess
+
+# network calls (S3, Bedrock, OpenSearch) dominate, so the buckets reach into tens of seconds
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+INGEST_STAGE_SECONDS = Histogram(
+    'rag_ingest_stage_seconds',
+    'Time spent per ingestion stage and document.',
+    ['stage'],
+    buckets=STAGE_BUCKETS,
+)
+INGEST_DOCUMENTS = Counter('rag_ingest_documents_total', 'Documents processed by outcome.', ['outcome'])
+INGEST_CHUNKS = Counter('rag_ingest_chunks_total', 'Chunks handled per index action.', ['action'])
+
+REQUEST_STAGE_SECONDS = Histogram(
+    'chat_request_stage_seconds',
+    'Time spent per chat request stage.',
+    ['stage'],
+    buckets=STAGE_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    'chat_request_seconds',
+    'Chat request latency until the response headers are sent.',
+    ['route', 'status'],
+    buckets=STAGE_BUCKETS,
+)
+UPLOAD_QUEUE_DEPTH = Gauge(
+    'rag_upload_queue_depth',
+    'Uploads waiting for ingestion, by status.',
+    ['status'],
+    multiprocess_mode='livemax',
+)
+
+
+def ingest_stage(stage: str):
+    """Context manager timing one ingestion stage into ``rag_ingest_stage_seconds``."""
+    return INGEST_STAGE_SECONDS.labels(stage=stage).time()
+
+
+def request_stage(stage: str):
+    """Context manager timing one chat request stage into ``chat_request_stage_seconds``."""
+    return REQUEST_STAGE_SECONDS.labels(stage=stage).time()
+
+
+def set_queue_depth(depth: dict):
+    """Publish the result of ``count_pending_uploads`` on ``rag_upload_queue_depth``."""
+    # statuses that drained since the last reading must drop to zero, not keep their old value
+    UPLOAD_QUEUE_DEPTH.clear()
+    for status, count in depth.get('by_status', {}).items():
+        UPLOAD_QUEUE_DEPTH.labels(status=status).set(count)
+
+
+class TimedIterator:
+    """Wrap an iterator and accumulate the time spent producing its items in ``seconds``.
+
+    Lets a lazy producer (PDF page extraction) be timed separately from the
+    consumer that interleaves with it (chunking).
+    """
+
+    def __init__(self, iterable):
+        self._iterator = iter(iterable)
+        self.seconds = 0.0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            return next(self._iterator)
+        finally:
+            self.seconds += time.perf_counter() - start
+
+
+def _registry():
+    # with PROMETHEUS_MULTIPROC_DIR set (several worker or server processes), aggregate their files
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def render_latest() -> tuple[bytes, str]:
+    """Return the Prometheus text exposition and its content type."""
+    return generate_latest(_registry()), CONTENT_TYPE_LATEST
+
+
+def start_metrics_server(port: int):
+    """Expose the metrics of a process without an HTTP server (the ingestion worker)."""
+    start_http_server(port, registry=_registry())
@@ -0,0 +1,10 @@
+import os
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the API imports ``backend.API_handler`` and ``AWS_utils``; the ingestion
+# worker imports its siblings flat from ``RAG_pipeline``
+for path in (os.path.dirname(BACKEND), BACKEND, os.path.join(BACKEND, 'RAG_pipeline')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,150 @@
+import asyncio
+import threading
+
+import pytest
+from flask import Flask
+from langchain_core.messages import AIMessage
+from quart import Quart
+
+from API_handler.async_chat import create_async_chat_blueprint
+from API_handler.chat import create_chat_blueprint
+from API_handler.chat_cache import AnswerCache, QueryEmbeddingCache
+
+
+class Embeddings:
+    def __init__(self):
+        self.model_lookups = []
+
+    @property
+    def model_id(self):
+        # like IndexEmbeddings, resolving the model may block on OpenSearch
+        self.model_lookups.append(threading.current_thread().name)
+        return 'model'
+
+    def embed_query(self, query):
+        return [float(len(query)), 1.0]
+
+
+class Store:
+    """Vector store whose hybrid search differs from its plain kNN ranking."""
+
+    def __init__(self):
+        self.calls = []
+        self.hits = [
+            {'id': f'd::chunk-{idx}', 'doc_id': 'd', 'chunk_index': idx, 'text': f'text {idx}', 'score': 1.0 / (idx + 1)}
+            for idx in range(6)
+        ]
+
+    def knn_search(self, query_vector, top_k=5, filters=None, with_vectors=False):
+        self.calls.append('knn_search')
+        return self.hits[:top_k]
+
+    def hybrid_search(self, query_text, query_vector, top_k=5, filters=None, with_vectors=False, **options):
+        self.calls.append('hybrid_search')
+        return list(reversed(self.hits))[:top_k]
+
+
+class LLM:
+    def invoke(self, messages):
+        return AIMessage(content='answer')
+
+    async def ainvoke(self, messages):
+        return self.invoke(messages)
+
+
+def _sync_search(store, payload, embeddings=None, query_cache=None, path='/api/chat/search'):
+    app = Flask(__name__)
+    app.register_blueprint(create_chat_blueprint(embeddings or Embeddings(), store, LLM(), query_cache), url_prefix='/api')
+    response = app.test_client().post(path, json=payload)
+    return response.status_code, response.get_json()
+
+
+def _async_search(store, payload, embeddings=None, query_cache=None, path='/api/chat/search'):
+    app = Quart(__name__)
+    app.register_blueprint(
+        create_async_chat_blueprint(embeddings or Embeddings(), store, LLM(), query_cache), url_prefix='/api'
+    )
+
+    async def run():
+        response = await app.test_client().post(path, json=payload)
+        return response.status_code, await response.get_json()
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize('mode', ['vector', 'hybrid'])
+def test_sync_and_async_routes_return_the_same_hits(mode):
+    payload = {'query': 'what is it', 'top_k': 3, 'mode': mode}
+    sync_store, async_store = Store(), Store()
+
+    sync_status, sync_body = _sync_search(sync_store, payload)
+    async_status, async_body = _async_search(async_store, payload)
+
+    assert sync_status == async_status == 200
+    assert [r['id'] for r in sync_body['results']] == [r['id'] for r in async_body['results']]
+    assert sync_store.calls == async_store.calls == ['hybrid_search' if mode == 'hybrid' else 'knn_search']
+
+
+def test_hybrid_mode_is_rejected_alike_without_hybrid_search():
+    class VectorOnlyStore:
+        def knn_search(self, query_vector, top_k=5, filters=None, with_vectors=False):
+            return []
+
+        def lexical_search(self, query_text, top_k=5, filters=None, with_vectors=False):
+            return []
+
+    payload = {'query': 'q', 'mode': 'hybrid'}
+
+    assert _sync_search(VectorOnlyStore(), payload)[0] == 400
+    assert _async_search(VectorOnlyStore(), payload)[0] == 400
+
+
+def test_batch_search_rejects_non_vector_modes():
+    payload = {'queries': ['a', 'b'], 'mode': 'hybrid'}
+    sync_store, async_store = Store(), Store()
+
+    assert _sync_search(sync_store, payload, path='/api/chat/search/batch')[0] == 400
+    assert _async_search(async_store, payload, path='/api/chat/search/batch')[0] == 400
+    assert sync_store.calls == async_store.calls == []
+
+
+def test_async_query_cache_lookup_runs_off_the_event_loop():
+    embeddings = Embeddings()
+    query_cache = QueryEmbeddingCache(embeddings)
+
+    _async_search(Store(), {'query': 'q'}, embeddings, query_cache)
+    _async_search(Store(), {'query': 'q'}, embeddings, query_cache)
+
+    assert embeddings.model_lookups
+    assert all(name.startswith('chat-io') for name in embeddings.model_lookups)
+
+
+def _invalidate(flavour, headers, token):
+    answer_cache = AnswerCache()
+    payload = {'doc_id': 'doc-1'}
+    if flavour == 'sync':
+        app = Flask(__name__)
+        app.register_blueprint(
+            create_chat_blueprint(Embeddings(), Store(), LLM(), answer_cache=answer_cache, cache_admin_token=token),
+            url_prefix='/api',
+        )
+        return app.test_client().post('/api/chat/cache/invalidate', json=payload, headers=headers).status_code
+    app = Quart(__name__)
+    app.register_blueprint(
+        create_async_chat_blueprint(Embeddings(), Store(), LLM(), answer_cache=answer_cache, cache_admin_token=token),
+        url_prefix='/api',
+    )
+
+    async def run():
+        response = await app.test_client().post('/api/chat/cache/invalidate', json=payload, headers=headers)
+        return response.status_code
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize('flavour', ['sync', 'async'])
+def test_cache_invalidation_requires_the_admin_token(flavour):
+    assert _invalidate(flavour, {}, None) == 404
+    assert _invalidate(flavour, {}, 'secret') == 401
+    assert _invalidate(flavour, {'X-Cache-Admin-Token': 'wrong'}, 'secret') == 401
+    assert _invalidate(flavour, {'X-Cache-Admin-Token': 'secret'}, 'secret') == 200
@@ -0,0 +1,45 @@
+from chunking import SentenceReuseChunker, TokenCountSplitter, splitter_mode
+from embedding_cache import EmbeddingCache
+from pipeline import RagPipeline
+
+
+class Embeddings:
+    model_id = 'fake-model'
+
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(text)), float(sum(map(ord, text)) % 97), 1.0] for text in texts]
+
+
+class SemanticChunker:
+    """Stands in for LangChain's splitter, which has no ``mode`` attribute."""
+
+    def split_text(self, text):
+        return [text]
+
+
+def test_pipeline_records_the_splitter_mode():
+    embeddings = Embeddings()
+
+    assert RagPipeline(None, TokenCountSplitter(), embeddings, None).chunking_mode == 'tokens'
+    assert RagPipeline(None, SentenceReuseChunker(embeddings), embeddings, None).chunking_mode == 'sentence_reuse'
+    assert splitter_mode(SemanticChunker()) == 'semantic'
+
+
+def test_sentence_reuse_embeds_each_sentence_once_across_reprocessing(tmp_path):
+    embeddings = Embeddings()
+    cache = EmbeddingCache(str(tmp_path / 'cache.sqlite'))
+    chunker = SentenceReuseChunker(embeddings, embedding_cache=cache)
+    text = 'The cat sat. The dog ran. Rain fell all day. The sun came out.'
+
+    first = chunker.split_with_embeddings(text)
+    embedded = list(embeddings.embedded)
+    second = chunker.split_with_embeddings(text)
+
+    assert len(embedded) == 4
+    assert embeddings.embedded == embedded
+    assert first == second
+    cache.close()
@@ -0,0 +1,66 @@
+from API_handler.context_packing import estimate_tokens, pack_context
+
+
+def _words(prefix, count):
+    return ' '.join(f'{prefix}{idx}' for idx in range(count))
+
+
+def _chunk(chunk_id, doc_id, chunk_index, text):
+    return {'id': chunk_id, 'doc_id': doc_id, 'chunk_index': chunk_index, 'file_name': f'{doc_id}.pdf', 'text': text}
+
+
+def test_adjacent_chunks_merge_without_the_repeated_overlap():
+    overlap = _words('o', 6)
+    results = [
+        _chunk('b', 'doc', 1, f'{overlap} {_words("b", 4)}'),
+        _chunk('x', 'other', 0, _words('x', 8)),
+        _chunk('a', 'doc', 0, f'{_words("a", 4)} {overlap}'),
+    ]
+
+    segments = pack_context(results)
+
+    assert [s['chunk_ids'] for s in segments] == [['a', 'b'], ['x']]
+    assert segments[0]['text'] == f'{_words("a", 4)} {overlap} {_words("b", 4)}'
+    assert [s['segment'] for s in segments] == [1, 2]
+
+
+def test_chunk_bridging_two_runs_joins_them():
+    results = [_chunk('a', 'doc', 0, 'alpha'), _chunk('c', 'doc', 2, 'gamma'), _chunk('b', 'doc', 1, 'beta')]
+
+    segments = pack_context(results)
+
+    assert [s['chunk_indices'] for s in segments] == [[0, 1, 2]]
+
+
+def test_near_duplicate_segments_are_dropped():
+    text = _words('w', 40)
+    results = [
+        _chunk('a', 'doc-1', 0, text),
+        _chunk('b', 'doc-2', 5, f'{text} extra'),
+        _chunk('c', 'doc-3', 0, _words('z', 40)),
+    ]
+
+    segments = pack_context(results, dedupe_threshold=0.85)
+
+    assert [s['chunk_ids'] for s in segments] == [['a'], ['c']]
+
+
+def test_segments_that_do_not_fit_are_skipped_in_favour_of_later_ones():
+    results = [
+        _chunk('a', 'doc-1', 0, _words('a', 20)),
+        _chunk('b', 'doc-2', 0, _words('b', 200)),
+        _chunk('c', 'doc-3', 0, _words('c', 10)),
+    ]
+    budget = estimate_tokens(results[0]['text']) + estimate_tokens(results[2]['text'])
+
+    segments = pack_context(results, token_budget=budget)
+
+    assert [s['chunk_ids'] for s in segments] == [['a'], ['c']]
+    assert sum(s['tokens'] for s in segments) <= budget
+
+
+def test_best_segment_is_truncated_to_the_budget():
+    segments = pack_context([_chunk('a', 'doc', 0, _words('a', 500))], token_budget=50)
+
+    assert len(segments) == 1
+    assert segments[0]['tokens'] <= 50
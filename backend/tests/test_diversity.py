@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from API_handler.diversity import mmr_rerank
+
+
+def _results(vectors):
+    return [{'id': f'c{idx}', 'embedding': list(vector)} for idx, vector in enumerate(vectors)]
+
+
+def _cosine(a, b):
+    return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+
+def _reference_mmr(query, vectors, top_k, lambda_mult):
+    selected, candidates = [], list(range(len(vectors)))
+    while candidates and len(selected) < top_k:
+        def score(idx):
+            redundancy = max((_cosine(vectors[idx], vectors[other]) for other in selected), default=0.0)
+            return lambda_mult * _cosine(query, vectors[idx]) - (1 - lambda_mult) * redundancy
+
+        best = max(candidates, key=score)
+        selected.append(best)
+        candidates.remove(best)
+    return selected
+
+
+def test_near_duplicates_give_way_to_distinct_chunks():
+    query = [1.0, 0.2, 0.0]
+    vectors = [[1.0, 0.2, 0.0], [1.0, 0.21, 0.0], [0.6, 0.0, 0.8]]
+
+    assert [r['id'] for r in mmr_rerank(query, _results(vectors), top_k=2, lambda_mult=1.0)] == ['c0', 'c1']
+    assert [r['id'] for r in mmr_rerank(query, _results(vectors), top_k=2, lambda_mult=0.3)] == ['c0', 'c2']
+
+
+@pytest.mark.parametrize('lambda_mult', [0.1, 0.3, 0.7, 1.0])
+def test_matches_the_greedy_definition(lambda_mult):
+    rng = np.random.default_rng(3)
+    vectors = rng.normal(size=(30, 8))
+    query = rng.normal(size=8)
+
+    found = mmr_rerank(query.tolist(), _results(vectors), top_k=10, lambda_mult=lambda_mult)
+
+    assert [r['id'] for r in found] == [f'c{idx}' for idx in _reference_mmr(query, vectors, 10, lambda_mult)]
+
+
+def test_vectors_are_stripped_and_missing_vectors_keep_the_ranking():
+    results = _results([[1.0, 0.0], [0.0, 1.0]])
+
+    assert all('embedding' not in r for r in mmr_rerank([1.0, 0.0], results, top_k=2))
+    results[1]['embedding'] = None
+    assert [r['id'] for r in mmr_rerank([0.0, 1.0], results, top_k=1)] == ['c0']
+
+
+def test_lambda_must_be_a_weight():
+    with pytest.raises(ValueError):
+        mmr_rerank([1.0], _results([[1.0]]), top_k=1, lambda_mult=1.5)
@@ -0,0 +1,96 @@
+from AWS_utils.local_vector_store import LocalVectorStore
+from benchmarks.corpus import make_pdf
+from benchmarks.fakes import LocalS3
+from chunking import TokenCountSplitter
+from embedding_cache import text_hash
+from pipeline import RagPipeline, assign_chunk_ids
+
+
+def _hashes(*texts):
+    return [text_hash(text) for text in texts]
+
+
+def test_unchanged_chunks_keep_their_ids():
+    first, _ = assign_chunk_ids('doc', _hashes('a', 'b'), {})
+    indexed = {
+        chunk_id: {'content_hash': text_hash(text), 'chunk_index': idx}
+        for idx, (chunk_id, text) in enumerate(zip(first, 'ab'))
+    }
+
+    chunk_ids, new = assign_chunk_ids('doc', _hashes('b', 'c', 'a'), indexed)
+
+    assert chunk_ids[0] == first[1]
+    assert chunk_ids[2] == first[0]
+    assert new == [1]
+
+
+def test_repeated_content_gets_distinct_ids():
+    chunk_ids, new = assign_chunk_ids('doc', _hashes('a', 'a', 'a'), {})
+
+    assert len(set(chunk_ids)) == 3
+    assert new == [0, 1, 2]
+
+
+def test_new_ids_never_collide_with_indexed_chunks():
+    # chunks indexed before content hashes were stored cannot be matched
+    legacy_id = f"doc::{text_hash('a')[:16]}"
+    indexed = {legacy_id: {'content_hash': None, 'chunk_index': 0}}
+
+    chunk_ids, new = assign_chunk_ids('doc', _hashes('a'), indexed)
+
+    assert new == [0]
+    assert chunk_ids[0] != legacy_id
+
+
+class Embeddings:
+    model_id = 'fake-model'
+
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(text)), float(sum(map(ord, text)) % 97), 1.0] for text in texts]
+
+
+class Uploads:
+    def __init__(self):
+        self.processed = []
+
+    def find_upload_by_content_hash(self, content_hash, exclude_doc_id=None, embedded_only=False):
+        return None
+
+    def mark_upload_processed(self, doc_id, chunk_count, embedding_model, metadata_patch=None, claimed_by=None):
+        self.processed.append(metadata_patch)
+        return True
+
+    def mark_upload_failed(self, doc_id, notes, claimed_by=None):
+        raise AssertionError(notes)
+
+
+def test_reprocessing_only_embeds_changed_chunks(tmp_path):
+    s3 = LocalS3(str(tmp_path / 'bucket'))
+    store = LocalVectorStore(str(tmp_path / 'vectors'), 'test', dimension=3)
+    embeddings, uploads = Embeddings(), Uploads()
+    pipeline = RagPipeline(
+        s3, TokenCountSplitter(chunk_tokens=4, overlap_tokens=0), embeddings, store, worker_id='w', uploads=uploads
+    )
+    doc = {'doc_id': 'doc-1', 'file_name': 'a.pdf', 's3_url': 's3://bucket/doc-1'}
+    alpha, beta, gamma, delta = 'alpha one two three', 'beta one two three', 'gamma one two three', 'delta one two three'
+
+    s3.put_bytes('doc-1', make_pdf([f'{alpha} {beta} {gamma}']))
+    assert pipeline.process_document(doc)
+    before = store.fetch_chunk_states('doc-1')
+    embeddings.embedded.clear()
+
+    s3.put_bytes('doc-1', make_pdf([f'{gamma} {alpha} {delta}']))
+    assert pipeline.process_document(doc)
+    after = store.fetch_chunk_states('doc-1')
+
+    assert embeddings.embedded == [delta]
+    assert uploads.processed[-1]['index_update'] == {
+        'mode': 'incremental', 'written': 1, 'moved': 2, 'deleted': 1, 'unchanged': 0,
+    }
+    ids_of = {state['content_hash']: chunk_id for chunk_id, state in before.items()}
+    positions = {ids_of.get(state['content_hash'], 'new'): state['chunk_index'] for chunk_id, state in after.items()}
+    assert positions == {ids_of[text_hash(gamma)]: 0, ids_of[text_hash(alpha)]: 1, 'new': 2}
@@ -0,0 +1,79 @@
+import os
+
+from AWS_utils.local_vector_store import LocalVectorStore
+
+
+def _record(chunk_id, vector, doc_id='doc-1', uploader_id='u-1'):
+    return {
+        'id': chunk_id,
+        'doc_id': doc_id,
+        'chunk_index': 0,
+        'text': chunk_id,
+        'uploader_id': uploader_id,
+        'embedding': vector,
+    }
+
+
+def _ids(store, vector, top_k=10, **kwargs):
+    return [hit['id'] for hit in store.knn_search(vector, top_k=top_k, **kwargs)]
+
+
+def test_upsert_replaces_the_previous_row(tmp_path):
+    store = LocalVectorStore(str(tmp_path), 'test', dimension=2)
+    store.upsert_chunks([_record('a', [1.0, 0.0]), _record('b', [0.0, 1.0])])
+
+    store.upsert_chunks([_record('a', [0.0, 0.9])])
+
+    assert _ids(store, [0.0, 1.0]) == ['b', 'a']
+    assert store.count_chunks() == 2
+
+
+def test_deleted_chunks_are_not_returned(tmp_path):
+    store = LocalVectorStore(str(tmp_path), 'test', dimension=2)
+    store.upsert_chunks([_record('a', [1.0, 0.0]), _record('b', [0.0, 1.0], doc_id='doc-2')])
+
+    store.delete_chunks_for_doc('doc-1')
+    store.delete_chunk_ids(['missing'])
+
+    assert _ids(store, [1.0, 0.0]) == ['b']
+    assert store.fetch_chunk_states('doc-1') == {}
+
+
+def test_compaction_drops_tombstones_and_keeps_results(tmp_path):
+    store = LocalVectorStore(str(tmp_path), 'test', dimension=2)
+    store.upsert_chunks([_record(f'c{idx}', [float(idx), 1.0]) for idx in range(5)])
+    store.delete_chunk_ids(['c1', 'c3'])
+    store.upsert_chunks([_record('c0', [0.0, 2.0])])
+    before = store.knn_search([4.0, 1.0], top_k=10)
+
+    store.compact()
+
+    assert store.knn_search([4.0, 1.0], top_k=10) == before
+    assert os.path.getsize(tmp_path / 'test.f32') == 3 * 2 * 4
+    store.upsert_chunks([_record('c5', [5.0, 1.0])])
+    assert _ids(store, [5.0, 1.0], top_k=2) == ['c5', 'c4']
+
+
+def test_other_instances_see_writes_and_compaction(tmp_path):
+    writer = LocalVectorStore(str(tmp_path), 'test', dimension=2)
+    reader = LocalVectorStore(str(tmp_path), 'test', dimension=2)
+
+    writer.upsert_chunks([_record('a', [1.0, 0.0]), _record('b', [0.0, 1.0])])
+    assert _ids(reader, [1.0, 0.0]) == ['a', 'b']
+
+    # both instances write; neither overwrites rows the other allocated
+    reader.upsert_chunks([_record('c', [1.0, 1.0])])
+    writer.upsert_chunks([_record('d', [2.0, 2.0])])
+    writer.delete_chunk_ids(['a'])
+    writer.compact()
+
+    assert sorted(_ids(reader, [1.0, 1.0])) == ['b', 'c', 'd']
+    assert _ids(reader, [2.0, 2.0], top_k=1) == ['d']
+
+
+def test_filters_apply_before_top_k(tmp_path):
+    store = LocalVectorStore(str(tmp_path), 'test', dimension=2)
+    store.upsert_chunks([_record(f'a{idx}', [1.0, float(idx) / 10]) for idx in range(5)])
+    store.upsert_chunks([_record('far', [-5.0, 0.0], doc_id='doc-2', uploader_id='u-2')])
+
+    assert _ids(store, [1.0, 0.0], top_k=1, filters={'uploader_id': 'u-2'}) == ['far']
@@ -0,0 +1,68 @@
+import threading
+import time
+
+from benchmarks.fakes import SqliteUploads
+from chunking import TokenCountSplitter
+from pipeline import RagPipeline
+
+
+class ScriptedPipeline(RagPipeline):
+    """Runs ``run_forever`` over scripted ``(claimed, succeeded)`` batches."""
+
+    def __init__(self, batches):
+        self.worker_id = 'test-worker'
+        self.batches = list(batches)
+        self.idles = []
+        self.stop_event = threading.Event()
+
+    def process_batch(self, batch_size=5, max_workers=1):
+        claimed, succeeded = self.batches.pop(0)
+        if not self.batches:
+            self.stop_event.set()
+        return claimed, succeeded
+
+    def _idle(self, poll_interval, stop_event, upload_events):
+        self.idles.append(len(self.batches))
+
+
+def test_full_batch_with_failures_claims_again_without_sleeping():
+    pipeline = ScriptedPipeline([(2, 1), (2, 0), (1, 1)])
+
+    pipeline.run_forever(batch_size=2, poll_interval=60, stop_event=pipeline.stop_event)
+
+    # only the short last batch is followed by a sleep
+    assert pipeline.idles == [0]
+
+
+def test_empty_queue_sleeps():
+    pipeline = ScriptedPipeline([(0, 0), (0, 0)])
+
+    pipeline.run_forever(batch_size=2, poll_interval=60, stop_event=pipeline.stop_event)
+
+    assert pipeline.idles == [1, 0]
+
+
+class SlowPipeline(RagPipeline):
+    """Takes ``seconds`` per document; long enough to outlive one lease."""
+
+    def __init__(self, uploads, worker_id, lease_seconds, seconds):
+        super().__init__(None, TokenCountSplitter(), None, None, worker_id=worker_id, uploads=uploads, lease_seconds=lease_seconds)
+        self.seconds = seconds
+        self.rivals = []
+
+    def _process_document(self, doc):
+        time.sleep(self.seconds)
+        # another worker polling now must not get the document
+        self.rivals = self.uploads.claim_unprocessed_uploads('rival', limit=1, claim_timeout_seconds=60)
+        return self.uploads.mark_upload_processed(doc['doc_id'], 1, 'model', claimed_by=self.worker_id)
+
+
+def test_lease_is_renewed_while_a_document_is_processing():
+    uploads = SqliteUploads()
+    uploads.insert_upload_record('doc-1', 'a.pdf', 's3://bucket/doc-1')
+    pipeline = SlowPipeline(uploads, 'worker-a', lease_seconds=0.3, seconds=0.8)
+
+    assert pipeline.process_batch(batch_size=1) == (1, 1)
+    assert pipeline.rivals == []
+    assert uploads.status_counts() == {'embedded': 1}
+
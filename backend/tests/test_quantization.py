@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from AWS_utils.quantization import int8_scale, quantize, unit_vector_int8_scale, validate_mode
+
+
+def _unit_vectors(count, dimension):
+    vectors = np.random.default_rng(1).normal(size=(count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_derived_int8_scale_uses_the_int8_range():
+    vectors = _unit_vectors(200, 1536)
+
+    codes = quantize(vectors, 'int8', int8_scale(vectors))
+
+    assert np.abs(codes).max() == 127
+    assert np.percentile(np.abs(codes), 99) > 80
+    # a fixed [-1, 1] range leaves most of the levels unused
+    assert np.abs(quantize(vectors, 'int8', 1.0)).max() < 20
+
+
+def test_unit_vector_scale_matches_unit_length_data():
+    assert unit_vector_int8_scale(1536) == pytest.approx(int8_scale(_unit_vectors(200, 1536)), rel=0.05)
+
+
+def test_int8_requires_a_scale():
+    with pytest.raises(ValueError):
+        quantize([0.1, -0.1], 'int8')
+
+
+def test_binary_requires_a_wide_rescore_shortlist():
+    with pytest.raises(ValueError):
+        validate_mode('binary', 1536, oversample=3.0)
+    assert validate_mode('binary', 1536, oversample=10.0) == 'binary'
+    assert validate_mode('int8', 1536, oversample=3.0) == 'int8'
@@ -0,0 +1,38 @@
+import pytest
+
+from AWS_utils.opensearch import reciprocal_rank_fusion
+
+
+def _hits(*ids, score=1.0):
+    return [{'id': chunk_id, 'text': chunk_id, 'score': score} for chunk_id in ids]
+
+
+def test_chunks_found_by_both_retrievers_rank_first():
+    lexical = _hits('a', 'b', 'c')
+    vector = _hits('d', 'c', 'e')
+
+    fused = reciprocal_rank_fusion([lexical, vector], [1.0, 1.0], rank_constant=60, top_k=5)
+
+    assert [hit['id'] for hit in fused] == ['c', 'a', 'd', 'b', 'e']
+    assert fused[0]['score'] == pytest.approx(1 / 63 + 1 / 62)
+
+
+def test_weights_scale_each_list():
+    lexical = _hits('a', 'b')
+    vector = _hits('b', 'a')
+
+    assert [hit['id'] for hit in reciprocal_rank_fusion([lexical, vector], [1.0, 2.0], top_k=2)] == ['b', 'a']
+    assert [hit['id'] for hit in reciprocal_rank_fusion([lexical, vector], [0.0, 1.0], top_k=2)] == ['b', 'a']
+    assert [hit['id'] for hit in reciprocal_rank_fusion([lexical, vector], [1.0, 0.0], top_k=2)] == ['a', 'b']
+
+
+def test_fused_hits_keep_their_fields_and_respect_top_k():
+    lexical = [{'id': 'a', 'text': 'from lexical', 'score': 12.5}]
+    vector = [{'id': 'a', 'text': 'from vector', 'score': 0.9}, *_hits('b', 'c')]
+
+    fused = reciprocal_rank_fusion([lexical, vector], [1.0, 1.0], top_k=2)
+
+    assert [hit['id'] for hit in fused] == ['a', 'b']
+    assert fused[0]['text'] == 'from lexical'
+    assert fused[0]['score'] == pytest.approx(2 / 61)
+    assert reciprocal_rank_fusion([[], []], [1.0, 1.0]) == []
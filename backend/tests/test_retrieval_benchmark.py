@@ -0,0 +1,12 @@
+from benchmarks.retrieval import fastest_meeting
+
+
+def test_fastest_meeting_never_recommends_the_exact_baseline():
+    rows = [
+        {'engine': 'exact', 'recall@5': 1.0, 'p95_ms': 0.5},
+        {'engine': 'hnswlib', 'ef_search': 16, 'recall@5': 0.8, 'p95_ms': 0.2},
+        {'engine': 'hnswlib', 'ef_search': 64, 'recall@5': 0.95, 'p95_ms': 0.9},
+    ]
+
+    assert fastest_meeting(rows, 'recall@5', 0.9)['ef_search'] == 64
+    assert fastest_meeting(rows, 'recall@5', 0.99) is None
@@ -0,0 +1,100 @@
+import io
+
+import pytest
+from flask import Flask
+
+from API_handler import upload as upload_module
+
+
+class FakeUploads:
+    """In-memory ``uploads`` table with the dedup lookup of ``AWS_utils.db``."""
+
+    def __init__(self):
+        self.rows = {}
+
+    def insert_upload_record(self, doc_id, status='queued', **fields):
+        self.rows[doc_id] = {'doc_id': doc_id, 'status': status, 'is_embedded': False, **fields}
+
+    def find_upload_by_content_hash(self, content_hash, exclude_doc_id=None, embedded_only=False):
+        for row in self.rows.values():
+            if row['content_hash'] != content_hash or row['doc_id'] == exclude_doc_id:
+                continue
+            if row['status'] in ('duplicate', 'failed', 'dead_letter'):
+                continue
+            if embedded_only and not row['is_embedded']:
+                continue
+            return row
+        return None
+
+
+class FakeStorage:
+    def __init__(self):
+        self.objects = {}
+
+    def upload_fileobj(self, fileobj, object_key, ExtraArgs=None):
+        self.objects[object_key] = fileobj.read()
+
+    def get_public_url(self, object_key):
+        return f'https://bucket/{object_key}'
+
+
+@pytest.fixture
+def uploads(monkeypatch):
+    fake = FakeUploads()
+    monkeypatch.setattr(upload_module, 'find_upload_by_content_hash', fake.find_upload_by_content_hash)
+    monkeypatch.setattr(upload_module, 'insert_upload_record', fake.insert_upload_record)
+    return fake
+
+
+@pytest.fixture
+def storage():
+    return FakeStorage()
+
+
+@pytest.fixture
+def client(uploads, storage):
+    app = Flask(__name__)
+    app.register_blueprint(upload_module.create_upload_blueprint(storage))
+    return app.test_client()
+
+
+def _upload(client, content=b'%PDF-1.4 same', uploader_id='u-1'):
+    data = {'file': (io.BytesIO(content), 'doc.pdf'), 'uploader_id': uploader_id}
+    return client.post('/upload', data=data, content_type='multipart/form-data')
+
+
+def test_first_upload_is_stored_and_queued(client, uploads, storage):
+    body = _upload(client).get_json()
+
+    assert body['doc_id'] in storage.objects
+    assert uploads.rows[body['doc_id']]['status'] == 'queued'
+    assert 'duplicate' not in body
+
+
+def test_upload_of_embedded_content_is_recorded_as_the_callers_duplicate(client, uploads, storage):
+    first = _upload(client, uploader_id='u-1').get_json()
+    uploads.rows[first['doc_id']].update(status='embedded', is_embedded=True)
+
+    second = _upload(client, uploader_id='u-2').get_json()
+
+    assert second['duplicate'] is True
+    assert second['doc_id'] != first['doc_id']
+    assert second['s3_url'] is None
+    assert uploads.rows[second['doc_id']]['status'] == 'duplicate'
+    assert uploads.rows[second['doc_id']]['metadata'] == {'duplicate_of': first['doc_id']}
+    assert list(storage.objects) == [first['doc_id']]
+
+
+def test_upload_is_not_stranded_when_a_pending_canonical_fails(client, uploads, storage):
+    first = _upload(client, uploader_id='u-1').get_json()
+
+    # the canonical is still queued, so the second upload is queued on its own
+    second = _upload(client, uploader_id='u-2').get_json()
+    assert 'duplicate' not in second
+    assert uploads.rows[second['doc_id']]['status'] == 'queued'
+    assert second['doc_id'] in storage.objects
+
+    uploads.rows[first['doc_id']]['status'] = 'dead_letter'
+
+    assert uploads.rows[second['doc_id']]['status'] == 'queued'
+    assert uploads.find_upload_by_content_hash(uploads.rows[second['doc_id']]['content_hash'])['doc_id'] == second['doc_id']
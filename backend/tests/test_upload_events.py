@@ -0,0 +1,36 @@
+import threading
+
+import pytest
+
+from AWS_utils import db
+from AWS_utils.upload_events import LocalUploadQueue, PostgresUploadListener
+
+
+@pytest.fixture
+def no_dsn(monkeypatch):
+    for name in ('UPLOADS_DB_DSN', 'DB_USER', 'DB_PASSWORD', 'DB_HOST', 'DB_NAME'):
+        monkeypatch.delenv(name, raising=False)
+
+
+def test_listener_without_dsn_falls_back_to_polling(no_dsn):
+    listener = PostgresUploadListener()
+
+    assert not db.dsn_configured()
+    assert listener.wait(0.01) == []
+    # later waits just sleep instead of retrying the connection
+    assert listener.wait(0.01) == []
+    listener.close()
+
+
+def test_idle_worker_survives_listener_without_dsn(no_dsn):
+    from pipeline import RagPipeline
+
+    RagPipeline._idle(0.05, threading.Event(), PostgresUploadListener())
+
+
+def test_local_queue_wakes_waiter():
+    queue = LocalUploadQueue()
+    queue.publish('doc-1')
+
+    assert queue.wait(1.0) == ['doc-1']
+    assert queue.wait(0.01) == []
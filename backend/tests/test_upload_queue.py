@@ -0,0 +1,174 @@
+"""Claiming, backoff and dead-lettering against a real PostgreSQL.
+
+Set ``UPLOADS_TEST_DSN`` to a database the tests may create throwaway
+schemas in; without it they are skipped.
+"""
+import os
+import uuid
+
+import pytest
+
+psycopg2 = pytest.importorskip('psycopg2')
+from psycopg2.extensions import make_dsn  # noqa: E402
+
+from AWS_utils import db  # noqa: E402
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'AWS_utils', 'migrations')
+TEST_DSN = os.environ.get('UPLOADS_TEST_DSN')
+
+pytestmark = pytest.mark.skipif(not TEST_DSN, reason='UPLOADS_TEST_DSN not set')
+
+
+def _run_migration(conn, name):
+    with open(os.path.join(MIGRATIONS, name)) as fh, conn.cursor() as cur:
+        cur.execute(fh.read())
+    conn.commit()
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    schema = f'uploads_test_{uuid.uuid4().hex[:8]}'
+    dsn = make_dsn(TEST_DSN, options=f'-csearch_path={schema}')
+    admin = psycopg2.connect(TEST_DSN)
+    with admin.cursor() as cur:
+        cur.execute(f'CREATE SCHEMA {schema}')
+    admin.commit()
+    connection = psycopg2.connect(dsn)
+    _run_migration(connection, 'create_uploads_table.sql')
+    db.close_pool()
+    monkeypatch.setenv('UPLOADS_DB_DSN', dsn)
+    try:
+        yield connection
+    finally:
+        db.close_pool()
+        connection.close()
+        with admin.cursor() as cur:
+            cur.execute(f'DROP SCHEMA {schema} CASCADE')
+        admin.commit()
+        admin.close()
+
+
+def _queue(*doc_ids):
+    for doc_id in doc_ids:
+        db.insert_upload_record(doc_id, f'{doc_id}.pdf', f's3://bucket/{doc_id}')
+
+
+def _row(conn, doc_id):
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT status, attempts, claimed_by, notes, last_error,
+                   EXTRACT(EPOCH FROM next_attempt_at - now())
+            FROM uploads WHERE doc_id = %s
+            """,
+            (doc_id,),
+        )
+        row = cur.fetchone()
+    conn.commit()
+    keys = ('status', 'attempts', 'claimed_by', 'notes', 'last_error', 'due_in')
+    return dict(zip(keys, row))
+
+
+def _make_due(conn, doc_id):
+    with conn.cursor() as cur:
+        cur.execute('UPDATE uploads SET next_attempt_at = now() WHERE doc_id = %s', (doc_id,))
+    conn.commit()
+
+
+def _claimed(worker_id, **kwargs):
+    return [doc['doc_id'] for doc in db.claim_unprocessed_uploads(worker_id, **kwargs)]
+
+
+def test_claims_skip_rows_locked_by_another_transaction(conn):
+    _queue('d0', 'd1', 'd2')
+    with conn.cursor() as cur:
+        cur.execute("SELECT id FROM uploads WHERE doc_id = 'd0' FOR UPDATE")
+
+        assert _claimed('w1', limit=3) == ['d1', 'd2']
+    conn.rollback()
+
+    assert _claimed('w2', limit=3) == ['d0']
+    assert _claimed('w3', limit=3) == []
+
+
+def test_failure_backs_off_exponentially_and_records_the_error(conn):
+    _queue('d0')
+    _claimed('w1')
+
+    assert db.mark_upload_failed('d0', 'boom', claimed_by='w1') == 'failed'
+    row = _row(conn, 'd0')
+    assert (row['status'], row['attempts'], row['claimed_by']) == ('failed', 1, None)
+    assert row['notes'] == row['last_error'] == 'boom'
+    assert 0.75 * db.RETRY_BASE_SECONDS - 1 <= row['due_in'] <= 1.25 * db.RETRY_BASE_SECONDS
+    assert _claimed('w2') == []
+
+    _make_due(conn, 'd0')
+    assert _claimed('w2') == ['d0']
+    db.mark_upload_failed('d0', 'boom again', claimed_by='w2')
+    assert 1.5 * db.RETRY_BASE_SECONDS - 1 <= _row(conn, 'd0')['due_in'] <= 2.5 * db.RETRY_BASE_SECONDS
+
+
+def test_last_failed_attempt_is_dead_lettered_until_requeued(conn):
+    _queue('d0')
+    for attempt in range(2):
+        _make_due(conn, 'd0')
+        assert _claimed('w1', max_attempts=2) == ['d0']
+        status = db.mark_upload_failed('d0', f'failure {attempt}', max_attempts=2, claimed_by='w1')
+
+    assert status == 'dead_letter'
+    _make_due(conn, 'd0')
+    assert _claimed('w1', max_attempts=2) == []
+
+    db.requeue_upload('d0')
+    assert _claimed('w1', max_attempts=2) == ['d0']
+
+
+def test_expired_lease_on_the_last_attempt_is_dead_lettered(conn):
+    _queue('d0')
+    _claimed('w1', claim_timeout_seconds=0, max_attempts=1)
+
+    assert _claimed('w2', max_attempts=1) == []
+    row = _row(conn, 'd0')
+    assert row['status'] == 'dead_letter'
+    assert 'lease expired' in row['last_error']
+
+
+def test_worker_that_lost_its_lease_cannot_finish_the_document(conn):
+    _queue('d0')
+    _claimed('w1', claim_timeout_seconds=0)
+    assert _claimed('w2') == ['d0']
+
+    assert db.renew_upload_lease('d0', 'w1') is False
+    assert db.mark_upload_processed('d0', 3, 'model', claimed_by='w1') is False
+    assert db.mark_upload_failed('d0', 'late failure', claimed_by='w1') is None
+    assert db.mark_uploads_processed([{'doc_id': 'd0', 'chunk_count': 3, 'embedding_model': 'model'}], claimed_by='w1') == []
+    assert _row(conn, 'd0')['claimed_by'] == 'w2'
+
+    assert db.renew_upload_lease('d0', 'w2', lease_seconds=600) is True
+    assert _row(conn, 'd0')['due_in'] > 500
+    assert db.mark_upload_processed('d0', 3, 'model', claimed_by='w2') is True
+    assert _row(conn, 'd0')['status'] == 'embedded'
+
+
+def test_bulk_failures_back_off_per_document(conn):
+    _queue('d0', 'd1')
+    _claimed('w1', limit=2)
+
+    db.mark_uploads_failed({'d0': 'bad pdf', 'd1': 'timeout'}, claimed_by='w1')
+
+    assert [_row(conn, doc_id)['notes'] for doc_id in ('d0', 'd1')] == ['bad pdf', 'timeout']
+    assert _claimed('w1', limit=2) == []
+
+
+def test_next_attempt_at_is_backfilled_and_required(conn):
+    with conn.cursor() as cur:
+        cur.execute('ALTER TABLE uploads ALTER COLUMN next_attempt_at DROP NOT NULL')
+        cur.execute("INSERT INTO uploads (doc_id, file_name, s3_url, next_attempt_at) VALUES ('old', 'old.pdf', 's3://b/old', NULL)")
+    conn.commit()
+
+    _run_migration(conn, 'require_uploads_next_attempt_at.sql')
+
+    assert _claimed('w1') == ['old']
+    with pytest.raises(psycopg2.errors.NotNullViolation), conn.cursor() as cur:
+        cur.execute("INSERT INTO uploads (doc_id, file_name, s3_url, next_attempt_at) VALUES ('new', 'new.pdf', 's3://b/new', NULL)")
+    conn.rollback()
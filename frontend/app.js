@@ -18,6 +18,7 @@ function appendMessage(role, text){
   el.textContent = text;
   messages.appendChild(el);
   messages.scrollTop = messages.scrollHeight;
+  return el;
 }
 
 // File selection handlers
@@ -78,6 +79,18 @@ questionInput.addEventListener('keydown', (e)=>{
   if(e.key === 'Enter') sendQuestion();
 });
 
+// Parse one SSE frame ("event: x\ndata: {...}") into {event, data}
+function parseSseFrame(frame){
+  let event = 'message';
+  const dataLines = [];
+  for(const line of frame.split('\n')){
+    if(line.startsWith('event:')) event = line.slice(6).trim();
+    else if(line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+  }
+  if(!dataLines.length) return null;
+  return {event, data: JSON.parse(dataLines.join('\n'))};
+}
+
 async function sendQuestion(){
   const q = questionInput.value.trim();
   if(!q) return;
@@ -85,25 +98,47 @@ async function sendQuestion(){
   questionInput.value = '';
   sendBtn.disabled = true;
 
-  const payload = {question: q, doc_id: currentDocId};
+  const payload = {query: q, doc_id: currentDocId};
+  const answerEl = appendMessage('assistant', '…');
+  let answer = '';
   try{
-    const res = await fetch(`${BACKEND}/chat`, {
+    // EventSource only supports GET, so read the SSE stream from fetch directly
+    const res = await fetch(`${BACKEND}/api/chat/search/stream`, {
       method: 'POST',
-      headers: {'Content-Type':'application/json'},
+      headers: {'Content-Type':'application/json', 'Accept':'text/event-stream'},
       body: JSON.stringify(payload),
     });
-    if(!res.ok){
+    if(!res.ok || !res.body){
       const txt = await res.text();
       throw new Error(txt || res.statusText);
     }
 
-    const data = await res.json();
-    // expected backend response: {answer: '...'} or {answer_text: '...'}
-    const answer = data.answer || data.answer_text || data.text || JSON.stringify(data);
-    appendMessage('assistant', answer);
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while(true){
+      const {value, done} = await reader.read();
+      if(done) break;
+      buffer += decoder.decode(value, {stream: true});
+      let sep;
+      while((sep = buffer.indexOf('\n\n')) !== -1){
+        const msg = parseSseFrame(buffer.slice(0, sep));
+        buffer = buffer.slice(sep + 2);
+        if(!msg) continue;
+        if(msg.event === 'token'){
+          answer += msg.data.text;
+          answerEl.textContent = answer;
+          messages.scrollTop = messages.scrollHeight;
+        }else if(msg.event === 'done'){
+          answerEl.textContent = msg.data.answer || answer;
+        }else if(msg.event === 'error'){
+          throw new Error(msg.data.details || msg.data.error);
+        }
+      }
+    }
   }catch(err){
     console.error(err);
-    appendMessage('assistant', 'Error getting answer: ' + (err.message || err));
+    answerEl.textContent = (answer ? answer + '\n\n' : '') + 'Error getting answer: ' + (err.message || err);
   }finally{
     sendBtn.disabled = false;
   }